@@ -0,0 +1,8 @@
+// Backend location, shared by the upload form and artifact URLs
+export const API_BASE_URL = "https://aqi-app-backend.onrender.com";
+
+// Images arrive as base64 (delivery "inline") or as /outputs/... URLs (delivery "url")
+export function imageSrc(value, mimeType, delivery) {
+  if (delivery === "url") return `${API_BASE_URL}${value}`;
+  return `data:${mimeType};base64,${value}`;
+}
@@ -2,6 +2,7 @@
 import React, { useState } from "react";
 import axios from "axios";
 import { FileText, Image, Upload, Rocket } from "lucide-react";
+import { API_BASE_URL } from "../api";
 
 function UploadForm({ setResult, setLoading, setError }) {
   const [dataset, setDataset] = useState(null);
@@ -19,6 +20,12 @@ function UploadForm({ setResult, setLoading, setError }) {
 
     const formData = new FormData();
     formData.append("dataset", dataset);
+    // Charts are drawn client-side from the returned series
+    formData.append("visualizations", "data");
+    // Images come back as cacheable URLs instead of base64
+    formData.append("delivery", "url");
+    // Animate the reference photo through the 30-day forecast
+    formData.append("timelapse", "webp");
     if (refImage) {
       formData.append("ref_image", refImage);
     }
@@ -28,7 +35,7 @@ function UploadForm({ setResult, setLoading, setError }) {
       setResult(null);
 
       const res = await axios.post(
-        "https://aqi-app-backend.onrender.com/analyze", // Updated endpoint
+        `${API_BASE_URL}/analyze`, // Updated endpoint
         formData,
         {
           headers: { "Content-Type": "multipart/form-data" },
@@ -1,4 +1,5 @@
 import React, { useState } from 'react';
+import { imageSrc } from '../../api';
 
 function ProcessedImages({ images }) {
   const [activeImage, setActiveImage] = useState('original');
@@ -42,23 +43,51 @@ function ProcessedImages({ images }) {
             With Smog Effect
           </button>
         )}
+        {images.timelapse && (
+          <button
+            onClick={() => setActiveImage('timelapse')}
+            className={`flex-1 px-3 py-2 rounded text-sm transition-colors ${
+              activeImage === 'timelapse' ? 'bg-teal-600 text-white' : 'text-gray-400'
+            }`}
+          >
+            Forecast Time-lapse
+          </button>
+        )}
       </div>
 
       <div className="bg-gray-700/30 p-4 rounded-lg">
         {activeImage === 'original' && images.original && (
           <img 
-            src={`data:image/jpeg;base64,${images.original}`}
+            src={imageSrc(images.original, images.original_mime_type || 'image/jpeg', images.delivery)}
             alt="Original Image"
             className="w-full h-auto rounded-lg"
           />
         )}
         {activeImage === 'with_smog' && images.with_smog && (
           <img 
-            src={`data:image/jpeg;base64,${images.with_smog}`}
+            src={imageSrc(images.with_smog, images.mime_type || 'image/jpeg', images.delivery)}
             alt="Image with Smog Effect"
             className="w-full h-auto rounded-lg"
           />
         )}
+        {activeImage === 'timelapse' && images.timelapse && (
+          images.timelapse.format === 'mp4' ? (
+            <video
+              src={imageSrc(images.timelapse.data, images.timelapse.mime_type, images.delivery)}
+              className="w-full h-auto rounded-lg"
+              autoPlay
+              loop
+              muted
+              playsInline
+            />
+          ) : (
+            <img
+              src={imageSrc(images.timelapse.data, images.timelapse.mime_type, images.delivery)}
+              alt="Smog Forecast Time-lapse"
+              className="w-full h-auto rounded-lg"
+            />
+          )
+        )}
       </div>
 
       {images.haze_intensity > 0 && (
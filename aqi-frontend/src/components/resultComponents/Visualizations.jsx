@@ -1,19 +1,204 @@
 import React from 'react';
+import { imageSrc } from '../../api';
+
+const WIDTH = 600;
+const HEIGHT = 300;
+const PAD = { top: 16, right: 16, bottom: 36, left: 48 };
+
+const toTime = (ds) => new Date(ds).getTime();
+const isNum = (v) => typeof v === 'number' && Number.isFinite(v);
+
+// Build an SVG path, starting a new segment after every gap (null value)
+function linePath(xs, ys, sx, sy) {
+  let path = '';
+  let penDown = false;
+  for (let i = 0; i < xs.length; i++) {
+    if (!isNum(ys[i])) {
+      penDown = false;
+      continue;
+    }
+    path += `${penDown ? 'L' : 'M'}${sx(xs[i]).toFixed(1)},${sy(ys[i]).toFixed(1)}`;
+    penDown = true;
+  }
+  return path;
+}
+
+function bandPath(xs, lower, upper, sx, sy) {
+  const points = xs
+    .map((x, i) => [x, lower[i], upper[i]])
+    .filter(([, lo, hi]) => isNum(lo) && isNum(hi));
+  if (points.length === 0) return '';
+  const top = points.map(([x, , hi]) => `${sx(x).toFixed(1)},${sy(hi).toFixed(1)}`);
+  const bottom = points.reverse().map(([x, lo]) => `${sx(x).toFixed(1)},${sy(lo).toFixed(1)}`);
+  return `M${top.join('L')}L${bottom.join('L')}Z`;
+}
+
+function LineChart({ title, lines = [], band = null, reference = null }) {
+  const xs = lines.flatMap((line) => line.ds.map(toTime));
+  const ys = [
+    ...lines.flatMap((line) => line.values),
+    ...(band ? [...band.lower, ...band.upper] : []),
+    ...(isNum(reference) ? [reference] : []),
+  ].filter(isNum);
+  if (xs.length === 0 || ys.length === 0) return null;
+
+  const [xMin, xMax] = [Math.min(...xs), Math.max(...xs)];
+  const [yMin, yMax] = [Math.min(...ys), Math.max(...ys)];
+  const sx = (x) => PAD.left + ((x - xMin) / (xMax - xMin || 1)) * (WIDTH - PAD.left - PAD.right);
+  const sy = (y) => HEIGHT - PAD.bottom - ((y - yMin) / (yMax - yMin || 1)) * (HEIGHT - PAD.top - PAD.bottom);
+
+  const yTicks = [0, 1, 2, 3, 4].map((i) => yMin + ((yMax - yMin) * i) / 4);
+  const xTicks = [0, 1, 2, 3].map((i) => xMin + ((xMax - xMin) * i) / 3);
+
+  return (
+    <div className="bg-gray-700/30 p-6 rounded-lg">
+      <h4 className="font-medium text-gray-300 mb-4">{title}</h4>
+      <svg viewBox={`0 0 ${WIDTH} ${HEIGHT}`} className="w-full h-auto bg-white rounded-lg">
+        {yTicks.map((y) => (
+          <g key={`y${y}`}>
+            <line x1={PAD.left} x2={WIDTH - PAD.right} y1={sy(y)} y2={sy(y)} stroke="#e5e7eb" />
+            <text x={PAD.left - 6} y={sy(y) + 4} textAnchor="end" fontSize="10" fill="#4b5563">
+              {y.toFixed(0)}
+            </text>
+          </g>
+        ))}
+        {xTicks.map((x) => (
+          <text key={`x${x}`} x={sx(x)} y={HEIGHT - PAD.bottom + 16} textAnchor="middle" fontSize="10" fill="#4b5563">
+            {new Date(x).toISOString().slice(0, 10)}
+          </text>
+        ))}
+        {band && (
+          <path
+            d={bandPath(band.ds.map(toTime), band.lower, band.upper, sx, sy)}
+            fill={band.color}
+            fillOpacity="0.25"
+          />
+        )}
+        {isNum(reference) && (
+          <line
+            x1={PAD.left} x2={WIDTH - PAD.right} y1={sy(reference)} y2={sy(reference)}
+            stroke="#8b0000" strokeDasharray="6 4" strokeWidth="1.5"
+          />
+        )}
+        {lines.map((line) => (
+          <path
+            key={line.label}
+            d={linePath(line.ds.map(toTime), line.values, sx, sy)}
+            fill="none"
+            stroke={line.color}
+            strokeWidth={line.width || 1.5}
+            strokeOpacity={line.opacity || 1}
+          />
+        ))}
+      </svg>
+      <div className="flex flex-wrap gap-4 mt-3 text-sm text-gray-400">
+        {lines.map((line) => (
+          <span key={line.label} className="flex items-center gap-2">
+            <span className="inline-block w-4 h-1 rounded" style={{ backgroundColor: line.color }} />
+            {line.label}
+          </span>
+        ))}
+      </div>
+    </div>
+  );
+}
+
+function Gauge({ gauge }) {
+  const cx = 200;
+  const cy = 180;
+  const outer = 150;
+  const inner = 105;
+  const max = gauge.boundaries[gauge.boundaries.length - 1];
+  // 0 AQI on the left, the maximum on the right
+  const angle = (v) => Math.PI * (1 - Math.min(Math.max(v, 0), max) / max);
+  const point = (a, r) => [cx + r * Math.cos(a), cy - r * Math.sin(a)];
+
+  const segment = (from, to) => {
+    const [x1, y1] = point(angle(from), outer);
+    const [x2, y2] = point(angle(to), outer);
+    const [x3, y3] = point(angle(to), inner);
+    const [x4, y4] = point(angle(from), inner);
+    return `M${x1},${y1}A${outer},${outer} 0 0 1 ${x2},${y2}L${x3},${y3}A${inner},${inner} 0 0 0 ${x4},${y4}Z`;
+  };
+  const [px, py] = point(angle(gauge.value), outer - 10);
+
+  return (
+    <div className="bg-gray-700/30 p-6 rounded-lg">
+      <h4 className="font-medium text-gray-300 mb-4">AQI Gauge</h4>
+      <svg viewBox="0 0 400 230" className="w-full h-auto bg-white rounded-lg">
+        {gauge.colors.map((color, i) => (
+          <path key={color} d={segment(gauge.boundaries[i], gauge.boundaries[i + 1])} fill={color} fillOpacity="0.85">
+            <title>{gauge.labels[i]}</title>
+          </path>
+        ))}
+        <line x1={cx} y1={cy} x2={px} y2={py} stroke="black" strokeWidth="4" strokeLinecap="round" />
+        <circle cx={cx} cy={cy} r="7" fill="black" />
+        <text x={cx} y={cy - 40} textAnchor="middle" fontSize="30" fontWeight="bold">
+          {Math.round(gauge.value)}
+        </text>
+        <text x={cx} y={cy + 32} textAnchor="middle" fontSize="14" fontWeight="bold" fill="#dc2626">
+          {gauge.category}
+        </text>
+      </svg>
+    </div>
+  );
+}
+
+function ChartVisualizations({ series }) {
+  return (
+    <div className="grid grid-cols-1 lg:grid-cols-2 gap-6">
+      <LineChart
+        title="Historical Air Quality Data"
+        lines={[{ label: 'Historical Data', ds: series.history.ds, values: series.history.y, color: '#2563eb', opacity: 0.7 }]}
+      />
+      <LineChart
+        title="30-Day Forecast with Confidence Bands"
+        lines={[{ label: 'Forecast', ds: series.forecast.ds, values: series.forecast.yhat, color: '#dc2626', width: 2 }]}
+        band={{ ds: series.forecast.ds, lower: series.forecast.yhat_lower, upper: series.forecast.yhat_upper, color: '#dc2626' }}
+        reference={series.gauge.value}
+      />
+      <LineChart
+        title="Air Quality Trend Analysis"
+        lines={[{ label: 'Long-term Trend', ds: series.trend.ds, values: series.trend.trend, color: '#16a34a', width: 2 }]}
+      />
+      <LineChart
+        title="Recent Data with Moving Average"
+        lines={[
+          { label: 'Daily Values', ds: series.recent.ds, values: series.recent.y, color: '#2563eb', opacity: 0.5 },
+          { label: '7-day Average', ds: series.recent.ds, values: series.recent.rolling_mean_7, color: '#dc2626', width: 2 },
+        ]}
+      />
+      <Gauge gauge={series.gauge} />
+    </div>
+  );
+}
 
 function Visualizations({ data }) {
   if (!data) return null;
 
+  // Chart data mode: draw the series client-side
+  if (data.mode === 'data' && data.series) {
+    return (
+      <div className="space-y-6">
+        <h3 className="text-xl font-semibold text-gray-200">Data Visualizations</h3>
+        <ChartVisualizations series={data.series} />
+      </div>
+    );
+  }
+
+  const mimeType = data.mime_type || 'image/png';
+
   return (
     <div className="space-y-6">
       <h3 className="text-xl font-semibold text-gray-200">Data Visualizations</h3>
-      
+
       <div className="grid grid-cols-1 lg:grid-cols-2 gap-6">
         {data.forecast_plot && (
           <div className="bg-gray-700/30 p-6 rounded-lg">
             <h4 className="font-medium text-gray-300 mb-4">Forecast Analysis</h4>
             <div className="bg-white rounded-lg p-2">
-              <img 
-                src={`data:image/png;base64,${data.forecast_plot}`}
+              <img
+                src={imageSrc(data.forecast_plot, mimeType, data.delivery)}
                 alt="Forecast Analysis Chart"
                 className="w-full h-auto"
               />
@@ -25,8 +210,8 @@ function Visualizations({ data }) {
           <div className="bg-gray-700/30 p-6 rounded-lg">
             <h4 className="font-medium text-gray-300 mb-4">AQI Gauge</h4>
             <div className="bg-white rounded-lg p-2">
-              <img 
-                src={`data:image/png;base64,${data.aqi_gauge}`}
+              <img
+                src={imageSrc(data.aqi_gauge, mimeType, data.delivery)}
                 alt="AQI Gauge"
                 className="w-full h-auto"
               />
@@ -38,4 +223,4 @@ function Visualizations({ data }) {
   );
 }
 
-export default Visualizations;
\ No newline at end of file
+export default Visualizations;
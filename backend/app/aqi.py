@@ -0,0 +1,129 @@
+"""
+Vectorized AQI computation.
+
+`calculate_detailed_aqi` converts one latest concentration per pollutant by
+walking the breakpoint table in Python. This module builds the same EPA
+tables once as NumPy arrays and converts whole pollutant columns with
+`np.searchsorted`, giving a per-row sub-index for every pollutant plus the
+overall AQI (the maximum sub-index) and the primary pollutant.
+
+Concentrations are truncated to the precision of the breakpoint table before
+the lookup (EPA truncation rule), so values such as 12.05 µg/m³ no longer
+fall into the gap between two breakpoints. Negative and missing values give
+no sub-index; values above the highest breakpoint are capped at 500.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+POLLUTANTS = ['pm25', 'pm10', 'o3', 'no2', 'so2', 'co']
+
+# EPA breakpoints are the concentration thresholds for specific air pollutants that define
+# the different levels of the Air Quality Index (AQI), such as "Good," "Moderate," and "Unhealthy"
+AQI_BREAKPOINTS = {
+    'pm25': [(0.0, 12.0, 0, 50), (12.1, 35.4, 51, 100), (35.5, 55.4, 101, 150),
+             (55.5, 150.4, 151, 200), (150.5, 250.4, 201, 300), (250.5, 500.4, 301, 500)],
+    'pm10': [(0, 54, 0, 50), (55, 154, 51, 100), (155, 254, 101, 150),
+             (255, 354, 151, 200), (355, 424, 201, 300), (425, 604, 301, 500)],
+    'o3': [(0, 54, 0, 50), (55, 70, 51, 100), (71, 85, 101, 150),
+           (86, 105, 151, 200), (106, 200, 201, 300)],
+    'no2': [(0, 53, 0, 50), (54, 100, 51, 100), (101, 360, 101, 150),
+            (361, 649, 151, 200), (650, 1249, 201, 300)],
+    'so2': [(0, 35, 0, 50), (36, 75, 51, 100), (76, 185, 101, 150),
+            (186, 304, 151, 200), (305, 604, 201, 300)],
+    'co': [(0, 4.4, 0, 50), (4.5, 9.4, 51, 100), (9.5, 12.4, 101, 150),
+           (12.5, 15.4, 151, 200), (15.5, 30.4, 201, 300)]
+}
+
+# Decimal places each table is defined at (EPA truncation rule)
+TRUNCATION_DECIMALS = {'pm25': 1, 'pm10': 0, 'o3': 0, 'no2': 0, 'so2': 0, 'co': 1}
+
+MAX_AQI = 500
+
+def _build_tables() -> Dict[str, Dict[str, np.ndarray]]:
+    tables = {}
+    for pollutant, rows in AQI_BREAKPOINTS.items():
+        bp_low, bp_high, aqi_low, aqi_high = (np.array(col, dtype=np.float64) for col in zip(*rows))
+        tables[pollutant] = {
+            "bp_low": bp_low,
+            "bp_high": bp_high,
+            "aqi_low": aqi_low,
+            "slope": (aqi_high - aqi_low) / (bp_high - bp_low)
+        }
+    return tables
+
+_TABLES = _build_tables()
+
+# ================================
+# SUB-INDICES
+# ================================
+
+def truncate_concentration(pollutant: str, values: np.ndarray) -> np.ndarray:
+    """Truncate (not round) to the table's precision; the epsilon absorbs float noise like 12.1*10"""
+    scale = 10.0 ** TRUNCATION_DECIMALS.get(pollutant, 0)
+    return np.floor(values * scale + 1e-6) / scale
+
+def sub_index(pollutant: str, concentrations) -> np.ndarray:
+    """Per-row AQI sub-index for one pollutant column (NaN where no index applies)"""
+    table = _TABLES[pollutant]
+    values = np.asarray(concentrations, dtype=np.float64)
+    truncated = truncate_concentration(pollutant, values)
+
+    idx = np.searchsorted(table["bp_low"], truncated, side='right') - 1
+    in_table = idx >= 0
+    idx = np.clip(idx, 0, len(table["bp_low"]) - 1)
+
+    aqi = table["slope"][idx] * (truncated - table["bp_low"][idx]) + table["aqi_low"][idx]
+    aqi = np.rint(aqi)
+    aqi = np.where(truncated > table["bp_high"][-1], MAX_AQI, aqi)
+    # NaN stays NaN through the comparisons above; negatives fall before the first breakpoint
+    return np.where(in_table & ~np.isnan(values), aqi, np.nan)
+
+def compute_aqi_frame(concentrations: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert a frame of pollutant columns (named as in POLLUTANTS) into AQI.
+
+    Returns one `<pollutant>_aqi` column per known pollutant, the overall
+    `aqi` (maximum sub-index) and the `primary_pollutant` (None when no
+    pollutant has a value on that row). The index is preserved.
+    """
+    pollutants = [p for p in POLLUTANTS if p in concentrations.columns]
+    result = pd.DataFrame(index=concentrations.index)
+    if not pollutants:
+        result['aqi'] = np.nan
+        result['primary_pollutant'] = None
+        return result
+
+    sub_indices = np.column_stack([sub_index(p, concentrations[p].to_numpy(dtype=np.float64)) for p in pollutants])
+    for i, pollutant in enumerate(pollutants):
+        result[f"{pollutant}_aqi"] = sub_indices[:, i]
+
+    has_value = ~np.isnan(sub_indices).all(axis=1)
+    filled = np.where(np.isnan(sub_indices), -1.0, sub_indices)
+    primary = filled.argmax(axis=1)
+    result['aqi'] = np.where(has_value, filled[np.arange(len(filled)), primary], np.nan)
+    # Categorical codes avoid building an object array of strings per row
+    result['primary_pollutant'] = pd.Categorical.from_codes(np.where(has_value, primary, -1), categories=pollutants)
+    return result
+
+def compute_daily_aqi(dates: pd.Series, concentrations: pd.DataFrame) -> pd.DataFrame:
+    """Average concentrations per calendar day, then compute per-day AQI for every pollutant"""
+    frame = concentrations.copy()
+    frame['date'] = pd.to_datetime(dates).dt.normalize().to_numpy()
+    daily = frame.dropna(subset=['date']).groupby('date', sort=True).mean()
+    return pd.concat([daily, compute_aqi_frame(daily)], axis=1)
+
+def aqi_series_payload(daily: pd.DataFrame, date_format: str = "%Y-%m-%d") -> Optional[Dict]:
+    """Column-oriented payload of an AQI frame indexed by date (arrays, NaN serializes as null)"""
+    if len(daily) == 0:
+        return None
+
+    pollutants = [p for p in POLLUTANTS if f"{p}_aqi" in daily.columns]
+    return {
+        "dates": pd.DatetimeIndex(daily.index).strftime(date_format).to_numpy(),
+        "aqi": daily['aqi'].to_numpy(),
+        "primary_pollutant": daily['primary_pollutant'].to_numpy(dtype=object),
+        "sub_indices": {p: daily[f"{p}_aqi"].to_numpy() for p in pollutants}
+    }
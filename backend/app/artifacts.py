@@ -0,0 +1,136 @@
+"""
+Content-addressed storage for generated images (smog photos, plots, gauges).
+
+Inlining images as base64 grows them by a third and re-sends every byte with
+each response. With ``delivery=url`` an artifact is written once under
+``outputs/artifacts/<sha256>.<ext>`` and the response carries its URL
+instead. Identical renders hash to the same file, so they are stored once,
+and since a file's content can never change under its name it is served
+with a year-long ``immutable`` Cache-Control and the hash as ETag.
+
+The directory is bounded: once it exceeds AQI_ARTIFACT_MAX_BYTES the least
+recently stored (or re-used) artifacts are deleted first.
+
+Configuration (environment variables):
+    AQI_ARTIFACT_DELIVERY       Default delivery: inline (base64) or url (default: inline)
+    AQI_ARTIFACT_MAX_BYTES      Disk budget for stored artifacts (default: 512 MB, 0 = unbounded)
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import re
+import threading
+from typing import Dict
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_MODES = ("inline", "url")
+ARTIFACT_DELIVERY = os.getenv("AQI_ARTIFACT_DELIVERY", "inline")
+ARTIFACT_MAX_BYTES = int(os.getenv("AQI_ARTIFACT_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Served by the /outputs static mount
+ARTIFACT_DIR = os.path.join("outputs", "artifacts")
+ARTIFACT_URL_PREFIX = "/outputs/artifacts"
+ARTIFACT_MAX_AGE = 365 * 24 * 3600
+_ARTIFACT_NAME = re.compile(r"^([0-9a-f]{64})\.[a-z0-9]+$")
+
+_prune_lock = threading.Lock()
+
+# ================================
+# STORAGE
+# ================================
+
+def store_artifact(data: bytes, ext: str) -> str:
+    """Write `data` under its content hash (once) and return its URL"""
+    digest = hashlib.sha256(data).hexdigest()
+    name = f"{digest}.{ext}"
+    path = os.path.join(ARTIFACT_DIR, name)
+
+    if os.path.exists(path):
+        # Already stored by an identical render; refresh it so pruning keeps it
+        os.utime(path)
+        return f"{ARTIFACT_URL_PREFIX}/{name}"
+
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    # Write-then-rename so concurrent writers (threads or pool workers) never expose a partial file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+    if ARTIFACT_MAX_BYTES > 0:
+        prune_artifacts(ARTIFACT_MAX_BYTES)
+    return f"{ARTIFACT_URL_PREFIX}/{name}"
+
+def deliver_artifact(data: bytes, ext: str, delivery: str) -> str:
+    """Base64 of `data` for inline delivery, or the URL of the stored artifact"""
+    if delivery == "url":
+        return store_artifact(data, ext)
+    return base64.b64encode(data).decode('utf-8')
+
+def _artifact_files():
+    try:
+        with os.scandir(ARTIFACT_DIR) as entries:
+            return [
+                (entry.path, entry.stat())
+                for entry in entries
+                if entry.is_file() and _ARTIFACT_NAME.match(entry.name)
+            ]
+    except FileNotFoundError:
+        return []
+
+def prune_artifacts(max_bytes: int):
+    """Delete least recently used artifacts until the directory fits in `max_bytes`"""
+    with _prune_lock:
+        files = _artifact_files()
+        total = sum(stat.st_size for _, stat in files)
+        if total <= max_bytes:
+            return
+
+        evicted = 0
+        for path, stat in sorted(files, key=lambda item: item[1].st_mtime):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= stat.st_size
+            evicted += 1
+        logger.info(f"Pruned {evicted} artifacts, {total} bytes remain")
+
+def artifact_stats() -> Dict:
+    """Artifact count and bytes on disk"""
+    files = _artifact_files()
+    return {
+        "directory": ARTIFACT_DIR,
+        "artifacts": len(files),
+        "bytes": sum(stat.st_size for _, stat in files),
+        "max_bytes": ARTIFACT_MAX_BYTES
+    }
+
+# ================================
+# SERVING
+# ================================
+
+class ArtifactStaticFiles(StaticFiles):
+    """StaticFiles that serves content-addressed artifacts as immutable, with the hash as ETag"""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        match = _ARTIFACT_NAME.match(os.path.basename(full_path))
+        in_artifacts = os.path.basename(os.path.dirname(full_path)) == os.path.basename(ARTIFACT_DIR)
+        if match is None or not in_artifacts:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers["etag"] = f'"{match.group(1)}"'
+        response.headers["cache-control"] = f"public, max-age={ARTIFACT_MAX_AGE}, immutable"
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
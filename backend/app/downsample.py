@@ -0,0 +1,101 @@
+"""
+Visual downsampling of long time series for plots and chart data.
+
+Multi-year hourly histories have hundreds of thousands of points, far more
+than a chart a thousand pixels wide can show; drawing (or sending) all of them
+is slow and adds nothing. Series are reduced with MinMax-LTTB:
+
+    1. min/max preselection     vectorized, keeps the min and max of each of
+                                4 * n_out equal buckets
+    2. Largest-Triangle-Three-Buckets on the preselected points, choosing per
+       bucket the point forming the largest triangle with the previous choice
+       and the next bucket's mean
+
+The first and last points and the exact global minimum and maximum are always
+kept, so peaks never disappear from a chart. Missing values are ignored.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Preselected points per output point; 4 is enough for LTTB to match the full run visually
+MINMAX_RATIO = 4
+
+def _as_float(x) -> np.ndarray:
+    """Timestamps as float nanoseconds, numbers as float64"""
+    values = np.asarray(x)
+    if np.issubdtype(values.dtype, np.datetime64):
+        values = values.astype("datetime64[ns]").view(np.int64)
+    return values.astype(np.float64)
+
+def minmax_indices(y: np.ndarray, n_buckets: int) -> np.ndarray:
+    """Sorted indices of the min and max of each of `n_buckets` equal buckets (plus both ends)"""
+    n = len(y)
+    size = -(-(n - 2) // n_buckets)
+    inner = np.full(n_buckets * size, np.nan)
+    inner[:n - 2] = y[1:-1]
+    buckets = inner.reshape(n_buckets, size)
+
+    # Trailing buckets may be all padding; their argmin/argmax point past the data
+    filled = ~np.isnan(buckets).all(axis=1)
+    filled_buckets = buckets[filled]
+    offsets = np.flatnonzero(filled) * size + 1
+    picks = np.concatenate([
+        offsets + np.nanargmin(filled_buckets, axis=1),
+        offsets + np.nanargmax(filled_buckets, axis=1),
+        [0, n - 1]
+    ])
+    return np.unique(picks)
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the `n_out` points Largest-Triangle-Three-Buckets keeps"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Middle buckets split the points between the fixed first and last ones
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    # Each bucket looks ahead to the next bucket's mean, the last one to the final point
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[start:stop] - y[a])
+            - (x[a] - x[start:stop]) * (next_y[i] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def downsample_indices(x, y, max_points: int) -> np.ndarray:
+    """Sorted indices of the points to draw for a series, at most ~`max_points` of them"""
+    y = np.asarray(y, dtype=np.float64)
+    finite = np.flatnonzero(np.isfinite(y))
+    if max_points <= 0 or len(finite) <= max_points:
+        return finite
+
+    x, y = _as_float(x)[finite], y[finite]
+    keep = np.arange(len(y))
+    if len(y) > MINMAX_RATIO * max_points:
+        keep = minmax_indices(y, MINMAX_RATIO * max_points // 2)
+    keep = keep[lttb_indices(x[keep], y[keep], max_points)]
+
+    # LTTB favors shape over extremes; the exact min and max are put back explicitly
+    keep = np.union1d(keep, [np.argmin(y), np.argmax(y)])
+    return finite[keep]
+
+def downsample_frame(frame: pd.DataFrame, x_col: str, y_col: str, max_points: int) -> pd.DataFrame:
+    """Rows of `frame` to draw for `y_col` over `x_col`, or `frame` unchanged if already small"""
+    if max_points <= 0 or len(frame) <= max_points:
+        return frame
+    return frame.iloc[downsample_indices(frame[x_col], frame[y_col], max_points)]
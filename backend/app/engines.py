@@ -0,0 +1,404 @@
+"""
+Forecasting engines behind STEP 2.
+
+Every engine takes the cleaned (ds, y) frame and a horizon in days and returns
+a frame shaped like Prophet's output for the columns the rest of the pipeline
+reads: one row per unique history date followed by `periods` future days, with
+``yhat``, ``yhat_lower``, ``yhat_upper`` and ``trend``. Metrics, predictions
+and plots therefore work unchanged whichever engine produced the forecast.
+
+Engines:
+    prophet     Prophet with model registry warm starts (most accurate, slowest)
+    ets         statsmodels ETS (damped additive trend, weekly seasonality)
+    numpy       EWMA level + weekly seasonal-naive profile (fastest)
+
+With ``include_history=False`` only the future rows are returned, which lets
+Prophet skip predicting the in-sample rows when no metrics are needed.
+
+When a fast mode is used, the response reports what a default predict (all
+rows, 1000 samples) would have cost and the time saved. By default this is
+the measured predict time, minus its own samples, plus 1000 samples over every
+row, priced by a sampling cost model calibrated once per worker (five predicts
+of at most CALIBRATION_MAX_ROWS rows).
+
+Configuration (environment variables):
+    AQI_ESTIMATE_DEFAULT_PREDICT    Calibrate the estimate with two 1000-sample
+                                    predicts per worker and model shape instead,
+                                    more exact but slower (default: 0)
+"""
+
+import os
+import time
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# prophet (and cmdstanpy) take over a second to import, so it is only imported
+# inside the functions that need it
+if TYPE_CHECKING:
+    from prophet import Prophet
+
+from .model_registry import load_model, save_model, warm_start_params, future_frame
+
+# Prophet's default interval_width is 0.8, the other engines match it
+INTERVAL_Z = 1.2815515655446004
+WEEKLY_PERIOD = 7
+
+# Prophet interval modes:
+#   sampled     Monte Carlo intervals with `uncertainty_samples` draws (Prophet's default, 1000)
+#   analytic    no sampling, yhat +/- z * observation noise (ignores trend uncertainty)
+#   none        no sampling, bands collapse onto yhat
+INTERVAL_MODES = ("sampled", "analytic", "none")
+PROPHET_DEFAULT_SAMPLES = 1000
+ESTIMATE_DEFAULT_PREDICT = os.getenv("AQI_ESTIMATE_DEFAULT_PREDICT", "0") == "1"
+
+# (fixed, per-row) seconds of a default Prophet predict, calibrated once per
+# worker and model shape (AQI_ESTIMATE_DEFAULT_PREDICT=1)
+_default_predict_cost: Dict[Tuple[int, int], Tuple[float, float]] = {}
+# (per-sample, per-sample-row) seconds of Prophet's interval sampling, calibrated
+# once per worker; the default estimate of the time the fast modes save
+_sampling_cost: Optional[Tuple[float, float]] = None
+CALIBRATION_SAMPLES = 1000
+CALIBRATION_MAX_ROWS = 1000
+
+# ================================
+# SHARED HELPERS
+# ================================
+
+def _daily_series(aqi_df: pd.DataFrame) -> pd.Series:
+    """Collapse the history to a regular daily series (mean per day, gaps interpolated)"""
+    daily = aqi_df.set_index(pd.to_datetime(aqi_df['ds']))['y'].astype(float).resample('D').mean()
+    return daily.interpolate(limit_direction='both')
+
+def _assemble_frame(
+    aqi_df: pd.DataFrame,
+    periods: int,
+    daily_fitted: pd.Series,
+    daily_trend: pd.Series,
+    future_mean: np.ndarray,
+    future_lower: np.ndarray,
+    future_upper: np.ndarray,
+    future_trend: np.ndarray,
+    residual_std: float
+) -> pd.DataFrame:
+    """Map daily fitted values back onto the history dates and append the future rows"""
+    frame = future_frame(aqi_df, periods)
+    n_history = len(frame) - len(future_mean)
+
+    history_days = frame['ds'].iloc[:n_history].dt.floor('D')
+    fitted = daily_fitted.reindex(history_days).to_numpy(dtype=float)
+    trend = daily_trend.reindex(history_days).to_numpy(dtype=float)
+    band = INTERVAL_Z * residual_std
+
+    frame['yhat'] = np.concatenate([fitted, future_mean])
+    frame['yhat_lower'] = np.concatenate([fitted - band, future_lower])
+    frame['yhat_upper'] = np.concatenate([fitted + band, future_upper])
+    frame['trend'] = np.concatenate([trend, future_trend])
+    return frame
+
+# ================================
+# PROPHET ENGINE
+# ================================
+
+def _timed_predict(model: "Prophet", future: pd.DataFrame) -> Tuple[pd.DataFrame, float]:
+    start = time.perf_counter()
+    forecast = model.predict(future)
+    return forecast, time.perf_counter() - start
+
+def _estimate_default_predict_seconds(model: "Prophet", future: pd.DataFrame, rows: int) -> float:
+    """Estimate what predicting `rows` rows with default sampling would have cost"""
+    shape = (len(model.params['beta'][0]), len(model.changepoints_t))
+    if shape not in _default_predict_cost:
+        samples = model.uncertainty_samples
+        model.uncertainty_samples = PROPHET_DEFAULT_SAMPLES
+        try:
+            small, large = future.tail(2), future.tail(min(len(future), 64))
+            _, t_small = _timed_predict(model, small)
+            _, t_large = _timed_predict(model, large)
+        finally:
+            model.uncertainty_samples = samples
+        per_row = max(t_large - t_small, 0.0) / max(len(large) - len(small), 1)
+        _default_predict_cost[shape] = (max(t_small - len(small) * per_row, 0.0), per_row)
+
+    fixed, per_row = _default_predict_cost[shape]
+    return fixed + per_row * rows
+
+def _sampling_seconds(model: "Prophet", future: pd.DataFrame, samples: int, rows: int) -> float:
+    """Seconds Prophet spends drawing `samples` interval samples over `rows` rows"""
+    global _sampling_cost
+    if _sampling_cost is None:
+        previous = model.uncertainty_samples
+        # Rows spread over history and horizon, whose trend samples cost differently
+        small = future.tail(2)
+        large = future.iloc[np.linspace(0, len(future) - 1, min(len(future), CALIBRATION_MAX_ROWS)).astype(int)]
+        try:
+            # The first sampled predict in a process pays one-off setup costs
+            model.uncertainty_samples = CALIBRATION_SAMPLES
+            _timed_predict(model, small)
+            # Sampling cost per sample: the sampled minus the deterministic predict
+            per_sample = []
+            for frame in (small, large):
+                model.uncertainty_samples = 0
+                _, deterministic = _timed_predict(model, frame)
+                model.uncertainty_samples = CALIBRATION_SAMPLES
+                _, sampled = _timed_predict(model, frame)
+                per_sample.append(max(sampled - deterministic, 0.0) / CALIBRATION_SAMPLES)
+        finally:
+            model.uncertainty_samples = previous
+        per_sample_row = max(per_sample[1] - per_sample[0], 0.0) / max(len(large) - len(small), 1)
+        _sampling_cost = (max(per_sample[0] - len(small) * per_sample_row, 0.0), per_sample_row)
+
+    fixed, per_row = _sampling_cost
+    return samples * (fixed + per_row * rows)
+
+def _predict_prophet(
+    model: "Prophet",
+    future: pd.DataFrame,
+    periods: int,
+    include_history: bool,
+    intervals: str,
+    uncertainty_samples: Optional[int]
+) -> Tuple[pd.DataFrame, Dict]:
+    """Predict with the requested interval mode, optionally on the future rows only"""
+    full_future = future
+    full_rows = len(future)
+    if not include_history:
+        future = future.tail(periods).reset_index(drop=True)
+
+    if intervals == "sampled":
+        samples = PROPHET_DEFAULT_SAMPLES if uncertainty_samples is None else max(int(uncertainty_samples), 0)
+    else:
+        samples = 0
+    model.uncertainty_samples = samples
+
+    forecast, predict_seconds = _timed_predict(model, future)
+
+    if 'yhat_lower' not in forecast:
+        if intervals == "analytic":
+            # sigma_obs is fitted on the scaled series
+            band = INTERVAL_Z * float(np.mean(model.params['sigma_obs'])) * float(model.y_scale)
+        else:
+            band = 0.0
+        forecast['yhat_lower'] = forecast['yhat'] - band
+        forecast['yhat_upper'] = forecast['yhat'] + band
+
+    predict_info = {
+        "intervals": intervals,
+        "uncertainty_samples": samples,
+        "predict_rows": len(future),
+        "predict_seconds": round(predict_seconds, 4)
+    }
+    if len(future) < full_rows or samples < PROPHET_DEFAULT_SAMPLES:
+        if ESTIMATE_DEFAULT_PREDICT:
+            baseline = _estimate_default_predict_seconds(model, future, full_rows)
+        else:
+            # The deterministic part of a predict barely depends on the row count
+            deterministic = max(predict_seconds - _sampling_seconds(model, full_future, samples, len(future)), 0.0)
+            baseline = deterministic + _sampling_seconds(model, full_future, PROPHET_DEFAULT_SAMPLES, full_rows)
+        predict_info["estimated_default_predict_seconds"] = round(baseline, 4)
+        predict_info["predict_seconds_saved"] = round(max(baseline - predict_seconds, 0.0), 4)
+
+    return forecast, predict_info
+
+def run_prophet_forecast(
+    aqi_df: pd.DataFrame,
+    periods: int,
+    prophet_kwargs: Optional[Dict] = None,
+    model_key: Optional[str] = None,
+    refit: bool = True,
+    include_history: bool = True,
+    intervals: str = "sampled",
+    uncertainty_samples: Optional[int] = None
+) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Fit Prophet on the (ds, y) series and predict history plus `periods` future days.
+
+    With a `model_key` the previous fit from the model registry is used as the
+    warm start, and the new fit is stored back. With `refit=False` a registered
+    model is used as-is and no fitting happens. `intervals`/`uncertainty_samples`
+    pick how the bands are computed (see INTERVAL_MODES).
+    """
+    from prophet import Prophet
+
+    previous = load_model(model_key) if model_key else None
+    fit_info = {"engine": "prophet", "model_key": model_key, "refit": True, "warm_start": False}
+
+    if previous is not None and not refit:
+        fit_info["refit"] = False
+        forecast, predict_info = _predict_prophet(
+            previous, future_frame(aqi_df, periods), periods,
+            include_history, intervals, uncertainty_samples
+        )
+        return forecast, {**fit_info, **predict_info}
+
+    model = Prophet(**(prophet_kwargs or {}))
+    fit_start = time.perf_counter()
+    if previous is not None:
+        model.fit(aqi_df, init=warm_start_params(previous))
+        fit_info["warm_start"] = True
+    else:
+        model.fit(aqi_df)
+    fit_info["fit_seconds"] = round(time.perf_counter() - fit_start, 4)
+
+    if model_key:
+        save_model(model_key, model, {
+            "rows": len(aqi_df),
+            "last_ds": aqi_df['ds'].max(),
+            "prophet_kwargs": prophet_kwargs or {},
+            **fit_info
+        })
+
+    forecast, predict_info = _predict_prophet(
+        model, model.make_future_dataframe(periods=periods), periods,
+        include_history, intervals, uncertainty_samples
+    )
+    return forecast, {**fit_info, **predict_info}
+
+def warm_up_prophet() -> Dict:
+    """Pipeline stage: import prophet, load its Stan model and run one tiny fit in this process"""
+    start = time.perf_counter()
+    from prophet import Prophet
+    import_seconds = time.perf_counter() - start
+
+    history = pd.DataFrame({
+        'ds': pd.date_range("2024-01-01", periods=60, freq="D"),
+        'y': 50 + 10 * np.sin(np.arange(60) / WEEKLY_PERIOD)
+    })
+    model = Prophet(uncertainty_samples=0)
+    model.fit(history)
+    model.predict(model.make_future_dataframe(periods=WEEKLY_PERIOD))
+    return {
+        "pid": os.getpid(),
+        "import_seconds": round(import_seconds, 4),
+        "fit_seconds": round(time.perf_counter() - start - import_seconds, 4)
+    }
+
+# ================================
+# ETS ENGINE (statsmodels)
+# ================================
+
+def run_ets_forecast(aqi_df: pd.DataFrame, periods: int, **_) -> Tuple[pd.DataFrame, Dict]:
+    """Damped additive-trend ETS with weekly seasonality once there are two full weeks"""
+    from statsmodels.tsa.exponential_smoothing.ets import ETSModel
+
+    fit_start = time.perf_counter()
+    daily = _daily_series(aqi_df)
+    if len(daily) < 10:
+        raise ValueError("The ETS engine needs at least 10 days of data")
+
+    seasonal = 'add' if len(daily) >= 2 * WEEKLY_PERIOD else None
+    result = ETSModel(
+        daily,
+        error='add',
+        trend='add',
+        damped_trend=True,
+        seasonal=seasonal,
+        seasonal_periods=WEEKLY_PERIOD if seasonal else None
+    ).fit(disp=False)
+
+    prediction = result.get_prediction(start=len(daily), end=len(daily) + periods - 1)
+    summary = prediction.summary_frame(alpha=0.2)  # 80% interval, same as Prophet
+    future_mean = summary['mean'].to_numpy(dtype=float)
+
+    frame = _assemble_frame(
+        aqi_df, periods,
+        daily_fitted=result.fittedvalues,
+        daily_trend=result.level,
+        future_mean=future_mean,
+        future_lower=summary['pi_lower'].to_numpy(dtype=float),
+        future_upper=summary['pi_upper'].to_numpy(dtype=float),
+        future_trend=future_mean,
+        residual_std=float(np.nanstd(result.resid))
+    )
+    return frame, {
+        "engine": "ets",
+        "refit": True,
+        "warm_start": False,
+        "fit_seconds": round(time.perf_counter() - fit_start, 4)
+    }
+
+# ================================
+# NUMPY ENGINE (EWMA + seasonal naive)
+# ================================
+
+def run_numpy_forecast(aqi_df: pd.DataFrame, periods: int, alpha: float = 0.3, **_) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Exponentially weighted level plus a weekly seasonal profile, fully vectorized.
+
+    The weekly profile is the mean EWMA residual per position in the week;
+    intervals widen with the horizon like simple exponential smoothing,
+    sigma * sqrt(1 + (h - 1) * alpha^2).
+    """
+    fit_start = time.perf_counter()
+    daily = _daily_series(aqi_df)
+    values = daily.to_numpy(dtype=float)
+    n = len(values)
+
+    level = daily.ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+    positions = np.arange(n + periods) % WEEKLY_PERIOD
+    if n >= 2 * WEEKLY_PERIOD:
+        residuals = values - level
+        sums = np.bincount(positions[:n], weights=residuals, minlength=WEEKLY_PERIOD)
+        counts = np.bincount(positions[:n], minlength=WEEKLY_PERIOD)
+        profile = sums / np.maximum(counts, 1)
+        profile -= profile.mean()
+    else:
+        profile = np.zeros(WEEKLY_PERIOD)
+    seasonal = profile[positions]
+
+    # One-step-ahead in-sample fit: previous level plus this day's seasonal offset
+    previous_level = np.concatenate([[values[0]], level[:-1]])
+    fitted = previous_level + seasonal[:n]
+    residual_std = float(np.std(values - fitted)) if n > 1 else 0.0
+
+    horizon = np.arange(1, periods + 1)
+    future_mean = level[-1] + seasonal[n:]
+    spread = INTERVAL_Z * residual_std * np.sqrt(1 + (horizon - 1) * alpha ** 2)
+
+    frame = _assemble_frame(
+        aqi_df, periods,
+        daily_fitted=pd.Series(fitted, index=daily.index),
+        daily_trend=pd.Series(level, index=daily.index),
+        future_mean=future_mean,
+        future_lower=future_mean - spread,
+        future_upper=future_mean + spread,
+        future_trend=np.full(periods, level[-1]),
+        residual_std=residual_std
+    )
+    return frame, {
+        "engine": "numpy",
+        "refit": True,
+        "warm_start": False,
+        "fit_seconds": round(time.perf_counter() - fit_start, 4)
+    }
+
+# ================================
+# ENGINE SELECTION
+# ================================
+
+ENGINES = {
+    "prophet": run_prophet_forecast,
+    "ets": run_ets_forecast,
+    "numpy": run_numpy_forecast
+}
+
+# Fastest first, used by /quick-forecast
+FASTEST_ENGINE = "numpy"
+
+def run_forecast(
+    engine: str,
+    aqi_df: pd.DataFrame,
+    periods: int,
+    include_history: bool = True,
+    **kwargs
+) -> Tuple[pd.DataFrame, Dict]:
+    """Pipeline stage: dispatch to the named engine (must be a key of ENGINES)"""
+    if engine == "prophet":
+        return run_prophet_forecast(aqi_df, periods, include_history=include_history, **kwargs)
+
+    forecast, fit_info = ENGINES[engine](aqi_df, periods, **kwargs)
+    if not include_history:
+        forecast = forecast.tail(periods).reset_index(drop=True)
+    return forecast, fit_info
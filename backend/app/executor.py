@@ -0,0 +1,223 @@
+"""
+Process-pool execution layer for the CPU-heavy pipeline stages.
+
+Prophet fitting, matplotlib rendering and OpenCV processing are all blocking
+calls. Running them inside an ``async def`` endpoint stalls uvicorn's event
+loop, so every stage is dispatched here instead and awaited.
+
+Configuration (environment variables):
+    AQI_POOL_WORKERS                Worker processes (default: CPU count, 0 = one background thread)
+    AQI_POOL_MAX_TASKS_PER_CHILD    Recycle a worker after this many tasks (default: 50, 0 = never)
+    AQI_POOL_WARM                   Pre-import prophet/cmdstan/matplotlib/cv2 in workers (default: 1)
+    AQI_RENDER_POOL                 Where figures render: thread (default) or process
+    AQI_RENDER_WORKERS              Concurrent renders in the thread pool (default: 2)
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ================================
+# CONFIGURATION
+# ================================
+
+POOL_WORKERS = int(os.getenv("AQI_POOL_WORKERS", str(os.cpu_count() or 1)))
+POOL_MAX_TASKS_PER_CHILD = int(os.getenv("AQI_POOL_MAX_TASKS_PER_CHILD", "50"))
+POOL_WARM = os.getenv("AQI_POOL_WARM", "1") == "1"
+RENDER_POOL = os.getenv("AQI_RENDER_POOL", "thread")
+RENDER_WORKERS = max(1, int(os.getenv("AQI_RENDER_WORKERS", "2")))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Fallback when the pool is disabled: a single thread keeps the loop free while
+# serializing the CPU-heavy stages
+_fallback_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aqi-stage")
+
+# ================================
+# WORKER INITIALIZATION
+# ================================
+
+def _warm_worker():
+    """Pre-import heavy modules so the first task in a worker does not pay for them"""
+    import matplotlib
+    matplotlib.use("Agg")
+
+    if not POOL_WARM:
+        return
+
+    try:
+        import matplotlib.backends.backend_agg  # noqa: F401
+        import cv2  # noqa: F401
+        import cmdstanpy  # noqa: F401
+        from prophet import Prophet  # noqa: F401
+    except Exception as e:
+        # A failed warm-up is not fatal, the stage will import on demand
+        logger.warning(f"Worker warm-up failed: {str(e)}")
+
+def _ping() -> int:
+    """No-op task used to force worker start-up"""
+    return os.getpid()
+
+# ================================
+# POOL MANAGEMENT
+# ================================
+
+def get_executor() -> Optional[ProcessPoolExecutor]:
+    """Return the shared process pool, creating it on first use"""
+    global _executor
+
+    if POOL_WORKERS <= 0:
+        return None
+
+    with _executor_lock:
+        if _executor is None:
+            kwargs = {}
+            if POOL_MAX_TASKS_PER_CHILD > 0:
+                kwargs["max_tasks_per_child"] = POOL_MAX_TASKS_PER_CHILD
+
+            # Worker recycling is not supported with fork, and forking a process that
+            # already runs an event loop and thread pools is unsafe anyway
+            _executor = ProcessPoolExecutor(
+                max_workers=POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+                **kwargs
+            )
+            logger.info(
+                f"Started process pool with {POOL_WORKERS} workers "
+                f"(max_tasks_per_child={POOL_MAX_TASKS_PER_CHILD}, warm={POOL_WARM})"
+            )
+        return _executor
+
+def _reset_executor(broken: ProcessPoolExecutor):
+    """Drop a broken pool so the next call builds a fresh one"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def start_executor():
+    """Create the pool and start every worker so warm-up happens before the first request"""
+    executor = get_executor()
+    if executor is None:
+        logger.info("Process pool disabled, pipeline stages will run in a background thread")
+        return
+
+    for _ in range(POOL_WORKERS):
+        executor.submit(_ping)
+
+def shutdown_executor():
+    """Shut down the shared pool (called on application shutdown)"""
+    global _executor
+
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+        logger.info("Process pool shut down")
+
+def get_executor_info() -> Dict[str, Any]:
+    """Describe the current pool configuration"""
+    return {
+        "workers": POOL_WORKERS,
+        "max_tasks_per_child": POOL_MAX_TASKS_PER_CHILD,
+        "warm_workers": POOL_WARM,
+        "running": _executor is not None,
+        "render": {
+            "pool": RENDER_POOL,
+            "workers": RENDER_WORKERS if RENDER_POOL == "thread" else POOL_WORKERS,
+            "renders": get_render_stats()
+        }
+    }
+
+# ================================
+# STAGE DISPATCH
+# ================================
+
+async def run_stage(func: Callable, *args, **kwargs) -> Any:
+    """
+    Run a pipeline stage off the event loop and await its result.
+
+    ``func`` and its arguments must be picklable (module-level functions,
+    DataFrames, bytes, plain values). If a worker dies mid-task the pool is
+    rebuilt and the stage is retried once.
+    """
+    call = functools.partial(func, *args, **kwargs)
+    executor = get_executor()
+    loop = asyncio.get_running_loop()
+
+    if executor is None:
+        return await loop.run_in_executor(_fallback_thread, call)
+
+    try:
+        return await loop.run_in_executor(executor, call)
+    except BrokenProcessPool:
+        logger.warning(f"Process pool broken while running {func.__name__}, restarting it")
+        _reset_executor(executor)
+        return await loop.run_in_executor(get_executor(), call)
+
+# ================================
+# RENDER DISPATCH
+# ================================
+# Figures are drawn with matplotlib's Figure/Agg API (no pyplot state), so they
+# can render concurrently in a bounded thread pool, sharing in-process caches
+# such as the gauge background. AQI_RENDER_POOL=process sends them to the
+# process pool instead.
+
+_render_threads = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="aqi-render")
+_render_stats: Dict[str, Dict[str, float]] = {}
+_render_stats_lock = threading.Lock()
+
+def _timed_call(func: Callable, args: tuple, kwargs: dict) -> Tuple[Any, Dict[str, float]]:
+    """Run `func` and measure wall and CPU time in the thread that ran it"""
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    result = func(*args, **kwargs)
+    return result, {
+        "seconds": round(time.perf_counter() - start, 4),
+        "cpu_seconds": round(time.thread_time() - cpu_start, 4)
+    }
+
+def _record_render(name: str, seconds: float):
+    with _render_stats_lock:
+        stats = _render_stats.setdefault(name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        stats["count"] += 1
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+def get_render_stats() -> Dict[str, Dict[str, float]]:
+    """Render count, mean and max seconds per render function"""
+    with _render_stats_lock:
+        return {
+            name: {
+                "count": int(stats["count"]),
+                "mean_seconds": round(stats["total_seconds"] / stats["count"], 4),
+                "max_seconds": round(stats["max_seconds"], 4)
+            }
+            for name, stats in _render_stats.items()
+        }
+
+async def run_render(func: Callable, *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    """Render a figure in the render pool; returns the result and its timing"""
+    if RENDER_POOL == "process":
+        result, timing = await run_stage(_timed_call, func, args, kwargs)
+    else:
+        loop = asyncio.get_running_loop()
+        result, timing = await loop.run_in_executor(
+            _render_threads, functools.partial(_timed_call, func, args, kwargs)
+        )
+
+    timing["pool"] = RENDER_POOL
+    _record_render(func.__name__, timing["seconds"])
+    return result, timing
@@ -0,0 +1,206 @@
+"""
+Content-addressed cache for forecast results.
+
+Stations re-upload the same (or nearly the same) CSV many times a day. The
+forecast only depends on the cleaned (ds, y) series and the model settings,
+so results are keyed on a hash of exactly those and a hit skips fit/predict.
+
+Two tiers:
+    memory  LRU of the most recent forecast frames
+    disk    pickled frames under AQI_FORECAST_CACHE_DIR, evicted oldest-first
+            once the directory exceeds AQI_FORECAST_CACHE_MAX_BYTES
+
+Configuration (environment variables):
+    AQI_FORECAST_CACHE_ENTRIES      Memory tier size (default: 32, 0 = disabled)
+    AQI_FORECAST_CACHE_DIR          Disk tier directory (default: cache/forecasts)
+    AQI_FORECAST_CACHE_MAX_BYTES    Disk tier budget (default: 256 MB, 0 = disabled)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Bump when the cached frame layout changes so stale disk entries are ignored
+CACHE_VERSION = 1
+
+# ================================
+# KEYING
+# ================================
+
+def series_fingerprint(aqi_df: pd.DataFrame) -> str:
+    """Hash the cleaned (ds, y) series: sorted by date with NaN rows dropped"""
+    clean = aqi_df[['ds', 'y']].dropna().sort_values('ds', kind='mergesort')
+
+    ds = pd.to_datetime(clean['ds'])
+    if getattr(ds.dt, 'tz', None) is not None:
+        ds = ds.dt.tz_convert('UTC').dt.tz_localize(None)
+
+    digest = hashlib.sha256()
+    digest.update(ds.to_numpy(dtype='datetime64[ns]').view(np.int64).tobytes())
+    digest.update(clean['y'].to_numpy(dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+def make_cache_key(aqi_df: pd.DataFrame, settings: Dict[str, Any]) -> str:
+    """Combine the series fingerprint with the model settings (engine, seasonality, horizon)"""
+    settings_blob = json.dumps(settings, sort_keys=True, default=str)
+    digest = hashlib.sha256()
+    digest.update(f"v{CACHE_VERSION}".encode())
+    digest.update(series_fingerprint(aqi_df).encode())
+    digest.update(settings_blob.encode())
+    return digest.hexdigest()
+
+# ================================
+# CACHE
+# ================================
+
+class ForecastCache:
+    """Two-tier (memory LRU + size-bounded disk) forecast frame cache"""
+
+    def __init__(self, max_entries: int, cache_dir: str, max_disk_bytes: int):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "disk_evictions": 0
+        }
+
+        if self.max_disk_bytes > 0:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _remember(self, key: str, forecast: pd.DataFrame):
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = forecast
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Return a copy of the cached forecast frame, or None on a miss"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return self._memory[key].copy()
+
+        if self.max_disk_bytes > 0:
+            path = self._disk_path(key)
+            try:
+                forecast = pd.read_pickle(path)
+                # Touch so disk eviction is least-recently-used rather than oldest-written
+                os.utime(path, None)
+                with self._lock:
+                    self._remember(key, forecast)
+                    self._counters["disk_hits"] += 1
+                return forecast.copy()
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Discarding unreadable forecast cache entry {key}: {str(e)}")
+                self._remove(path)
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def put(self, key: str, forecast: pd.DataFrame):
+        """Store a forecast frame in both tiers"""
+        forecast = forecast.copy()
+        with self._lock:
+            self._remember(key, forecast)
+            self._counters["stores"] += 1
+
+        if self.max_disk_bytes > 0:
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                forecast.to_pickle(tmp_path)
+                os.replace(tmp_path, path)
+                self._evict_disk()
+            except Exception as e:
+                logger.warning(f"Could not write forecast cache entry {key}: {str(e)}")
+                self._remove(tmp_path)
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict_disk(self):
+        """Delete least-recently-used entries until the directory fits the byte budget"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_disk_bytes:
+            return
+
+        for _, size, path in sorted(entries):
+            self._remove(path)
+            total -= size
+            with self._lock:
+                self._counters["disk_evictions"] += 1
+            if total <= self.max_disk_bytes:
+                break
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+        if self.max_disk_bytes > 0:
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith('.pkl'):
+                    self._remove(entry.path)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            counters = dict(self._counters)
+            memory_entries = len(self._memory)
+
+        disk_entries, disk_bytes = 0, 0
+        if self.max_disk_bytes > 0:
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and entry.name.endswith('.pkl'):
+                    disk_entries += 1
+                    disk_bytes += entry.stat().st_size
+
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        return {
+            **counters,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": memory_entries,
+            "memory_max_entries": self.max_entries,
+            "disk_entries": disk_entries,
+            "disk_bytes": disk_bytes,
+            "disk_max_bytes": self.max_disk_bytes
+        }
+
+forecast_cache = ForecastCache(
+    max_entries=int(os.getenv("AQI_FORECAST_CACHE_ENTRIES", "32")),
+    cache_dir=os.getenv("AQI_FORECAST_CACHE_DIR", os.path.join("cache", "forecasts")),
+    max_disk_bytes=int(os.getenv("AQI_FORECAST_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+)
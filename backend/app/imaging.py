@@ -0,0 +1,198 @@
+"""
+In-memory decoding and encoding of uploaded reference photos.
+
+Uploads are decoded straight from the request bytes with ``cv2.imdecode``; no
+temp files are written. Photos larger than AQI_IMAGE_MAX_DIMENSION are decoded
+at a reduced resolution (JPEG DCT scaling via IMREAD_REDUCED_COLOR_2/4/8,
+which skips most of the decoding work) and then resized to fit. The header is
+probed with Pillow first to pick the reduction factor.
+
+Results are encoded once with the requested options:
+    jpeg    quality 1-100, optionally progressive
+    webp    quality 1-100
+
+When the photo did not need resizing, the uploaded bytes are returned as
+the "original" unchanged instead of being re-encoded.
+
+Animations (the forecast time-lapse) are encoded from a frame iterator:
+    mp4         cv2.VideoWriter, written frame by frame, so only one frame is
+                held at a time (first working codec from AQI_ANIMATION_FOURCC);
+                the default
+    webp / gif  Pillow's animated writers, which collect every frame before
+                encoding; animation_buffer_bytes gives what that holds, so
+                callers can refuse animations over a memory budget
+
+Configuration (environment variables):
+    AQI_IMAGE_MAX_DIMENSION     Longest side after decoding (default: 2048, 0 = no limit)
+    AQI_IMAGE_FORMAT            Output format, jpeg or webp (default: jpeg)
+    AQI_IMAGE_QUALITY           Output quality (default: 90)
+    AQI_ANIMATION_FOURCC        MP4 codecs to try in order (default: avc1,mp4v)
+"""
+
+import io
+import logging
+import os
+import tempfile
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from .startup import lazy_import
+
+# Loaded on first use, so importing the app does not pay for them
+cv2 = lazy_import("cv2")
+Image = lazy_import("PIL.Image")
+
+logger = logging.getLogger(__name__)
+
+IMAGE_MAX_DIMENSION = int(os.getenv("AQI_IMAGE_MAX_DIMENSION", "2048"))
+IMAGE_FORMAT = os.getenv("AQI_IMAGE_FORMAT", "jpeg")
+IMAGE_QUALITY = int(os.getenv("AQI_IMAGE_QUALITY", "90"))
+
+# Output format -> (file extension, MIME type)
+IMAGE_FORMATS = {"jpeg": ("jpg", "image/jpeg"), "webp": ("webp", "image/webp")}
+
+# Formats a browser can display as-is, by Pillow format name -> (extension, MIME type)
+PASSTHROUGH_FORMATS = {
+    "JPEG": ("jpg", "image/jpeg"),
+    "PNG": ("png", "image/png"),
+    "WEBP": ("webp", "image/webp"),
+    "GIF": ("gif", "image/gif")
+}
+
+# Animation format -> (file extension, MIME type)
+ANIMATION_FORMATS = {"mp4": ("mp4", "video/mp4"), "webp": ("webp", "image/webp"), "gif": ("gif", "image/gif")}
+ANIMATION_FOURCC = [code.strip() for code in os.getenv("AQI_ANIMATION_FOURCC", "avc1,mp4v").split(",") if code.strip()]
+# Bytes per pixel of each frame Pillow keeps until an animation is written (RGB is stored as 4)
+_BUFFERED_BYTES_PER_PIXEL = {"webp": 4, "gif": 1}
+
+_REDUCED_FLAGS = {2: "IMREAD_REDUCED_COLOR_2", 4: "IMREAD_REDUCED_COLOR_4", 8: "IMREAD_REDUCED_COLOR_8"}
+
+def probe_image(image_bytes: bytes) -> Tuple[Optional[str], Optional[Tuple[int, int]]]:
+    """Format name and (width, height) from the header only, or (None, None) if unreadable"""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as probe:
+            return probe.format, probe.size
+    except Exception:
+        return None, None
+
+def fitted_size(size: Tuple[int, int], max_dimension: int) -> Tuple[int, int]:
+    """(width, height) after decode_image shrinks the longest side to `max_dimension`"""
+    width, height = size
+    if max_dimension <= 0 or max(width, height) <= max_dimension:
+        return width, height
+    ratio = max_dimension / max(width, height)
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+def decode_image(image_bytes: bytes, max_dimension: int = IMAGE_MAX_DIMENSION) -> Tuple[Optional[np.ndarray], Dict]:
+    """Decode uploaded bytes to a BGR image whose longest side is at most `max_dimension`"""
+    source_format, size = probe_image(image_bytes)
+    buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+
+    # Largest DCT reduction that still leaves at least `max_dimension` pixels to resize from
+    reduction = 1
+    if size is not None and max_dimension > 0 and source_format == "JPEG":
+        for factor in (8, 4, 2):
+            if max(size) // factor >= max_dimension:
+                reduction = factor
+                break
+
+    img = cv2.imdecode(buffer, getattr(cv2, _REDUCED_FLAGS.get(reduction, "IMREAD_COLOR")))
+    if img is None:
+        return None, {"source_format": source_format}
+
+    height, width = img.shape[:2]
+    source_width, source_height = size if size is not None else (width, height)
+    resized = reduction > 1
+    if max_dimension > 0 and max(height, width) > max_dimension:
+        img = cv2.resize(img, fitted_size((width, height), max_dimension), interpolation=cv2.INTER_AREA)
+        resized = True
+    if resized:
+        logger.info(f"Decoded {source_width}x{source_height} image at 1/{reduction}, resized to {img.shape[1]}x{img.shape[0]}")
+
+    info = {
+        "source_format": source_format,
+        "source_width": int(source_width),
+        "source_height": int(source_height),
+        "width": int(img.shape[1]),
+        "height": int(img.shape[0]),
+        "decode_reduction": reduction,
+        "resized": resized
+    }
+    return img, info
+
+def encode_image(img: np.ndarray, fmt: str = "jpeg", quality: int = IMAGE_QUALITY, progressive: bool = False) -> bytes:
+    """Encode a BGR image as JPEG or WebP"""
+    if fmt == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    else:
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_PROGRESSIVE, int(progressive)]
+    ok, encoded = cv2.imencode(f".{IMAGE_FORMATS[fmt][0]}", img, params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {fmt}")
+    return encoded.tobytes()
+
+# ================================
+# ANIMATION
+# ================================
+
+# First FOURCC that opened a writer in this process (H.264 is missing from some OpenCV builds)
+_working_fourcc: Optional[str] = None
+
+def _open_video_writer(path: str, fps: float, size: Tuple[int, int]) -> "cv2.VideoWriter":
+    global _working_fourcc
+
+    candidates = [_working_fourcc] if _working_fourcc else ANIMATION_FOURCC
+    for code in candidates:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*code), fps, size)
+        if writer.isOpened():
+            _working_fourcc = code
+            return writer
+        writer.release()
+    raise ValueError(f"No MP4 codec available (tried {candidates})")
+
+def _encode_mp4(frames: Iterator[np.ndarray], size: Tuple[int, int], frame_ms: int) -> bytes:
+    # VideoWriter only writes to a path; the file lives for the duration of the encode
+    fd, path = tempfile.mkstemp(suffix=".mp4")
+    os.close(fd)
+    try:
+        writer = _open_video_writer(path, 1000.0 / frame_ms, size)
+        try:
+            for frame in frames:
+                writer.write(frame)
+        finally:
+            writer.release()
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+def animation_buffer_bytes(fmt: str, frame_count: int, size: Tuple[int, int]) -> int:
+    """Frame memory held while encoding: one BGR frame for mp4, every frame for webp/gif"""
+    width, height = size
+    if fmt not in _BUFFERED_BYTES_PER_PIXEL:
+        return width * height * 3
+    return frame_count * width * height * _BUFFERED_BYTES_PER_PIXEL[fmt]
+
+def encode_animation(frames: Iterable[np.ndarray], size: Tuple[int, int], fmt: str = "mp4",
+                     frame_ms: int = 500, quality: int = IMAGE_QUALITY) -> bytes:
+    """Encode BGR frames of (width, height) `size` as a looping animation; only mp4 avoids holding every frame"""
+    frames = iter(frames)
+    if fmt == "mp4":
+        # Most codecs need even dimensions
+        width, height = size[0] - size[0] % 2, size[1] - size[1] % 2
+        return _encode_mp4((frame[:height, :width] for frame in frames), (width, height), frame_ms)
+
+    pil_frames = (Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for frame in frames)
+    if fmt == "gif":
+        # Octree without dithering is ~20x faster than Pillow's default median cut and
+        # compresses far better, since dither noise defeats GIF's LZW
+        pil_frames = (frame.quantize(256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+                      for frame in pil_frames)
+    first = next(pil_frames)
+    # method=0 is the fastest WebP encoder setting, at about the same size for photos
+    options = {"quality": quality, "method": 0} if fmt == "webp" else {}
+    buffer = io.BytesIO()
+    first.save(buffer, format=fmt.upper(), save_all=True, append_images=pil_frames,
+               duration=frame_ms, loop=0, **options)
+    return buffer.getvalue()
@@ -0,0 +1,183 @@
+"""
+Column-projected, typed CSV ingestion.
+
+Station exports carry dozens of sensor columns, but the pipeline only needs
+the date, PM2.5 and the optional pollutant columns. The header is sniffed
+first so column detection runs before any data is parsed, then only the
+detected columns are read with explicit dtypes:
+
+    date column         string
+    text columns        string (e.g. a station column in long-format files)
+    pollutant columns   float32 (AQI_INGEST_FLOAT_DTYPE)
+
+float32 cannot hold most decimals exactly (35.4 reads back as 35.4000015),
+so columns are promoted with ``widen_floats``, which rounds to the 7
+significant digits float32 carries; otherwise values at EPA breakpoints land
+in the gap between two bands.
+
+The pyarrow engine is used when it is installed. Files larger than
+AQI_INGEST_CHUNK_BYTES are read in chunks of AQI_INGEST_CHUNK_ROWS rows to
+bound the parser's peak memory. Every read reports its parse time and
+rss_delta_bytes: how much the resident set of the whole process grew during
+the read. That includes native (pyarrow, parser) buffers, but also anything
+concurrent requests allocated meanwhile, and memory freed before the read
+ended does not show. With AQI_INGEST_TRACE_MEMORY=1 the tracemalloc peak is
+reported as well (traced_peak_bytes); it only sees Python/NumPy allocations
+of the whole process and slows every allocation while tracing, so it is off
+by default.
+"""
+
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import psutil
+
+logger = logging.getLogger(__name__)
+
+INGEST_FLOAT_DTYPE = os.getenv("AQI_INGEST_FLOAT_DTYPE", "float32")
+INGEST_CHUNK_BYTES = int(os.getenv("AQI_INGEST_CHUNK_BYTES", str(64 * 1024 * 1024)))
+INGEST_CHUNK_ROWS = int(os.getenv("AQI_INGEST_CHUNK_ROWS", "200000"))
+INGEST_TRACE_MEMORY = os.getenv("AQI_INGEST_TRACE_MEMORY", "0") == "1"
+
+# Significant decimal digits a float32 reproduces
+FLOAT32_DIGITS = 7
+
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# tracemalloc is process-wide, so only one read (or profiled request) at a time measures its peak
+memory_trace_lock = threading.Lock()
+
+# ================================
+# HEADER SNIFFING
+# ================================
+
+def sniff_header(csv_file) -> List[str]:
+    """Read only the header row and rewind the file"""
+    csv_file.seek(0)
+    header = pd.read_csv(csv_file, nrows=0)
+    csv_file.seek(0)
+    return list(header.columns)
+
+def header_frame(header: List[str]) -> pd.DataFrame:
+    """Empty frame with stripped header names, for column detection before any data is read"""
+    return pd.DataFrame(columns=[str(col).strip() for col in header])
+
+def _file_size(csv_file) -> int:
+    position = csv_file.tell()
+    csv_file.seek(0, os.SEEK_END)
+    size = csv_file.tell()
+    csv_file.seek(position)
+    return size
+
+# ================================
+# PROJECTED READ
+# ================================
+
+def _read(csv_file, raw_columns: List[str], dtypes: Dict[str, str], engine: str, chunked: bool) -> Tuple[pd.DataFrame, int]:
+    csv_file.seek(0)
+    if not chunked:
+        return pd.read_csv(csv_file, usecols=raw_columns, dtype=dtypes, engine=engine), 1
+
+    chunks = list(pd.read_csv(
+        csv_file, usecols=raw_columns, dtype=dtypes, engine=engine, chunksize=INGEST_CHUNK_ROWS
+    ))
+    if not chunks:
+        return pd.DataFrame({col: pd.Series(dtype=dtypes[col]) for col in raw_columns}), 0
+    return pd.concat(chunks, ignore_index=True), len(chunks)
+
+def read_projected_csv(csv_file, header: List[str], date_col: str, numeric_cols: List[str],
+                       text_cols: Sequence[str] = ()) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Read only `date_col`, `numeric_cols` and `text_cols` (stripped names) from the CSV.
+
+    Numeric columns that contain non-numeric junk are re-read as strings and
+    coerced, matching the pd.to_numeric(errors='coerce') the pipeline used to do.
+    Returns the frame (stripped column names) and an ingestion report.
+    """
+    raw_by_name = {str(col).strip(): col for col in header}
+    wanted = [date_col] + [col for col in [*numeric_cols, *text_cols] if col != date_col]
+    raw_columns = list(dict.fromkeys(raw_by_name[col] for col in wanted))
+
+    size = _file_size(csv_file)
+    chunked = size > INGEST_CHUNK_BYTES
+    # The pyarrow engine does not support chunked reads
+    engine = "pyarrow" if PYARROW_AVAILABLE and not chunked else "c"
+
+    text_dtype = "string" if engine == "pyarrow" else "object"
+    dtypes = {raw_by_name[col]: text_dtype for col in [date_col, *text_cols]}
+    for col in numeric_cols:
+        if col != date_col and col not in text_cols:
+            dtypes[raw_by_name[col]] = INGEST_FLOAT_DTYPE
+
+    trace = INGEST_TRACE_MEMORY and not tracemalloc.is_tracing() and memory_trace_lock.acquire(blocking=False)
+    if trace:
+        tracemalloc.start()
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+    start = time.perf_counter()
+    coerced = False
+    try:
+        try:
+            df, chunks = _read(csv_file, raw_columns, dtypes, engine, chunked)
+        except (ValueError, TypeError):
+            # Non-numeric cells in a numeric column: read as text, then coerce
+            text_dtypes = {col: "object" for col in raw_columns}
+            df, chunks = _read(csv_file, raw_columns, text_dtypes, "c", chunked)
+            for col in numeric_cols:
+                if col != date_col and col not in text_cols:
+                    raw = raw_by_name[col]
+                    df[raw] = pd.to_numeric(df[raw], errors='coerce').astype(INGEST_FLOAT_DTYPE)
+            engine, coerced = "c", True
+
+        parse_seconds = time.perf_counter() - start
+        rss_delta = process.memory_info().rss - rss_before
+        peak_bytes = tracemalloc.get_traced_memory()[1] if trace else None
+    finally:
+        if trace:
+            tracemalloc.stop()
+            memory_trace_lock.release()
+
+    df.columns = df.columns.str.strip()
+
+    ingest_info = {
+        "engine": engine,
+        "chunked": chunked,
+        "chunks": chunks,
+        "file_bytes": size,
+        "rows": len(df),
+        "columns_read": len(raw_columns),
+        "columns_total": len(header),
+        "float_dtype": INGEST_FLOAT_DTYPE,
+        "coerced_non_numeric": coerced,
+        "parse_seconds": round(parse_seconds, 4),
+        "rss_delta_bytes": rss_delta,
+        "traced_peak_bytes": peak_bytes,
+        "frame_bytes": int(df.memory_usage(deep=True).sum())
+    }
+    logger.info(
+        f"Ingested {len(df)} rows, {len(raw_columns)}/{len(header)} columns "
+        f"({engine} engine{', chunked' if chunked else ''}) in {parse_seconds:.3f}s"
+    )
+    return df, ingest_info
+
+def widen_floats(values: pd.Series) -> pd.Series:
+    """Numeric float64 copy of a column; float32 values are rounded to the digits they were read with"""
+    numeric = pd.to_numeric(values, errors='coerce')
+    wide = numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+    if numeric.dtype == np.float32:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            digits = FLOAT32_DIGITS - np.ceil(np.log10(np.abs(wide)))
+        # Integer / power of ten is correctly rounded, so 35.4000015 becomes exactly 35.4
+        scale = 10.0 ** np.clip(np.nan_to_num(digits, nan=0.0, posinf=0.0, neginf=0.0), 0, 15)
+        wide = np.rint(wide * scale) / scale
+    return pd.Series(wide, index=values.index, name=values.name)
@@ -0,0 +1,184 @@
+"""
+Background job runner for long-running analyses.
+
+A multi-panel analysis on a few years of data can outlive a proxy's request
+timeout. Jobs are accepted into a bounded queue, picked up by a fixed number
+of worker tasks that run the regular analysis pipeline, and their results are
+kept for a limited time so clients can poll and fetch them.
+
+Configuration (environment variables):
+    AQI_JOB_WORKERS         Concurrent jobs (default: 2)
+    AQI_JOB_QUEUE_SIZE      Maximum queued jobs before submissions are rejected (default: 32)
+    AQI_JOB_RESULT_TTL      Seconds a finished job and its result are kept (default: 3600)
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# ================================
+# JOB RECORD
+# ================================
+
+class Job:
+    """State of one submitted analysis"""
+
+    def __init__(self, runner: Callable[["Job"], Awaitable[Dict]]):
+        self.id = uuid.uuid4().hex
+        self.runner = runner
+        self.status = JOB_QUEUED
+        self.stage: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict] = None
+        self.error: Optional[Dict[str, Any]] = None
+
+    def set_stage(self, stage: str):
+        """Progress callback handed to the analysis pipeline"""
+        self.stage = stage
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_DONE, JOB_FAILED)
+
+    def to_status(self) -> Dict[str, Any]:
+        """Poll payload (never includes the result itself)"""
+        def iso(ts):
+            return datetime.fromtimestamp(ts).isoformat() if ts else None
+
+        status = {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "created_at": iso(self.created_at),
+            "started_at": iso(self.started_at),
+            "finished_at": iso(self.finished_at),
+            "result_url": f"/analyze/jobs/{self.id}/result" if self.status == JOB_DONE else None
+        }
+        if self.started_at:
+            status["elapsed_seconds"] = round((self.finished_at or time.time()) - self.started_at, 3)
+        if self.error:
+            status["error"] = self.error
+        return status
+
+# ================================
+# JOB MANAGER
+# ================================
+
+class JobManager:
+    """Bounded queue + fixed worker tasks + TTL-based result retention"""
+
+    def __init__(self, workers: int, queue_size: int, result_ttl: float):
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.result_ttl = result_ttl
+        self._jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    async def start(self):
+        """Start the worker tasks (called from the app lifespan)"""
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"aqi-job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} job workers (queue size {self.queue_size}, result TTL {self.result_ttl}s)")
+
+    async def stop(self):
+        """Cancel the worker tasks; queued jobs are dropped"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, runner: Callable[[Job], Awaitable[Dict]]) -> Job:
+        """Queue a job, raising HTTP 503 when the queue is full"""
+        self.purge_expired()
+        if self._queue is None:
+            raise HTTPException(status_code=503, detail="Job runner is not started")
+
+        job = Job(runner)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Analysis queue is full ({self.queue_size} jobs). Please retry later."
+            )
+        self._jobs[job.id] = job
+        logger.info(f"Queued analysis job {job.id} (queue depth {self._queue.qsize()})")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job that has not expired yet"""
+        self.purge_expired()
+        return self._jobs.get(job_id)
+
+    def purge_expired(self):
+        """Forget finished jobs older than the result TTL"""
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_DONE: 0, JOB_FAILED: 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "queue_depth": self.queue_depth(),
+            "result_ttl_seconds": self.result_ttl,
+            "jobs": counts
+        }
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = await job.runner(job)
+                job.status = JOB_DONE
+                logger.info(f"Analysis job {job.id} completed on worker {index}")
+            except HTTPException as he:
+                job.status = JOB_FAILED
+                job.error = {"status_code": he.status_code, "detail": he.detail}
+                logger.warning(f"Analysis job {job.id} failed: {he.detail}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.status = JOB_FAILED
+                job.error = {"status_code": 500, "detail": str(e)}
+                logger.error(f"Unexpected error in analysis job {job.id}: {str(e)}", exc_info=True)
+            finally:
+                job.finished_at = time.time()
+                # Drop the closure so the uploaded bytes can be freed
+                job.runner = None
+                self._queue.task_done()
+
+job_manager = JobManager(
+    workers=int(os.getenv("AQI_JOB_WORKERS", "2")),
+    queue_size=int(os.getenv("AQI_JOB_QUEUE_SIZE", "32")),
+    result_ttl=float(os.getenv("AQI_JOB_RESULT_TTL", "3600"))
+)
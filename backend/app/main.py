@@ -1,24 +1,60 @@
+from .startup import (WARMUP_ON_STARTUP, lazy_import, load_lazy_modules, mark, startup_report,
+                      timed_imports, warmup)
+
+# Core dependencies every request needs, imported up front and timed for the startup report
+timed_imports("numpy", "pandas", "fastapi")
+
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 import pandas as pd
 import numpy as np
-import cv2
-from prophet import Prophet
-import matplotlib.pyplot as plt
-import seaborn as sns
+import asyncio
 import base64
 import io
 import os
 import warnings
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 import json
 from urllib.parse import quote_plus
 import logging
 import shutil
+import threading
+import time
 import psutil
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from .executor import POOL_WORKERS, run_stage, run_render, start_executor, shutdown_executor, get_executor_info
+from .forecast_cache import forecast_cache, make_cache_key
+from .jobs import job_manager
+from .model_registry import series_identity, registry_key, list_models, delete_model
+from .ingest import sniff_header, header_frame, read_projected_csv, widen_floats
+from .dates import parse_dates
+from .serialization import FastJSONResponse
+from .downsample import downsample_frame
+from .imaging import (IMAGE_FORMAT, IMAGE_FORMATS, IMAGE_QUALITY, PASSTHROUGH_FORMATS, ANIMATION_FORMATS,
+                      animation_buffer_bytes, decode_image, encode_image, encode_animation, fitted_size,
+                      probe_image)
+from .artifacts import DELIVERY_MODES, ARTIFACT_DELIVERY, ArtifactStaticFiles, artifact_stats, deliver_artifact, store_artifact
+from .aqi import AQI_BREAKPOINTS, compute_aqi_frame, compute_daily_aqi, aqi_series_payload, truncate_concentration
+from .engines import ENGINES, FASTEST_ENGINE, INTERVAL_MODES, run_forecast, warm_up_prophet
+from .tracing import (TracingMiddleware, current_request_id, current_trace, new_trace, record_since_request_start,
+                      record_spans, span, start_span, traced)
+from .profiling import ProfileSession, profile_mode, load_profile, list_profiles, raw_profile_path
+from .metrics import (CONTENT_TYPE, FORECAST_SECONDS, PIPELINE_STAGE_SECONDS, MetricsMiddleware, StageTimer,
+                      register_collector, render_metrics)
+
+# Heavy modules load on first use (or during the warm-up), not with the app;
+# prophet is imported inside the engine and registry functions
+cv2 = lazy_import("cv2")
+mpl_figure = lazy_import("matplotlib.figure")
+mpl_agg = lazy_import("matplotlib.backends.backend_agg")
 
 warnings.filterwarnings('ignore')
 
@@ -29,7 +65,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Air Quality Analysis API", version="2.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the pipeline process pool and job workers with the app, tear them down on shutdown"""
+    start_executor()
+    await job_manager.start()
+    # Resource logging and the warm-up run in the background, so /health answers right away
+    asyncio.get_running_loop().run_in_executor(None, log_system_resources)
+    if WARMUP_ON_STARTUP:
+        warmup.start(warmup_steps())
+    mark("ready")
+    yield
+    await warmup.stop()
+    await job_manager.stop()
+    shutdown_executor()
+
+app = FastAPI(
+    title="Air Quality Analysis API", version="2.0.0", lifespan=lifespan,
+    default_response_class=FastJSONResponse
+)
 
 # ================================
 # GLOBAL EXCEPTION HANDLER
@@ -195,9 +249,6 @@ def log_system_resources():
     
     logger.info("=" * 60)
 
-# Initialize and log system resources when the app starts
-log_system_resources()
-
 # Periodic logging function (can be called periodically)
 def periodic_system_check():
     """Periodic system resource check - can be called by external scheduler"""
@@ -239,21 +290,36 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# Request ids and the root span of each request's trace (see tracing.py)
+app.add_middleware(TracingMiddleware)
+# Added last so it is outermost and times every request, CORS preflights included
+app.add_middleware(MetricsMiddleware)
 
 # Create directories for file storage
-os.makedirs("temp", exist_ok=True)
 os.makedirs("outputs", exist_ok=True)
 os.makedirs("plots", exist_ok=True)
 
 # Mount static files
-app.mount("/outputs", StaticFiles(directory="outputs"), name="outputs")
+# Content-addressed artifacts under outputs/artifacts are served as immutable (see artifacts.py)
+app.mount("/outputs", ArtifactStaticFiles(directory="outputs"), name="outputs")
 app.mount("/plots", StaticFiles(directory="plots"), name="plots")
 
 # ================================
 # UTILITY FUNCTIONS
 # ================================
 
+DATE_COLUMN_NAMES = ['date', 'datetime', 'timestamp', 'time']
+PM25_COLUMN_NAMES = ['pm25', 'pm2.5', 'pm_25', 'aqi', 'pm25_avg']
+POLLUTANT_COLUMN_NAMES = {
+    'pm10': ['pm10', 'pm_10'],
+    'o3': ['o3', 'ozone'],
+    'no2': ['no2', 'nitrogen_dioxide'],
+    'so2': ['so2', 'sulfur_dioxide'],
+    'co': ['co', 'carbon_monoxide']
+}
+
 def find_column(df: pd.DataFrame, possible_names: List[str]) -> Optional[str]:
     """Find column by checking multiple possible names (case-insensitive)"""
     df_cols_lower = [col.lower().strip() for col in df.columns]
@@ -262,6 +328,73 @@ def find_column(df: pd.DataFrame, possible_names: List[str]) -> Optional[str]:
             return df.columns[df_cols_lower.index(name.lower())]
     return None
 
+def series_frame(dates: pd.Series, values: pd.Series) -> pd.DataFrame:
+    """Build the sorted ds/y frame the engines expect from parsed dates and raw PM2.5 values"""
+    # Columns are read as float32, the models work in double precision
+    aqi_df = pd.DataFrame({'ds': dates, 'y': widen_floats(values)})
+    aqi_df = aqi_df.dropna()
+    # Sort by date to ensure chronological order (important for getting latest values)
+    return aqi_df.sort_values('ds').reset_index(drop=True)
+
+def prepare_series(df: pd.DataFrame, date_col: str, pm25_col: str) -> Tuple[pd.DataFrame, Dict]:
+    """Parse dates in one vectorized pass and build the sorted ds/y frame the engines expect"""
+    dates, date_info = parse_dates(df[date_col], date_col)
+    # Later steps sort the raw frame chronologically, so keep the parsed dates there too
+    df[date_col] = dates
+    return series_frame(dates, df[pm25_col]), date_info
+
+def series_statistics(aqi_df: pd.DataFrame) -> Dict:
+    """Record count, date range and statistics of the most recent 30 points"""
+    # Get the most recent 30 data points (already sorted chronologically)
+    recent_data = aqi_df.tail(30)['y']
+    # Calculate trend from oldest to newest in the recent period
+    trend_slope = safe_float((recent_data.iloc[-1] - recent_data.iloc[0]) / len(recent_data) if len(recent_data) > 1 else 0)
+    trend_direction = "Worsening" if trend_slope > 1 else "Improving" if trend_slope < -1 else "Stable"
+    
+    # Calculate safe statistics
+    stats = safe_series_stats(recent_data)
+    
+    return {
+        "total_records": len(aqi_df),
+        "date_range": {
+            "start": aqi_df['ds'].min().strftime('%Y-%m-%d'),
+            "end": aqi_df['ds'].max().strftime('%Y-%m-%d')
+        },
+        "recent_30_days": {
+            "average": stats["mean"],
+            "median": stats["median"],
+            "maximum": stats["max"],
+            "minimum": stats["min"],
+            "std_dev": stats["std"],
+            "days_above_safe": int(sum(recent_data > 50)) if len(recent_data) > 0 else 0,
+            "trend_direction": trend_direction,
+            "trend_slope": trend_slope
+        }
+    }
+
+def latest_pollutant_values(df: pd.DataFrame, date_col: str, additional_params: Dict[str, str]) -> Tuple[Dict[str, float], Dict]:
+    """Latest concentration and 30-row average of each additional pollutant, in chronological order"""
+    concentrations, analysis = {}, {}
+    if not additional_params:
+        return concentrations, analysis
+    
+    # Sort the original dataframe by date to get chronologically latest values
+    df_sorted = df.sort_values(date_col).reset_index(drop=True)
+    
+    for param, col in additional_params.items():
+        param_data = widen_floats(df_sorted[col])
+        if not param_data.isna().all():
+            # Get the latest non-null value in chronological order
+            latest_value = safe_float(param_data.dropna().iloc[-1])
+            concentrations[param] = latest_value
+            avg_30_days = safe_float(param_data.tail(30).mean()) if len(param_data) >= 30 else latest_value
+            analysis[param] = {
+                "latest_value": latest_value,
+                "average_30_days": avg_30_days,
+                "unit": "μg/m³" if param != 'co' else "mg/m³"
+            }
+    return concentrations, analysis
+
 def classify_aqi(aqi_value: float) -> Tuple[str, str]:
     """Classify AQI value and return category with color"""
     if aqi_value <= 50:
@@ -345,34 +478,91 @@ def aqi_to_haze_intensity(aqi: float) -> int:
     elif aqi <= 300: return 150
     else: return 200
 
+# ================================
+# BATCHED CLASSIFICATION
+# ================================
+
+# Upper bounds of the AQI bands used by classify_aqi / aqi_to_haze_intensity
+AQI_BAND_LIMITS = np.array([50, 100, 150, 200, 300], dtype=np.float64)
+AQI_BAND_CATEGORIES = np.array(["Good", "Moderate", "Unhealthy for Sensitive Groups",
+                                "Unhealthy", "Very Unhealthy", "Hazardous"], dtype=object)
+AQI_BAND_COLORS = np.array(["#00e400", "#ffff00", "#ff7e00", "#ff0000", "#8f3f97", "#7e0023"], dtype=object)
+AQI_BAND_HAZE = np.array([0, 30, 60, 100, 150, 200], dtype=np.int64)
+
+def safe_float_array(values, default=0.0) -> np.ndarray:
+    """Vectorized safe_float: NaN/inf/None become `default`"""
+    values = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+    return np.where(np.isfinite(values), values, default)
+
+def aqi_band_index(aqi_values: np.ndarray) -> np.ndarray:
+    """Band index 0-5 per value; side='left' keeps the bands' inclusive upper bounds (50 is Good)"""
+    return np.searchsorted(AQI_BAND_LIMITS, aqi_values, side='left')
+
+def classify_aqi_array(aqi_values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Batched classify_aqi: category and color arrays for a whole AQI array"""
+    bands = aqi_band_index(aqi_values)
+    return AQI_BAND_CATEGORIES[bands], AQI_BAND_COLORS[bands]
+
+def haze_intensity_array(aqi_values: np.ndarray) -> np.ndarray:
+    """Batched aqi_to_haze_intensity"""
+    return AQI_BAND_HAZE[aqi_band_index(aqi_values)]
+
+def build_prediction_records(forecast_rows: pd.DataFrame, include_haze: bool = True, include_bounds: bool = True) -> List[Dict]:
+    """Build prediction records column-wise (sanitize, classify and format each column once)"""
+    dates = pd.to_datetime(forecast_rows['ds']).dt.strftime("%Y-%m-%d").tolist()
+    yhat = safe_float_array(forecast_rows['yhat'])
+    categories, colors = classify_aqi_array(yhat)
+
+    columns = {
+        "date": dates,
+        "predicted_aqi": yhat.tolist(),
+        "category": categories.tolist(),
+        "color": colors.tolist()
+    }
+    if include_haze:
+        columns["haze_intensity"] = haze_intensity_array(yhat).tolist()
+    if include_bounds:
+        columns["confidence_lower"] = safe_float_array(forecast_rows['yhat_lower']).tolist()
+        columns["confidence_upper"] = safe_float_array(forecast_rows['yhat_upper']).tolist()
+
+    keys = list(columns)
+    return [dict(zip(keys, row)) for row in zip(*columns.values())]
+
+# Tint (BGR) and the image's weight for each AQI band above Good; a haze blend follows
+SMOG_TINTS = [
+    None,
+    ((0, 200, 255), 0.9),     # Moderate: yellow tint
+    ((100, 150, 200), 0.8),   # Unhealthy for Sensitive Groups: brown haze
+    ((120, 120, 150), 0.6),   # Unhealthy: thick smog
+    ((80, 80, 120), 0.4),     # Very Unhealthy: dark smog
+    ((60, 60, 90), 0.3)       # Hazardous: extreme smog
+]
+HAZE_COLOR = (200, 200, 200)
+
+@lru_cache(maxsize=256)
+def smog_lut(band: int, intensity: float) -> np.ndarray:
+    """1x256x3 lookup table mapping each channel value through the tint and haze blends"""
+    # The blends run in float32 over every possible input value, exactly as they
+    # used to run over every pixel
+    ramp = np.repeat(np.arange(256, dtype=np.float32).reshape(1, 256, 1), 3, axis=2)
+    tint, weight = SMOG_TINTS[band]
+    result = cv2.addWeighted(ramp, weight, np.full_like(ramp, tint), 1 - weight, 0)
+    
+    alpha = min(intensity / 255.0, 0.8)
+    result = cv2.addWeighted(result, 1 - alpha, np.full_like(result, HAZE_COLOR), alpha, 0)
+    return np.clip(result, 0, 255).astype(np.uint8)
+
 def apply_atmospheric_effects(image: np.ndarray, aqi_value: float, intensity: int) -> np.ndarray:
     """Apply various atmospheric effects based on AQI level"""
-    result = image.copy().astype(np.float32)
-    
-    if aqi_value <= 50:
+    band = int(aqi_band_index(np.float64(aqi_value)))
+    if band == 0:
         return image
-    elif aqi_value <= 100:
-        yellow_tint = np.full_like(result, [0, 200, 255])
-        result = cv2.addWeighted(result, 0.9, yellow_tint, 0.1, 0)
-    elif aqi_value <= 150:
-        brown_haze = np.full_like(result, [100, 150, 200])
-        result = cv2.addWeighted(result, 0.8, brown_haze, 0.2, 0)
-    elif aqi_value <= 200:
-        thick_smog = np.full_like(result, [120, 120, 150])
-        result = cv2.addWeighted(result, 0.6, thick_smog, 0.4, 0)
-    elif aqi_value <= 300:
-        dark_smog = np.full_like(result, [80, 80, 120])
-        result = cv2.addWeighted(result, 0.4, dark_smog, 0.6, 0)
-    else:
-        extreme_smog = np.full_like(result, [60, 60, 90])
-        result = cv2.addWeighted(result, 0.3, extreme_smog, 0.7, 0)
     
-    # Add general haze effect
-    haze = np.full_like(result, [200, 200, 200])
-    alpha = min(intensity / 255.0, 0.8)
-    result = cv2.addWeighted(result, 1-alpha, haze, alpha, 0)
-    
-    return np.clip(result, 0, 255).astype(np.uint8)
+    # Blending with a constant color is a per-channel affine map, so the whole effect
+    # is one table lookup on the uint8 image with no full-size float temporaries
+    if image.dtype != np.uint8:
+        image = np.clip(image, 0, 255).astype(np.uint8)
+    return cv2.LUT(image, smog_lut(band, float(intensity)))
 
 #can generate this using LLM
 def get_detailed_health_recommendations(aqi_value: float) -> Dict[str, str]:
@@ -438,27 +628,14 @@ def get_detailed_health_recommendations(aqi_value: float) -> Dict[str, str]:
 
 def calculate_detailed_aqi(pollutant_concentrations: Dict[str, float]) -> Dict[str, int]:
     """Calculate detailed AQI for multiple pollutants using EPA breakpoints"""
-    # EPA breakpoints are the concentration thresholds for specific air pollutants that define
-    # the different levels of the Air Quality Index (AQI), such as "Good," "Moderate," and "Unhealthy"
-    breakpoints = {
-        'pm25': [(0.0, 12.0, 0, 50), (12.1, 35.4, 51, 100), (35.5, 55.4, 101, 150),
-                 (55.5, 150.4, 151, 200), (150.5, 250.4, 201, 300), (250.5, 500.4, 301, 500)],
-        'pm10': [(0, 54, 0, 50), (55, 154, 51, 100), (155, 254, 101, 150),
-                 (255, 354, 151, 200), (355, 424, 201, 300), (425, 604, 301, 500)],
-        'o3': [(0, 54, 0, 50), (55, 70, 51, 100), (71, 85, 101, 150),
-               (86, 105, 151, 200), (106, 200, 201, 300)],
-        'no2': [(0, 53, 0, 50), (54, 100, 51, 100), (101, 360, 101, 150),
-                (361, 649, 151, 200), (650, 1249, 201, 300)],
-        'so2': [(0, 35, 0, 50), (36, 75, 51, 100), (76, 185, 101, 150),
-                (186, 304, 151, 200), (305, 604, 201, 300)],
-        'co': [(0, 4.4, 0, 50), (4.5, 9.4, 51, 100), (9.5, 12.4, 101, 150),
-               (12.5, 15.4, 151, 200), (15.5, 30.4, 201, 300)]
-    }
+    breakpoints = AQI_BREAKPOINTS
     
     def get_aqi_from_concentration(pollutant, concentration):
         if pollutant not in breakpoints or concentration is None:
             return None
         
+        # Truncated to the table's precision (as in aqi.py), so no value falls between two bands
+        concentration = float(truncate_concentration(pollutant, concentration))
         for bp_low, bp_high, aqi_low, aqi_high in breakpoints[pollutant]:
             if bp_low <= concentration <= bp_high:
                 aqi = ((aqi_high - aqi_low) / (bp_high - bp_low)) * (concentration - bp_low) + aqi_low
@@ -475,523 +652,1276 @@ def calculate_detailed_aqi(pollutant_concentrations: Dict[str, float]) -> Dict[s
     
     return aqi_values
 
-def create_forecast_plot(aqi_df: pd.DataFrame, forecast: pd.DataFrame, predicted_aqi: float) -> str:
-    """Create comprehensive forecast visualization and return base64 encoded image"""
+# ================================
+# VISUALIZATION SETTINGS
+# ================================
+# image: server-rendered figures (base64), data: chart series for client-side drawing, none: skip
+VISUALIZATION_MODES = ("image", "data", "none")
+PLOT_FORMATS = {"png": "image/png", "webp": "image/webp", "svg": "image/svg+xml"}
+PLOT_DPI = int(os.getenv("AQI_PLOT_DPI", "300"))
+PLOT_FORMAT = os.getenv("AQI_PLOT_FORMAT", "png")
+MAX_PLOT_DPI = 600
+MAX_PLOT_SCALE = 4.0
+# History and trend are downsampled to about this many points (0 = keep every point)
+CHART_MAX_POINTS = int(os.getenv("AQI_CHART_MAX_POINTS", "2000"))
+
+def validate_visualizations(mode: str, plot_format: Optional[str], plot_dpi: Optional[int], plot_scale: float,
+                            max_points: Optional[int] = None) -> Dict:
+    """Normalize visualization options, rejecting bad values with a 400"""
+    mode = (mode or "").strip().lower()
+    if mode not in VISUALIZATION_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown visualizations mode '{mode}'. Available: {list(VISUALIZATION_MODES)}"
+        )
+    plot_format = (plot_format or PLOT_FORMAT).strip().lower()
+    if plot_format not in PLOT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown plot format '{plot_format}'. Available: {list(PLOT_FORMATS)}"
+        )
+    plot_dpi = PLOT_DPI if plot_dpi is None else plot_dpi
+    if not 20 <= plot_dpi <= MAX_PLOT_DPI:
+        raise HTTPException(status_code=400, detail=f"plot_dpi must be between 20 and {MAX_PLOT_DPI}")
+    if not 0.25 <= plot_scale <= MAX_PLOT_SCALE:
+        raise HTTPException(status_code=400, detail=f"plot_scale must be between 0.25 and {MAX_PLOT_SCALE}")
+    max_points = CHART_MAX_POINTS if max_points is None else max_points
+    if max_points != 0 and max_points < 10:
+        raise HTTPException(status_code=400, detail="plot_max_points must be 0 (no downsampling) or at least 10")
+    return {"mode": mode, "format": plot_format, "dpi": plot_dpi, "scale": plot_scale, "max_points": max_points}
+
+# seaborn-v0_8 look, applied per axes: changing global rcParams with
+# plt.style.use is not safe while other threads are rendering
+SEABORN_FACE = '#EAEAF2'
+SEABORN_TEXT = '.15'
+
+def _style_axes(ax, title: str, xlabel: str, ylabel: str):
+    ax.set_facecolor(SEABORN_FACE)
+    ax.set_axisbelow(True)
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+    ax.set_title(title, fontweight='bold', fontsize=12, color=SEABORN_TEXT)
+    ax.set_xlabel(xlabel, fontsize=11, color=SEABORN_TEXT)
+    ax.set_ylabel(ylabel, fontsize=11, color=SEABORN_TEXT)
+    ax.legend(frameon=False, fontsize=10)
+    ax.tick_params(colors=SEABORN_TEXT, labelsize=10, length=0, pad=7)
+    ax.tick_params(axis='x', rotation=45)
+    ax.grid(True, color='white', linestyle='-', linewidth=1.0, alpha=0.3)
+
+def forecast_plot_bytes(aqi_df: pd.DataFrame, forecast: pd.DataFrame, predicted_aqi: float,
+                        dpi: int = PLOT_DPI, fmt: str = "png", scale: float = 1.0,
+                        max_points: int = CHART_MAX_POINTS) -> bytes:
+    """Create comprehensive forecast visualization and return the encoded image"""
     # Ensure predicted_aqi is safe for visualization
     predicted_aqi = safe_float(predicted_aqi)
     
-    #using seaborn
-    plt.style.use('seaborn-v0_8')
-    fig, axes = plt.subplots(2, 2, figsize=(15, 10))
+    # Figure/Agg objects only, no pyplot state, so renders can run concurrently
+    fig = mpl_figure.Figure(figsize=(15 * scale, 10 * scale))
+    mpl_agg.FigureCanvasAgg(fig)
+    axes = fig.subplots(2, 2)
+    line_style = {'solid_capstyle': 'round'}
     
     # Historical data plot
-    axes[0,0].plot(aqi_df['ds'], aqi_df['y'], label='Historical Data', color='blue', alpha=0.7)
-    axes[0,0].set_title('Historical Air Quality Data', fontweight='bold')
-    axes[0,0].set_xlabel('Date')
-    axes[0,0].set_ylabel('PM2.5/AQI')
-    axes[0,0].legend()
-    axes[0,0].tick_params(axis='x', rotation=45)
-    axes[0,0].grid(True, alpha=0.3)
+    history = downsample_frame(aqi_df, 'ds', 'y', max_points)
+    axes[0,0].plot(history['ds'], history['y'], label='Historical Data', color='blue', alpha=0.7,
+                   linewidth=1.75, **line_style)
+    _style_axes(axes[0,0], 'Historical Air Quality Data', 'Date', 'PM2.5/AQI')
     
     # Forecast plot (30 days)
     forecast_recent = forecast.tail(60)
-    axes[0,1].plot(forecast_recent['ds'], forecast_recent['yhat'], label='Forecast', color='red', linewidth=2)
+    axes[0,1].plot(forecast_recent['ds'], forecast_recent['yhat'], label='Forecast', color='red', linewidth=2,
+                   **line_style)
     axes[0,1].fill_between(forecast_recent['ds'],
                            forecast_recent['yhat_lower'],
                            forecast_recent['yhat_upper'],
-                           alpha=0.3, color='red')
+                           alpha=0.3, color='red', linewidth=0.3)
     axes[0,1].axhline(y=predicted_aqi, color='darkred', linestyle='--', linewidth=2)
-    axes[0,1].set_title('30-Day Forecast with Confidence Bands', fontweight='bold')
-    axes[0,1].set_xlabel('Date')
-    axes[0,1].set_ylabel('Predicted PM2.5/AQI')
-    axes[0,1].legend()
-    axes[0,1].tick_params(axis='x', rotation=45)
-    axes[0,1].grid(True, alpha=0.3)
+    _style_axes(axes[0,1], '30-Day Forecast with Confidence Bands', 'Date', 'Predicted PM2.5/AQI')
     
     # Trend analysis
-    axes[1,0].plot(forecast['ds'], forecast['trend'], label='Long-term Trend', color='green', linewidth=2)
-    axes[1,0].set_title('Air Quality Trend Analysis', fontweight='bold')
-    axes[1,0].set_xlabel('Date')
-    axes[1,0].set_ylabel('PM2.5 Trend')
-    axes[1,0].legend()
-    axes[1,0].grid(True, alpha=0.3)
-    axes[1,0].tick_params(axis='x', rotation=45)
+    trend = downsample_frame(forecast, 'ds', 'trend', max_points)
+    axes[1,0].plot(trend['ds'], trend['trend'], label='Long-term Trend', color='green', linewidth=2,
+                   **line_style)
+    _style_axes(axes[1,0], 'Air Quality Trend Analysis', 'Date', 'PM2.5 Trend')
     
     # Recent data with moving average
     recent_data = aqi_df.tail(90)
-    axes[1,1].plot(recent_data['ds'], recent_data['y'], alpha=0.5, color='blue', label='Daily Values')
+    axes[1,1].plot(recent_data['ds'], recent_data['y'], alpha=0.5, color='blue', label='Daily Values',
+                   linewidth=1.75, **line_style)
     axes[1,1].plot(recent_data['ds'], recent_data['y'].rolling(7).mean(),
-                   label='7-day Average', color='red', linewidth=2)
-    axes[1,1].set_title('Recent Data with Moving Average', fontweight='bold')
-    axes[1,1].set_xlabel('Date')
-    axes[1,1].set_ylabel('PM2.5')
-    axes[1,1].legend()
-    axes[1,1].grid(True, alpha=0.3)
-    axes[1,1].tick_params(axis='x', rotation=45)
+                   label='7-day Average', color='red', linewidth=2, **line_style)
+    _style_axes(axes[1,1], 'Recent Data with Moving Average', 'Date', 'PM2.5')
     
-    plt.tight_layout()
+    fig.tight_layout()
     
-    # Convert plot to base64
     buffer = io.BytesIO()
-    plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
-    buffer.seek(0)
-    plot_data = buffer.getvalue()
-    buffer.close()
-    plt.close()
-    
-    return base64.b64encode(plot_data).decode('utf-8')
+    fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
 
-#image visualisation
-def create_aqi_gauge(predicted_aqi: float, aqi_category: str) -> str:
-    """Create AQI gauge visualization and return base64 encoded image"""
-    # Ensure predicted_aqi is safe for visualization
-    predicted_aqi = safe_float(predicted_aqi)
-    
-    fig, ax = plt.subplots(figsize=(8, 6), subplot_kw=dict(projection='polar'))
-    
+def create_forecast_plot(aqi_df: pd.DataFrame, forecast: pd.DataFrame, predicted_aqi: float,
+                         dpi: int = PLOT_DPI, fmt: str = "png", scale: float = 1.0,
+                         max_points: int = CHART_MAX_POINTS) -> str:
+    """Create comprehensive forecast visualization and return base64 encoded image"""
+    image = forecast_plot_bytes(aqi_df, forecast, predicted_aqi, dpi=dpi, fmt=fmt, scale=scale, max_points=max_points)
+    return base64.b64encode(image).decode('utf-8')
+
+# ================================
+# AQI GAUGE
+# ================================
+# The colored zones, labels and title never change, so they are rasterized once
+# per (dpi, scale) and each render only blits the pointer and texts onto them.
+# Finished gauges are additionally kept in an LRU keyed by integer AQI.
+
+GAUGE_CACHE_SIZE = int(os.getenv("AQI_GAUGE_CACHE_SIZE", "512"))
+GAUGE_BOUNDARIES = [0, 50, 100, 150, 200, 300, 500]
+GAUGE_LABELS = ['Good', 'Moderate', 'Unhealthy\nfor Sensitive', 'Unhealthy',
+                'Very\nUnhealthy', 'Hazardous']
+
+def _draw_gauge_background(ax):
     # AQI color zones
-    colors = ['#00e400', '#ffff00', '#ff7e00', '#ff0000', '#8f3f97', '#7e0023']
-    boundaries = [0, 50, 100, 150, 200, 300, 500]
-    labels = ['Good', 'Moderate', 'Unhealthy\nfor Sensitive', 'Unhealthy',
-              'Very\nUnhealthy', 'Hazardous']
-    
-    theta = np.linspace(0, np.pi, 100)
-    
-    for i in range(len(boundaries)-1):
-        start_angle = (boundaries[i] / 500) * np.pi
-        end_angle = (boundaries[i+1] / 500) * np.pi
+    for i in range(len(GAUGE_BOUNDARIES)-1):
+        start_angle = (GAUGE_BOUNDARIES[i] / 500) * np.pi
+        end_angle = (GAUGE_BOUNDARIES[i+1] / 500) * np.pi
         theta_segment = np.linspace(start_angle, end_angle, 20)
-        ax.fill_between(theta_segment, 0.7, 1.0, color=colors[i], alpha=0.8)
+        ax.fill_between(theta_segment, 0.7, 1.0, color=AQI_BAND_COLORS[i], alpha=0.8)
         
         # Add labels
         mid_angle = (start_angle + end_angle) / 2
-        ax.text(mid_angle, 0.6, labels[i], ha='center', va='center',
+        ax.text(mid_angle, 0.6, GAUGE_LABELS[i], ha='center', va='center',
                 fontsize=10, fontweight='bold')
     
-    # Add AQI pointer and value
-    aqi_normalized = min(predicted_aqi / 500, 1.0)
-    pointer_angle = aqi_normalized * np.pi
-    ax.plot([pointer_angle, pointer_angle], [0, 0.9], 'k-', linewidth=4)
-    ax.plot(pointer_angle, 0.85, 'ko', markersize=12)
-    ax.text(np.pi/2, 0.3, f'{predicted_aqi:.0f}', ha='center', va='center',
-            fontsize=24, fontweight='bold')
-    ax.text(np.pi/2, 0.1, 'AQI Level', ha='center', va='center',
-            fontsize=14, fontweight='bold')
-    ax.text(np.pi/2, -0.05, aqi_category, ha='center', va='center',
-            fontsize=12, fontweight='bold', color='red')
-    
     ax.set_xlim(0, np.pi)
     ax.set_ylim(0, 1)
     ax.set_title('Air Quality Index Gauge', fontsize=16, fontweight='bold', pad=20)
     ax.axis('off')
+
+def _draw_gauge_value(ax, predicted_aqi: float, aqi_category: str) -> list:
+    """Pointer, value and category artists (the only parts that change per request)"""
+    pointer_angle = min(predicted_aqi / 500, 1.0) * np.pi
+    return [
+        *ax.plot([pointer_angle, pointer_angle], [0, 0.9], 'k-', linewidth=4),
+        *ax.plot(pointer_angle, 0.85, 'ko', markersize=12),
+        ax.text(np.pi/2, 0.3, f'{predicted_aqi:.0f}', ha='center', va='center',
+                fontsize=24, fontweight='bold'),
+        ax.text(np.pi/2, 0.1, 'AQI Level', ha='center', va='center',
+                fontsize=14, fontweight='bold'),
+        ax.text(np.pi/2, -0.05, aqi_category, ha='center', va='center',
+                fontsize=12, fontweight='bold', color='red')
+    ]
+
+def _gauge_figure(dpi: int, scale: float):
+    fig = mpl_figure.Figure(figsize=(8 * scale, 6 * scale), dpi=dpi)
+    canvas = mpl_agg.FigureCanvasAgg(fig)
+    ax = fig.add_subplot(projection='polar')
+    _draw_gauge_background(ax)
+    return fig, canvas, ax
+
+_gauge_lock = threading.Lock()
+
+@lru_cache(maxsize=8)
+def _gauge_background(dpi: int, scale: float) -> Dict:
+    """Rasterized static gauge plus the pixel box bbox_inches='tight' would keep"""
+    fig, canvas, ax = _gauge_figure(dpi, scale)
+    artists = _draw_gauge_value(ax, 500, "Very Unhealthy")
+    for artist in artists:
+        artist.set_animated(True)
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+
+    # Same crop as savefig(bbox_inches='tight'): tight bbox + 0.1in padding, in pixels from the top-left
+    bbox = fig.get_tightbbox(canvas.get_renderer()).padded(0.1)
+    left, top = int(round(bbox.x0 * dpi)), int(round(fig.bbox.height - bbox.y1 * dpi))
+    crop = (
+        max(left, 0), min(left + int(bbox.width * dpi), int(fig.bbox.width)),
+        max(top, 0), min(top + int(bbox.height * dpi), int(fig.bbox.height))
+    )
+    for artist in artists:
+        artist.remove()
+    return {"fig": fig, "canvas": canvas, "ax": ax, "background": background, "crop": crop}
+
+#image visualisation
+def aqi_gauge_bytes(predicted_aqi: float, aqi_category: str,
+                    dpi: int = PLOT_DPI, fmt: str = "png", scale: float = 1.0) -> bytes:
+    """Create AQI gauge visualization and return the encoded image"""
+    # Ensure predicted_aqi is safe for visualization
+    predicted_aqi = safe_float(predicted_aqi)
     
-    # Convert to base64
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
-    buffer.seek(0)
-    plot_data = buffer.getvalue()
-    buffer.close()
-    plt.close()
+    if fmt == "svg":
+        # Vector output cannot reuse a raster background
+        fig, canvas, ax = _gauge_figure(dpi, scale)
+        _draw_gauge_value(ax, predicted_aqi, aqi_category)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+        return buffer.getvalue()
     
-    return base64.b64encode(plot_data).decode('utf-8')
+    cached = _gauge_background(dpi, scale)
+    canvas, ax = cached["canvas"], cached["ax"]
+    # The cached canvas is shared, so one blit at a time per process
+    with _gauge_lock:
+        canvas.restore_region(cached["background"])
+        artists = _draw_gauge_value(ax, predicted_aqi, aqi_category)
+        for artist in artists:
+            ax.draw_artist(artist)
+            artist.remove()
+        
+        x0, x1, y0, y1 = cached["crop"]
+        rgba = np.asarray(canvas.buffer_rgba())[y0:y1, x0:x1].copy()
+    params = [cv2.IMWRITE_WEBP_QUALITY, 90] if fmt == "webp" else []
+    ok, encoded = cv2.imencode(f".{fmt}", cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGRA), params)
+    if not ok:
+        raise ValueError(f"Could not encode gauge as {fmt}")
+    return encoded.tobytes()
+
+def create_aqi_gauge(predicted_aqi: float, aqi_category: str,
+                     dpi: int = PLOT_DPI, fmt: str = "png", scale: float = 1.0) -> str:
+    """Create AQI gauge visualization and return base64 encoded image"""
+    return base64.b64encode(aqi_gauge_bytes(predicted_aqi, aqi_category, dpi=dpi, fmt=fmt, scale=scale)).decode('utf-8')
+
+_gauge_cache: "OrderedDict[Tuple, bytes]" = OrderedDict()
+_gauge_cache_stats = {"hits": 0, "misses": 0}
+
+async def render_aqi_gauge(predicted_aqi: float, aqi_category: str,
+                           dpi: int = PLOT_DPI, fmt: str = "png", scale: float = 1.0) -> Tuple[bytes, Dict]:
+    """Gauge from the LRU (keyed by integer AQI), rendering in the render pool on a miss"""
+    aqi_value = float(round(safe_float(predicted_aqi)))
+    key = (aqi_value, aqi_category, dpi, fmt, scale)
+    if key in _gauge_cache:
+        _gauge_cache.move_to_end(key)
+        _gauge_cache_stats["hits"] += 1
+        return _gauge_cache[key], {"seconds": 0.0, "cache_hit": True}
+    
+    _gauge_cache_stats["misses"] += 1
+    gauge, timing = await run_render(aqi_gauge_bytes, aqi_value, aqi_category, dpi=dpi, fmt=fmt, scale=scale)
+    _gauge_cache[key] = gauge
+    while len(_gauge_cache) > GAUGE_CACHE_SIZE:
+        _gauge_cache.popitem(last=False)
+    return gauge, {**timing, "cache_hit": False}
+
+def _chart_dates(dates: pd.Series) -> np.ndarray:
+    """ISO strings, date-only when every timestamp is at midnight"""
+    dates = pd.to_datetime(dates)
+    daily = bool((dates == dates.dt.normalize()).all())
+    return dates.dt.strftime("%Y-%m-%d" if daily else "%Y-%m-%dT%H:%M:%S").to_numpy()
+
+def _chart_values(values: pd.Series) -> np.ndarray:
+    # float32 halves the digits sent for every point; NaN serializes as null
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float32)
+
+def create_visualization_data(aqi_df: pd.DataFrame, forecast: pd.DataFrame, predicted_aqi: float, aqi_category: str,
+                              max_points: int = CHART_MAX_POINTS) -> Dict:
+    """The series behind the forecast plot and gauge, for drawing charts client-side"""
+    history = downsample_frame(aqi_df, 'ds', 'y', max_points)
+    trend = downsample_frame(forecast, 'ds', 'trend', max_points)
+    forecast_recent = forecast.tail(60)
+    recent_data = aqi_df.tail(90)
+    return {
+        "history": {"ds": _chart_dates(history['ds']), "y": _chart_values(history['y'])},
+        "forecast": {
+            "ds": _chart_dates(forecast_recent['ds']),
+            "yhat": _chart_values(forecast_recent['yhat']),
+            "yhat_lower": _chart_values(forecast_recent['yhat_lower']),
+            "yhat_upper": _chart_values(forecast_recent['yhat_upper'])
+        },
+        "trend": {"ds": _chart_dates(trend['ds']), "trend": _chart_values(trend['trend'])},
+        "recent": {
+            "ds": _chart_dates(recent_data['ds']),
+            "y": _chart_values(recent_data['y']),
+            "rolling_mean_7": _chart_values(recent_data['y'].rolling(7).mean())
+        },
+        "gauge": {
+            "value": safe_float(predicted_aqi),
+            "category": aqi_category,
+            "boundaries": [0, *AQI_BAND_LIMITS.tolist(), 500],
+            "colors": AQI_BAND_COLORS.tolist(),
+            "labels": AQI_BAND_CATEGORIES.tolist()
+        }
+    }
 
 # ================================
-# API ENDPOINTS
+# PIPELINE STAGES
 # ================================
+# Module-level so they can be pickled and dispatched to the process pool
+# via run_stage(); they must not touch request objects.
 
-@app.get("/")
-async def root():
-    return {"message": "Air Quality Analysis API v2.0", "status": "active"}
+async def get_forecast(
+    aqi_df: pd.DataFrame,
+    periods: int,
+    prophet_kwargs: Optional[Dict] = None,
+    model_key: Optional[str] = None,
+    refit: bool = True,
+    engine: str = "prophet",
+    include_history: bool = True,
+    intervals: str = "sampled",
+    uncertainty_samples: Optional[int] = None
+) -> Tuple[pd.DataFrame, Dict]:
+    """Return the forecast frame from the shared cache, running the engine in the process pool on a miss"""
+    settings = {"engine": engine, "periods": periods, "include_history": include_history}
+    if engine == "prophet":
+        settings["prophet_kwargs"] = prophet_kwargs or {}
+        settings["intervals"] = intervals
+        settings["uncertainty_samples"] = uncertainty_samples
+    with span("cache_lookup") as lookup:
+        cache_key = await run_in_threadpool(make_cache_key, aqi_df, settings)
+        forecast = await run_in_threadpool(forecast_cache.get, cache_key)
+        if lookup is not None:
+            lookup.attributes["cache_hit"] = forecast is not None
+    if forecast is not None:
+        logger.info(f"Forecast cache hit ({cache_key[:12]}), skipping fit/predict")
+        return forecast, {"engine": engine, "model_key": model_key, "cache_hit": True}
 
-@app.post("/analyze")
-async def analyze_air_quality(
-    dataset: UploadFile = File(...),
-    ref_image: UploadFile = File(None)
-):
+    engine_kwargs = {}
+    if engine == "prophet":
+        engine_kwargs = {
+            "prophet_kwargs": prophet_kwargs,
+            "model_key": model_key,
+            "refit": refit,
+            "intervals": intervals,
+            "uncertainty_samples": uncertainty_samples
+        }
+    with span("forecast_engine", engine=engine):
+        forecast, fit_info = await run_stage(
+            run_forecast, engine, aqi_df, periods,
+            include_history=include_history, **engine_kwargs
+        )
+        phases = [(phase, fit_info[f"{phase}_seconds"]) for phase in ("fit", "predict") if f"{phase}_seconds" in fit_info]
+        for phase, seconds in phases:
+            FORECAST_SECONDS.observe(seconds, engine=engine, phase=phase)
+        # Measured inside the worker process, so added as finished spans
+        record_spans(phases)
+    # A forecast served from a stale registry model must not stand in for a real fit
+    if fit_info["refit"]:
+        await run_in_threadpool(forecast_cache.put, cache_key, forecast)
+    return forecast, {**fit_info, "cache_hit": False}
+
+def validate_intervals(intervals: str, uncertainty_samples: Optional[int]) -> str:
+    """Normalize the Prophet interval mode, rejecting bad values with a 400"""
+    intervals = (intervals or "").strip().lower()
+    if intervals not in INTERVAL_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown interval mode '{intervals}'. Available: {list(INTERVAL_MODES)}"
+        )
+    if uncertainty_samples is not None and uncertainty_samples < 0:
+        raise HTTPException(status_code=400, detail="uncertainty_samples must be zero or positive")
+    return intervals
+
+def forecast_timings(fit_info: Dict) -> Dict:
+    """Timing block for the response (fit/predict seconds and what the fast modes saved)"""
+    keys = [
+        "fit_seconds", "predict_seconds", "predict_rows", "intervals", "uncertainty_samples",
+        "estimated_default_predict_seconds", "predict_seconds_saved"
+    ]
+    return {key: fit_info[key] for key in keys if key in fit_info}
+
+def validate_engine(engine: str) -> str:
+    """Normalize the engine name, rejecting unknown engines with a 400"""
+    engine = (engine or "").strip().lower()
+    if engine not in ENGINES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown forecasting engine '{engine}'. Available: {list(ENGINES)}"
+        )
+    return engine
+
+def validate_delivery(delivery: Optional[str]) -> str:
+    """Normalize the artifact delivery mode, rejecting unknown modes with a 400"""
+    delivery = (delivery or ARTIFACT_DELIVERY).strip().lower()
+    if delivery not in DELIVERY_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown delivery '{delivery}'. Available: {list(DELIVERY_MODES)}"
+        )
+    return delivery
+
+def validate_image_options(image_format: Optional[str], image_quality: Optional[int], image_progressive: bool) -> Dict:
+    """Normalize smog image output options, rejecting bad values with a 400"""
+    image_format = (image_format or IMAGE_FORMAT).strip().lower()
+    if image_format == "jpg":
+        image_format = "jpeg"
+    if image_format not in IMAGE_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown image format '{image_format}'. Available: {list(IMAGE_FORMATS)}"
+        )
+    image_quality = IMAGE_QUALITY if image_quality is None else image_quality
+    if not 1 <= image_quality <= 100:
+        raise HTTPException(status_code=400, detail="image_quality must be between 1 and 100")
+    return {"format": image_format, "quality": image_quality, "progressive": bool(image_progressive)}
+
+def render_smog_images(image_bytes: bytes, predicted_aqi: float, haze_intensity: int,
+                       delivery: str = "inline", image_options: Optional[Dict] = None) -> Optional[Dict]:
+    """Apply the smog effect to the uploaded image bytes and return original/smog images (base64 or URLs)"""
+    image_options = image_options or validate_image_options(None, None, False)
+    img, image_info = decode_image(image_bytes)
+    if img is None:
+        return None
+
+    # takes the image , applies atmospheric effects based on AQI, and returns the modified image
+    smog_img = apply_atmospheric_effects(img, predicted_aqi, haze_intensity)
+
+    ext, mime_type = IMAGE_FORMATS[image_options["format"]]
+    smog_bytes = encode_image(smog_img, image_options["format"], image_options["quality"], image_options["progressive"])
+
+    # The upload passes through untouched unless it had to be downscaled (or browsers cannot show it)
+    passthrough = PASSTHROUGH_FORMATS.get(image_info["source_format"])
+    if passthrough is not None and not image_info["resized"]:
+        original_bytes, (original_ext, original_mime_type) = image_bytes, passthrough
+    else:
+        original_bytes = encode_image(img, image_options["format"], image_options["quality"], image_options["progressive"])
+        original_ext, original_mime_type = ext, mime_type
+
+    # Save processed image (content-addressed, so repeat uploads are stored once)
+    smog_url = store_artifact(smog_bytes, ext)
+
+    return {
+        "original": deliver_artifact(original_bytes, original_ext, delivery),
+        "with_smog": smog_url if delivery == "url" else deliver_artifact(smog_bytes, ext, delivery),
+        "mime_type": mime_type,
+        "original_mime_type": original_mime_type,
+        "image": image_info
+    }
+
+# ================================
+# FORECAST TIME-LAPSE
+# ================================
+# One smog frame per forecast day, built from the reference photo. Days in the
+# same AQI band share a frame, so only a handful of LUT passes are needed;
+# each day then just copies its band's frame and draws its label.
+
+TIMELAPSE_FORMAT = os.getenv("AQI_TIMELAPSE_FORMAT", "none")
+TIMELAPSE_MAX_DIMENSION = int(os.getenv("AQI_TIMELAPSE_MAX_DIMENSION", "640"))
+TIMELAPSE_FRAME_MS = int(os.getenv("AQI_TIMELAPSE_FRAME_MS", "400"))
+# webp/gif keep every frame until written; time-lapses needing more are refused (mp4 streams)
+TIMELAPSE_MAX_BUFFER_BYTES = int(os.getenv("AQI_TIMELAPSE_MAX_BUFFER_BYTES", str(64 * 1024 * 1024)))
+# One frame per forecast day of the analysis
+TIMELAPSE_FRAMES = 30
+
+def validate_timelapse(timelapse: Optional[str]) -> Optional[str]:
+    """Normalize the time-lapse format (None = disabled), rejecting unknown formats with a 400"""
+    timelapse = (timelapse or TIMELAPSE_FORMAT).strip().lower()
+    if timelapse in ("", "none"):
+        return None
+    if timelapse not in ANIMATION_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown timelapse format '{timelapse}'. Available: {['none', *ANIMATION_FORMATS]}"
+        )
+    return timelapse
+
+def check_timelapse_memory(timelapse: Optional[str], image_bytes: Optional[bytes]):
+    """Reject a webp/gif time-lapse whose buffered frames would exceed the memory budget with a 400"""
+    if not timelapse or not image_bytes:
+        return
+    _, size = probe_image(image_bytes)
+    if size is None:
+        # Not decodable either, so no time-lapse is rendered
+        return
+    width, height = fitted_size(size, TIMELAPSE_MAX_DIMENSION)
+    needed = animation_buffer_bytes(timelapse, TIMELAPSE_FRAMES, (width, height))
+    if needed > TIMELAPSE_MAX_BUFFER_BYTES:
+        raise HTTPException(
+            status_code=400,
+            detail=(f"A {timelapse} time-lapse of {TIMELAPSE_FRAMES} {width}x{height} frames needs "
+                    f"{needed // 2**20} MB, above the {TIMELAPSE_MAX_BUFFER_BYTES // 2**20} MB limit. "
+                    f"Use mp4, which is encoded frame by frame.")
+        )
+
+def _label_frame(frame: np.ndarray, text: str) -> np.ndarray:
+    """Darken a strip along the bottom and write the day's label on it"""
+    height, width = frame.shape[:2]
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    scale = max(width / 900, 0.35)
+    (text_width, _), _ = cv2.getTextSize(text, font, scale, 1)
+    scale = min(scale, scale * (width - 16) / max(text_width, 1))
+    thickness = max(1, round(2 * scale))
+    
+    strip = int(30 * scale) + 10
+    frame[-strip:] //= 2
+    cv2.putText(frame, text, (8, height - strip // 2 + int(8 * scale)), font, scale,
+                (255, 255, 255), thickness, cv2.LINE_AA)
+    return frame
+
+def render_timelapse(image_bytes: bytes, predictions: List[Dict], fmt: str,
+                     delivery: str = "inline", quality: int = IMAGE_QUALITY) -> Optional[Dict]:
+    """Animate the reference photo through each forecast day's smog level"""
+    base, _ = decode_image(image_bytes, TIMELAPSE_MAX_DIMENSION)
+    if base is None:
+        return None
+    
+    aqi_values = safe_float_array([p["predicted_aqi"] for p in predictions])
+    days = list(zip(aqi_band_index(aqi_values).tolist(), [float(p["haze_intensity"]) for p in predictions]))
+    
+    def tier_frame(tier: Tuple[int, float]) -> np.ndarray:
+        band, intensity = tier
+        return base if band == 0 else cv2.LUT(base, smog_lut(band, intensity))
+    
+    # One frame per distinct (band, haze) pair; cv2.LUT releases the GIL, so they run in parallel
+    tiers = sorted(set(days))
+    with ThreadPoolExecutor(max_workers=min(len(tiers), os.cpu_count() or 1)) as pool:
+        tier_frames = dict(zip(tiers, pool.map(tier_frame, tiers)))
+    
+    def frames():
+        # Produced on demand; the mp4 writer drops each frame once written, webp/gif keep them all
+        for prediction, tier in zip(predictions, days):
+            label = f"{prediction['date']}  AQI {safe_float(prediction['predicted_aqi']):.0f}  {prediction['category']}"
+            yield _label_frame(tier_frames[tier].copy(), label)
+    
+    height, width = base.shape[:2]
+    data = encode_animation(frames(), (width, height), fmt, TIMELAPSE_FRAME_MS, quality)
+    ext, mime_type = ANIMATION_FORMATS[fmt]
+    return {
+        "format": fmt,
+        "mime_type": mime_type,
+        "frames": len(predictions),
+        "frame_ms": TIMELAPSE_FRAME_MS,
+        "width": width,
+        "height": height,
+        "bytes": len(data),
+        "data": deliver_artifact(data, ext, delivery)
+    }
+
+# ================================
+# MULTI-STATION BATCH
+# ================================
+# Uploads are split into stations up front: a long-format file by its station
+# column (one groupby pass after a single date parse), any other file is one
+# station named after the file (a repeated name gets a _2, _3... suffix).
+# Stations are then forecast concurrently, each fit running in the process
+# pool; a failing station only fails its own entry.
+
+STATION_COLUMN_NAMES = ['station', 'station_id', 'station_name', 'station_code', 'site', 'site_id', 'location']
+BATCH_MAX_STATIONS = int(os.getenv("AQI_BATCH_MAX_STATIONS", "200"))
+# Stations in flight at once; more would only queue inside the process pool
+BATCH_CONCURRENCY = int(os.getenv("AQI_BATCH_CONCURRENCY", str(max(POOL_WORKERS, 1))))
+BATCH_MAX_PERIODS = 365
+
+def load_station_frames(csv_file, name: str, station_column: Optional[str] = None) -> Tuple[Dict[str, pd.DataFrame], Dict]:
+    """Read one upload and split it into per-station frames with parsed dates"""
+    header = sniff_header(csv_file)
+    columns = header_frame(header)
+    date_col = find_column(columns, DATE_COLUMN_NAMES)
+    pm25_col = find_column(columns, PM25_COLUMN_NAMES)
+    if not date_col or not pm25_col:
+        raise ValueError(f"Required columns not found. Available: {columns.columns.tolist()}")
+    
+    station_col = find_column(columns, [station_column] if station_column else STATION_COLUMN_NAMES)
+    if station_column and not station_col:
+        raise ValueError(f"Station column '{station_column}' not found. Available: {columns.columns.tolist()}")
+    
+    additional_params = {}
+    for param, names in POLLUTANT_COLUMN_NAMES.items():
+        col = find_column(columns, names)
+        if col:
+            additional_params[param] = col
+    
+    df, ingest_info = read_projected_csv(
+        csv_file, header, date_col, [pm25_col] + list(additional_params.values()),
+        text_cols=[station_col] if station_col else []
+    )
+    # Parsed once for the whole file rather than once per station
+    dates, date_info = parse_dates(df[date_col], date_col)
+    df[date_col] = dates
+    
+    start = time.perf_counter()
+    if station_col:
+        # One hash pass over the station column yields every station's row positions
+        positions = df.groupby(station_col, sort=False).indices
+        groups = {str(station).strip(): df.iloc[rows] for station, rows in positions.items()}
+    else:
+        groups = {name: df}
+    
+    info = {
+        "file": name,
+        "columns": {"date": date_col, "pm25": pm25_col, "station": station_col, **additional_params},
+        "stations": len(groups),
+        "ingest": ingest_info,
+        "date_parsing": date_info,
+        "group_seconds": round(time.perf_counter() - start, 4)
+    }
+    return groups, info
+
+def summarize_station(aqi_df: pd.DataFrame, frame: pd.DataFrame, columns: Dict, forecast: pd.DataFrame, periods: int) -> Dict:
+    """Predictions, statistics and AQI breakdown for one station's forecast"""
+    additional_params = {param: col for param, col in columns.items() if param in POLLUTANT_COLUMN_NAMES}
+    concentrations = {'pm25': safe_float(aqi_df['y'].iloc[-1])}
+    latest_values, _ = latest_pollutant_values(frame, columns["date"], additional_params)
+    concentrations.update(latest_values)
+    aqi_breakdown = calculate_detailed_aqi(concentrations)
+    
+    predictions = build_prediction_records(forecast.tail(periods), include_haze=False)
+    predicted_aqi = predictions[-1]["predicted_aqi"]
+    primary_pollutant = max(aqi_breakdown, key=aqi_breakdown.get) if aqi_breakdown else 'pm25'
+    return {
+        "summary": {
+            "predicted_aqi": predicted_aqi,
+            "category": classify_aqi(predicted_aqi)[0],
+            "next_day_aqi": predictions[0]["predicted_aqi"],
+            "primary_pollutant": primary_pollutant
+        },
+        "predictions": predictions,
+        "statistics": series_statistics(aqi_df),
+        "current_concentrations": concentrations,
+        "aqi_breakdown": aqi_breakdown
+    }
+
+async def forecast_station(
+    station: str,
+    frame: pd.DataFrame,
+    columns: Dict,
+    periods: int,
+    semaphore: asyncio.Semaphore,
+    refit: bool = True,
+    engine: str = "prophet",
+    intervals: str = "sampled",
+    uncertainty_samples: Optional[int] = None
+) -> Dict:
+    """Forecast one station; any failure is reported in its entry instead of raised"""
+    start = time.perf_counter()
+    timings = {}
+    try:
+        aqi_df = await run_in_threadpool(series_frame, frame[columns["date"]], frame[columns["pm25"]])
+        if len(aqi_df) == 0:
+            raise ValueError("No valid data found after processing")
+        timings["prepare_seconds"] = round(time.perf_counter() - start, 4)
+        
+        prophet_kwargs = {"daily_seasonality": True, "yearly_seasonality": True}
+        series_key = series_identity(aqi_df, columns["date"], columns["pm25"], station)
+        queued = time.perf_counter()
+        async with semaphore:
+            fit_start = time.perf_counter()
+            timings["queue_seconds"] = round(fit_start - queued, 4)
+            forecast, fit_info = await get_forecast(
+                aqi_df, periods, prophet_kwargs,
+                model_key=registry_key(series_key, prophet_kwargs),
+                refit=refit,
+                engine=engine,
+                include_history=False,
+                intervals=intervals,
+                uncertainty_samples=uncertainty_samples
+            )
+        timings["forecast_seconds"] = round(time.perf_counter() - fit_start, 4)
+        timings["forecast"] = forecast_timings(fit_info)
+        
+        result = await run_in_threadpool(summarize_station, aqi_df, frame, columns, forecast, periods)
+        timings["total_seconds"] = round(time.perf_counter() - start, 4)
+        return {
+            "station": station,
+            "status": "success",
+            **result,
+            "model_registry": {
+                "engine": engine,
+                "series_id": series_key,
+                "cache_hit": fit_info.get("cache_hit", False),
+                "refit": fit_info.get("refit", True),
+                "warm_start": fit_info.get("warm_start", False)
+            },
+            "timings": timings
+        }
+    except Exception as e:
+        logger.warning(f"Batch forecast failed for station '{station}': {str(e)}")
+        timings["total_seconds"] = round(time.perf_counter() - start, 4)
+        return {"station": station, "status": "error", "detail": str(e), "timings": timings}
+
+# ================================
+# ANALYSIS PIPELINE
+# ================================
+
+async def run_analysis_pipeline(
+    csv_file,
+    image_bytes: Optional[bytes] = None,
+    on_stage: Optional[Callable[[str], None]] = None,
+    series_id: Optional[str] = None,
+    refit: bool = True,
+    engine: str = "prophet",
+    metrics: bool = True,
+    intervals: str = "sampled",
+    uncertainty_samples: Optional[int] = None,
+    plot_options: Optional[Dict] = None,
+    delivery: str = "inline",
+    image_options: Optional[Dict] = None,
+    timelapse: Optional[str] = None,
+    profile: Optional[ProfileSession] = None
+) -> Dict:
     """
-    Comprehensive air quality analysis with forecasting and visualization
+    Run STEP 1-9 of the analysis on a CSV file object and optional image bytes.
+
+    Shared by /analyze and the background job runner. Expected input errors
+    are raised as HTTPException; `on_stage` is called with the name of each
+    stage as it starts. `series_id`/`refit` control the model registry and
+    `engine` selects the forecasting engine (see engines.ENGINES). With
+    `metrics=False` only the future rows are predicted and model evaluation is
+    skipped; `intervals`/`uncertainty_samples` select the Prophet interval mode.
+    `plot_options` (see validate_visualizations) selects server-rendered
+    figures, chart data for client-side drawing, or no visualizations.
+    `delivery` returns images inline as base64 or as /outputs artifact URLs;
+    `image_options` (see validate_image_options) sets the smog image encoding
+    and `timelapse` (see validate_timelapse) adds an animation of the forecast.
+    A started `profile` session gets per-stage timings (see run_profiled).
+    Each stage is a span of the current trace (see tracing.py).
     """
+    stage_timer = StageTimer()
+    stage_spans = []
+
+    def stage(name: str):
+        stage_timer.start(name)
+        if stage_spans:
+            stage_spans.pop().end()
+        stage_span = start_span(name)
+        if stage_span is not None:
+            stage_spans.append(stage_span)
+        if profile is not None:
+            profile.stage(name)
+        if on_stage is not None:
+            on_stage(name)
+
+    # ============================
+    # STEP 1: Load and Process Data
+    # ============================
+    stage("ingest")
+    
     try:
-        logger.info("Starting analysis request")
-        
-        # ============================
-        # STEP 1: Load and Process Data
-        # ============================
+        # Read only the header; columns are detected before any data is parsed
+        with span("sniff_header"):
+            header = await run_in_threadpool(sniff_header, csv_file)
+        df = header_frame(header)
+        logger.info(f"Dataset header has {len(header)} columns: {df.columns.tolist()}")
+    except Exception as e:
+        logger.error(f"Error reading CSV file: {str(e)}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error reading CSV file: {str(e)}. Please ensure the file is a valid CSV format."
+        )
+    
+    try:
+        # Automatically detect columns
+        date_col = find_column(df, DATE_COLUMN_NAMES)
+        pm25_col = find_column(df, PM25_COLUMN_NAMES)
         
-        try:
-            # Read CSV data
-            df = pd.read_csv(dataset.file)
-            df.columns = df.columns.str.strip()
-            logger.info(f"Successfully loaded dataset with {len(df)} rows and columns: {df.columns.tolist()}")
-        except Exception as e:
-            logger.error(f"Error reading CSV file: {str(e)}")
+        if not date_col or not pm25_col:
             raise HTTPException(
                 status_code=400,
-                detail=f"Error reading CSV file: {str(e)}. Please ensure the file is a valid CSV format."
+                detail=f"Required columns not found. Available: {df.columns.tolist()}. Please ensure your CSV has date and PM2.5/AQI columns."
             )
         
-        try:
-            # Automatically detect columns
-            date_names = ['date', 'datetime', 'timestamp', 'time']
-            pm25_names = ['pm25', 'pm2.5', 'pm_25', 'aqi', 'pm25_avg']
-            
-            date_col = find_column(df, date_names)
-            pm25_col = find_column(df, pm25_names)
-            
-            if not date_col or not pm25_col:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Required columns not found. Available: {df.columns.tolist()}. Please ensure your CSV has date and PM2.5/AQI columns."
-                )
-            
-            logger.info(f"Detected columns - Date: {date_col}, PM2.5: {pm25_col}")
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"Error detecting columns: {str(e)}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Error processing CSV columns: {str(e)}"
-            )
+        logger.info(f"Detected columns - Date: {date_col}, PM2.5: {pm25_col}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error detecting columns: {str(e)}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error processing CSV columns: {str(e)}"
+        )
+    
+    try:
+        # Detect additional parameters
+        additional_params = {}
+        for param, names in POLLUTANT_COLUMN_NAMES.items():
+            col = find_column(df, names)
+            if col:
+                additional_params[param] = col
         
-        try:
-            # Detect additional parameters
-            additional_params = {}
-            param_names = {
-                'pm10': ['pm10', 'pm_10'],
-                'o3': ['o3', 'ozone'],
-                'no2': ['no2', 'nitrogen_dioxide'],
-                'so2': ['so2', 'sulfur_dioxide'],
-                'co': ['co', 'carbon_monoxide']
-            }
-            
-            for param, names in param_names.items():
-                col = find_column(df, names)
-                if col:
-                    additional_params[param] = col
-            
-            logger.info(f"Additional parameters detected: {additional_params}")
-        except Exception as e:
-            logger.warning(f"Error detecting additional parameters: {str(e)}")
-            additional_params = {}
+        logger.info(f"Additional parameters detected: {additional_params}")
+    except Exception as e:
+        logger.warning(f"Error detecting additional parameters: {str(e)}")
+        additional_params = {}
+    
+    try:
+        # Read only the detected columns, with explicit dtypes
+        with span("csv_parse"):
+            df, ingest_info = await run_in_threadpool(
+                read_projected_csv, csv_file, header, date_col,
+                [pm25_col] + list(additional_params.values())
+            )
+        logger.info(f"Successfully loaded dataset with {len(df)} rows and columns: {df.columns.tolist()}")
+    except Exception as e:
+        logger.error(f"Error reading CSV file: {str(e)}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error reading CSV file: {str(e)}. Please ensure the file is a valid CSV format."
+        )
+    
+    try:
+        # Parse dates and prepare data for Prophet (taking pm25 as target variable)
+        with span("date_parse"):
+            aqi_df, date_info = await run_in_threadpool(prepare_series, df, date_col, pm25_col)
+        logger.info(f"Parsed dates with format {date_info['format']} in {date_info['parse_seconds']:.3f}s")
         
-        try:
-            # Parse dates
-            try:
-                df[date_col] = pd.to_datetime(df[date_col], dayfirst=True, errors='coerce')
-            except:
-                df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-            
-            # Prepare data for Prophet  (taking pm25 as target variable)
-            aqi_df = df[[date_col, pm25_col]].rename(columns={date_col:'ds', pm25_col:'y'})
-            aqi_df['y'] = pd.to_numeric(aqi_df['y'], errors='coerce')
-            aqi_df = aqi_df.dropna()
-            
-            # Sort by date to ensure chronological order (important for getting latest values)
-            aqi_df = aqi_df.sort_values('ds').reset_index(drop=True)
-            
-            if len(aqi_df) == 0:
-                raise HTTPException(
-                    status_code=400,
-                    detail="No valid data found after processing. Please check your date and PM2.5 columns for valid values."
-                )
-            
-            logger.info(f"Processed {len(aqi_df)} valid data points")
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"Error processing date/PM2.5 data: {str(e)}")
+        if len(aqi_df) == 0:
             raise HTTPException(
                 status_code=400,
-                detail=f"Error processing date and PM2.5 data: {str(e)}"
+                detail="No valid data found after processing. Please check your date and PM2.5 columns for valid values."
             )
         
-        # ============================
-        # STEP 2: Forecasting with Prophet
-        # ============================
+        logger.info(f"Processed {len(aqi_df)} valid data points")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing date/PM2.5 data: {str(e)}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error processing date and PM2.5 data: {str(e)}"
+        )
+    
+    # ============================
+    # STEP 2: Forecasting with Prophet
+    # ============================
+    stage("forecast")
+    
+    try:
+        logger.info(f"Starting forecasting with the {engine} engine")
+        prophet_kwargs = {"daily_seasonality": True, "yearly_seasonality": True}
+        series_key = series_identity(aqi_df, date_col, pm25_col, series_id, header)
+
+        # Forecast next 30 days (cached, otherwise fit/predict run in the process pool)
+        forecast, fit_info = await get_forecast(
+            aqi_df, 30, prophet_kwargs,
+            model_key=registry_key(series_key, prophet_kwargs),
+            refit=refit,
+            engine=engine,
+            include_history=metrics,
+            intervals=intervals,
+            uncertainty_samples=uncertainty_samples
+        )
         
-        try:
-            logger.info("Starting Prophet forecasting")
-            model = Prophet(daily_seasonality=True, yearly_seasonality=True)
-            model.fit(aqi_df)
-            
-            # Forecast next 30 days
-            future = model.make_future_dataframe(periods=30)
-            forecast = model.predict(future)
-            
-            predicted_aqi = safe_float(forecast.iloc[-1]['yhat'])
-            aqi_category, aqi_color = classify_aqi(predicted_aqi)
-            
-            # Calculate model evaluation metrics
-            # Get predictions for historical data
-            historical_forecast = forecast[forecast['ds'].isin(aqi_df['ds'])]
-            actual_values = aqi_df['y'].values
-            predicted_values = historical_forecast['yhat'].values
-            
-            # Calculate metrics
-            from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-            
-            mae = safe_float(mean_absolute_error(actual_values, predicted_values))
-            mse = safe_float(mean_squared_error(actual_values, predicted_values))
-            rmse = safe_float(np.sqrt(mse))
-            r2 = safe_float(r2_score(actual_values, predicted_values))
-            
-            # Calculate MAPE (Mean Absolute Percentage Error)
-            mape = safe_float(np.mean(np.abs((actual_values - predicted_values) / actual_values)) * 100)
-            
-            model_metrics = {
-                "mae": mae,  # Mean Absolute Error
-                "mse": mse,  # Mean Squared Error
-                "rmse": rmse,  # Root Mean Squared Error
-                "r2_score": r2,  # R-squared score (coefficient of determination)
-                "mape": mape,  # Mean Absolute Percentage Error (%)
-                "accuracy_percentage": safe_float(100 - mape) if mape < 100 else 0.0
-            }
-            
-            logger.info(f"Forecasting completed. Predicted AQI: {predicted_aqi}, R²: {r2:.4f}, RMSE: {rmse:.2f}")
-        except Exception as e:
-            logger.error(f"Error in Prophet forecasting: {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error in forecasting model: {str(e)}. Please check your data quality and try again."
-            )
+        predicted_aqi = safe_float(forecast.iloc[-1]['yhat'])
+        aqi_category, aqi_color = classify_aqi(predicted_aqi)
         
-        # ============================
-        # STEP 3: Statistical Analysis
-        # ============================
+        # In-sample rows are only predicted when metrics are requested
+        model_metrics = None
+        if metrics:
+            with span("metrics"):
+                # Calculate model evaluation metrics
+                # Get predictions for historical data
+                historical_forecast = forecast[forecast['ds'].isin(aqi_df['ds'])]
+                actual_values = aqi_df['y'].values
+                predicted_values = historical_forecast['yhat'].values
         
-        try:
-            logger.info("Calculating statistics")
-            # Get the most recent 30 data points (already sorted chronologically)
-            recent_data = aqi_df.tail(30)['y']
-            # Calculate trend from oldest to newest in the recent period
-            trend_slope = safe_float((recent_data.iloc[-1] - recent_data.iloc[0]) / len(recent_data) if len(recent_data) > 1 else 0)
-            trend_direction = "Worsening" if trend_slope > 1 else "Improving" if trend_slope < -1 else "Stable"
-            
-            # Calculate safe statistics
-            stats = safe_series_stats(recent_data)
-            
-            statistics = {
-                "total_records": len(aqi_df),
-                "date_range": {
-                    "start": aqi_df['ds'].min().strftime('%Y-%m-%d'),
-                    "end": aqi_df['ds'].max().strftime('%Y-%m-%d')
-                },
-                "recent_30_days": {
-                    "average": stats["mean"],
-                    "median": stats["median"],
-                    "maximum": stats["max"],
-                    "minimum": stats["min"],
-                    "std_dev": stats["std"],
-                    "days_above_safe": int(sum(recent_data > 50)) if len(recent_data) > 0 else 0,
-                    "trend_direction": trend_direction,
-                    "trend_slope": trend_slope
-                }
-            }
-            logger.info("Statistics calculated successfully")
-        except Exception as e:
-            logger.error(f"Error calculating statistics: {str(e)}")
-            # Provide default statistics in case of error
-            statistics = {
-                "total_records": len(aqi_df) if 'aqi_df' in locals() else 0,
-                "date_range": {
-                    "start": "N/A",
-                    "end": "N/A"
-                },
-                "recent_30_days": {
-                    "average": 0.0,
-                    "median": 0.0,
-                    "maximum": 0.0,
-                    "minimum": 0.0,
-                    "std_dev": 0.0,
-                    "days_above_safe": 0,
-                    "trend_direction": "Unknown",
-                    "trend_slope": 0.0
-                }
-            }
+                # Calculate metrics
+                from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
         
-        # ============================
-        # STEP 4: Multi-Parameter Analysis
-        # ============================
+                mae = safe_float(mean_absolute_error(actual_values, predicted_values))
+                mse = safe_float(mean_squared_error(actual_values, predicted_values))
+                rmse = safe_float(np.sqrt(mse))
+                r2 = safe_float(r2_score(actual_values, predicted_values))
         
-        multi_parameter_analysis = {}
-        current_concentrations = {'pm25': safe_float(aqi_df['y'].iloc[-1])}
+                # Calculate MAPE (Mean Absolute Percentage Error)
+                mape = safe_float(np.mean(np.abs((actual_values - predicted_values) / actual_values)) * 100)
         
-        if additional_params:
-            # Sort the original dataframe by date to get chronologically latest values
-            df_sorted = df.sort_values(date_col).reset_index(drop=True)
-            
-            for param, col in additional_params.items():
-                param_data = pd.to_numeric(df_sorted[col], errors='coerce')
-                if not param_data.isna().all():
-                    # Get the latest non-null value in chronological order
-                    latest_value = safe_float(param_data.dropna().iloc[-1])
-                    current_concentrations[param] = latest_value
-                    avg_30_days = safe_float(param_data.tail(30).mean()) if len(param_data) >= 30 else latest_value
-                    multi_parameter_analysis[param] = {
-                        "latest_value": latest_value,
-                        "average_30_days": avg_30_days,
-                        "unit": "μg/m³" if param != 'co' else "mg/m³"
-                    }
+                model_metrics = {
+                    "mae": mae,  # Mean Absolute Error
+                    "mse": mse,  # Mean Squared Error
+                    "rmse": rmse,  # Root Mean Squared Error
+                    "r2_score": r2,  # R-squared score (coefficient of determination)
+                    "mape": mape,  # Mean Absolute Percentage Error (%)
+                    "accuracy_percentage": safe_float(100 - mape) if mape < 100 else 0.0
+                }
         
-        # Calculate comprehensive AQI
+            logger.info(f"Forecasting completed. Predicted AQI: {predicted_aqi}, R²: {r2:.4f}, RMSE: {rmse:.2f}")
+        else:
+            logger.info(f"Forecasting completed. Predicted AQI: {predicted_aqi} (metrics not requested)")
+    except Exception as e:
+        logger.error(f"Error in {engine} forecasting: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error in forecasting model: {str(e)}. Please check your data quality and try again."
+        )
+    
+    # ============================
+    # STEP 3: Statistical Analysis
+    # ============================
+    stage("statistics")
+    
+    try:
+        logger.info("Calculating statistics")
+        statistics = series_statistics(aqi_df)
+        logger.info("Statistics calculated successfully")
+    except Exception as e:
+        logger.error(f"Error calculating statistics: {str(e)}")
+        # Provide default statistics in case of error
+        statistics = {
+            "total_records": len(aqi_df) if 'aqi_df' in locals() else 0,
+            "date_range": {
+                "start": "N/A",
+                "end": "N/A"
+            },
+            "recent_30_days": {
+                "average": 0.0,
+                "median": 0.0,
+                "maximum": 0.0,
+                "minimum": 0.0,
+                "std_dev": 0.0,
+                "days_above_safe": 0,
+                "trend_direction": "Unknown",
+                "trend_slope": 0.0
+            }
+        }
+    
+    # ============================
+    # STEP 4: Multi-Parameter Analysis
+    # ============================
+    stage("multi_parameter")
+    
+    current_concentrations = {'pm25': safe_float(aqi_df['y'].iloc[-1])}
+    latest_values, multi_parameter_analysis = latest_pollutant_values(df, date_col, additional_params)
+    current_concentrations.update(latest_values)
+    
+    # Calculate comprehensive AQI
+    with span("aqi_breakdown"):
         aqi_breakdown = calculate_detailed_aqi(current_concentrations)
-        max_aqi_pollutant = max(aqi_breakdown, key=aqi_breakdown.get) if aqi_breakdown else 'pm25'
-        max_aqi_value = aqi_breakdown.get(max_aqi_pollutant, predicted_aqi)
-        
-        # ============================
-        # STEP 5: Generate 30-Day Predictions
-        # ============================
-        
-        future_forecast = forecast.tail(30)
-        predictions = []
-        
-        for _, row in future_forecast.iterrows():
-            daily_aqi = safe_float(row['yhat'])
-            daily_category, daily_color = classify_aqi(daily_aqi)
-            haze_intensity = aqi_to_haze_intensity(daily_aqi)
-            
-            predictions.append({
-                "date": row['ds'].strftime("%Y-%m-%d"),
-                "predicted_aqi": daily_aqi,
-                "category": daily_category,
-                "color": daily_color,
-                "haze_intensity": haze_intensity,
-                "confidence_lower": safe_float(row['yhat_lower']),
-                "confidence_upper": safe_float(row['yhat_upper'])
-            })
-        
-        # ============================
-        # STEP 6: Health Recommendations
-        # ============================
-        
-        health_recommendations = get_detailed_health_recommendations(predicted_aqi)
-        
-        # ============================
-        # STEP 7: Image Processing
-        # ============================
-        
-        processed_images = {}
-        gemini_prompt = ""
+    
+    # Per-day AQI for every pollutant over the whole history (vectorized)
+    try:
+        concentrations = pd.DataFrame({'pm25': widen_floats(df[pm25_col])})
+        for param, col in additional_params.items():
+            concentrations[param] = widen_floats(df[col])
+        with span("daily_aqi"):
+            daily_aqi_frame = await run_in_threadpool(compute_daily_aqi, df[date_col], concentrations)
+        daily_aqi_series = aqi_series_payload(daily_aqi_frame)
+    except Exception as e:
+        logger.warning(f"Error computing daily AQI series: {str(e)}")
+        daily_aqi_series = None
+    max_aqi_pollutant = max(aqi_breakdown, key=aqi_breakdown.get) if aqi_breakdown else 'pm25'
+    max_aqi_value = aqi_breakdown.get(max_aqi_pollutant, predicted_aqi)
+    
+    # ============================
+    # STEP 5: Generate 30-Day Predictions
+    # ============================
+    stage("predictions")
+    
+    predictions = build_prediction_records(forecast.tail(30))
+    
+    # ============================
+    # STEP 6: Health Recommendations
+    # ============================
+    stage("health")
+    
+    health_recommendations = get_detailed_health_recommendations(predicted_aqi)
+    
+    # ============================
+    # STEP 7: Image Processing
+    # ============================
+    stage("image")
+    
+    processed_images = {}
+    gemini_prompt = ""
+    
+    if image_bytes:
+        # Decoded in memory by the worker, no temp files
+        haze_intensity = aqi_to_haze_intensity(predicted_aqi)
+        image_stages = [traced("smog_render", run_stage(
+            render_smog_images, image_bytes, predicted_aqi, haze_intensity, delivery, image_options
+        ))]
+        if timelapse:
+            quality = (image_options or {}).get("quality", IMAGE_QUALITY)
+            image_stages.append(traced("timelapse", run_stage(
+                render_timelapse, image_bytes, predictions, timelapse, delivery, quality
+            ), format=timelapse))
+        encoded_images, *timelapse_result = await asyncio.gather(*image_stages, return_exceptions=True)
+        if isinstance(encoded_images, BaseException):
+            raise encoded_images
         
-        if ref_image:
-            # Save uploaded image
-            img_path = f"temp/{ref_image.filename}"
-            with open(img_path, "wb") as f:
-                f.write(await ref_image.read())
+        if encoded_images is not None:
+            processed_images = {
+                **encoded_images,
+                "delivery": delivery,
+                "haze_intensity": haze_intensity
+            }
+            if timelapse_result:
+                # A failed animation leaves the rest of the analysis intact
+                if isinstance(timelapse_result[0], BaseException):
+                    logger.error(f"Error rendering time-lapse: {str(timelapse_result[0])}")
+                elif timelapse_result[0] is not None:
+                    processed_images["timelapse"] = timelapse_result[0]
             
-            # Load and process image
-            img = cv2.imread(img_path)
-            if img is not None:
-                haze_intensity = aqi_to_haze_intensity(predicted_aqi)
-
-                # takes the image , applies atmospheric effects based on AQI, and returns the modified image
-                smog_img = apply_atmospheric_effects(img, predicted_aqi, haze_intensity)
-                
-                # Save processed image
-                output_path = f"outputs/smog_effect_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-                cv2.imwrite(output_path, smog_img)
-                
-                # Convert images to base64 for response
-                _, original_encoded = cv2.imencode('.jpg', img)
-                _, smog_encoded = cv2.imencode('.jpg', smog_img)
-                
-                processed_images = {
-                    "original": base64.b64encode(original_encoded).decode('utf-8'),
-                    "with_smog": base64.b64encode(smog_encoded).decode('utf-8'),
-                    "haze_intensity": haze_intensity
-                }
-                
-                # Generate Gemini prompt
-                gemini_prompt = (
-                    f"A realistic photo showing air pollution effects with "
-                    f"AQI level {int(predicted_aqi)}, {aqi_category.lower()} air quality, "
-                    f"haze intensity {int(haze_intensity)}, atmospheric visibility reduced"
+            # Generate Gemini prompt
+            gemini_prompt = (
+                f"A realistic photo showing air pollution effects with "
+                f"AQI level {int(predicted_aqi)}, {aqi_category.lower()} air quality, "
+                f"haze intensity {int(haze_intensity)}, atmospheric visibility reduced"
+            )
+    
+    # ============================
+    # STEP 8: Generate Visualizations
+    # ============================
+    stage("visualizations")
+    
+    plot_options = plot_options or validate_visualizations("image", None, None, 1.0)
+    visualization_block = {"mode": plot_options["mode"], "forecast_plot": "", "aqi_gauge": ""}
+    render_timings = {}
+    try:
+        logger.info(f"Generating visualizations ({plot_options['mode']} mode)")
+        if plot_options["mode"] == "image":
+            render_options = {"dpi": plot_options["dpi"], "fmt": plot_options["format"], "scale": plot_options["scale"]}
+            # Both figures render concurrently in the render pool
+            (forecast_plot, render_timings["forecast_plot"]), (aqi_gauge, render_timings["aqi_gauge"]) = await asyncio.gather(
+                traced("plot_render", run_render(forecast_plot_bytes, aqi_df, forecast, predicted_aqi,
+                                                 max_points=plot_options["max_points"], **render_options)),
+                traced("gauge_render", render_aqi_gauge(predicted_aqi, aqi_category, **render_options))
+            )
+            with span("deliver", delivery=delivery):
+                forecast_plot, aqi_gauge = await asyncio.gather(
+                    run_in_threadpool(deliver_artifact, forecast_plot, plot_options["format"], delivery),
+                    run_in_threadpool(deliver_artifact, aqi_gauge, plot_options["format"], delivery)
                 )
-            
-            # Clean up temp file
-            os.remove(img_path)
-        
-        # ============================
-        # STEP 8: Generate Visualizations
-        # ============================
-        
-        try:
-            logger.info("Generating visualizations")
-            forecast_plot = create_forecast_plot(aqi_df, forecast, predicted_aqi)
-            aqi_gauge = create_aqi_gauge(predicted_aqi, aqi_category)
-            logger.info("Visualizations generated successfully")
-        except Exception as e:
-            logger.error(f"Error generating visualizations: {str(e)}")
-            # Provide empty visualizations in case of error
-            forecast_plot = ""
-            aqi_gauge = ""
-        
-        # ============================
-        # STEP 9: Construct Response
-        # ============================
-        
-        gemini_url = (
-            "https://gemini.google.com/app?"
-            f"&prompt={quote_plus(gemini_prompt)}"
-        ) if gemini_prompt else ""
-        
-        response = {
-            "status": "success",
-            "timestamp": datetime.now().isoformat(),
-            "data_summary": {
-                "parameters_analyzed": len(additional_params) + 1,
-                "columns_detected": {
-                    "date": date_col,
-                    "pm25": pm25_col,
-                    "additional": additional_params
-                }
-            },
-            "current_conditions": {
-                "latest_pm25": safe_float(aqi_df['y'].iloc[-1]),
-                "predicted_tomorrow": safe_float(predicted_aqi),
-                "category": aqi_category,
-                "color": aqi_color,
-                "pollutant_levels": current_concentrations
-            },
-            "predictions": predictions,
-            "statistics": statistics,
-            "multi_parameter_analysis": multi_parameter_analysis,
-            "aqi_breakdown": aqi_breakdown,
-            "primary_pollutant": {
-                "pollutant": max_aqi_pollutant,
-                "aqi_value": max_aqi_value
-            },
-            "health_recommendations": health_recommendations,
-            "model_evaluation": model_metrics,
-            "visualizations": {
+            visualization_block.update({
+                "format": plot_options["format"],
+                "mime_type": PLOT_FORMATS[plot_options["format"]],
+                "dpi": plot_options["dpi"],
+                "delivery": delivery,
                 "forecast_plot": forecast_plot,
                 "aqi_gauge": aqi_gauge
-            },
-            "processed_images": processed_images,
-            "ai_generation": {
-                "gemini_url": gemini_url,
-                "prompt": gemini_prompt
-            },
-            "summary": {
-                "overall_aqi": statistics["recent_30_days"]["average"],
-                "overall_category": classify_aqi(statistics["recent_30_days"]["average"])[0],
-                "risk_level": health_recommendations["risk_level"],
-                "trend": trend_direction,
-                "predicted_tomorrow": safe_float(predicted_aqi),
-                "predicted_category": aqi_category,
-                "primary_pollutant": {
-                    "name": max_aqi_pollutant,
-                    "aqi": max_aqi_value
-                } if aqi_breakdown else None
+            })
+        elif plot_options["mode"] == "data":
+            visualization_block["series"] = create_visualization_data(
+                aqi_df, forecast, predicted_aqi, aqi_category, max_points=plot_options["max_points"]
+            )
+        logger.info("Visualizations generated successfully")
+    except Exception as e:
+        logger.error(f"Error generating visualizations: {str(e)}")
+        # Provide empty visualizations in case of error
+        visualization_block = {"mode": plot_options["mode"], "forecast_plot": "", "aqi_gauge": ""}
+    
+    # ============================
+    # STEP 9: Construct Response
+    # ============================
+    stage("response")
+    
+    gemini_url = (
+        "https://gemini.google.com/app?"
+        f"&prompt={quote_plus(gemini_prompt)}"
+    ) if gemini_prompt else ""
+    
+    response = {
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "data_summary": {
+            "parameters_analyzed": len(additional_params) + 1,
+            "columns_detected": {
+                "date": date_col,
+                "pm25": pm25_col,
+                "additional": additional_params
             }
+        },
+        "current_conditions": {
+            "latest_pm25": safe_float(aqi_df['y'].iloc[-1]),
+            "predicted_tomorrow": safe_float(predicted_aqi),
+            "category": aqi_category,
+            "color": aqi_color,
+            "pollutant_levels": current_concentrations
+        },
+        "predictions": predictions,
+        "statistics": statistics,
+        "multi_parameter_analysis": multi_parameter_analysis,
+        "aqi_breakdown": aqi_breakdown,
+        "daily_aqi": daily_aqi_series,
+        "primary_pollutant": {
+            "pollutant": max_aqi_pollutant,
+            "aqi_value": max_aqi_value
+        },
+        "health_recommendations": health_recommendations,
+        "model_evaluation": model_metrics,
+        "model_registry": {
+            "engine": engine,
+            "series_id": series_key,
+            "cache_hit": fit_info.get("cache_hit", False),
+            "refit": fit_info.get("refit", True),
+            "warm_start": fit_info.get("warm_start", False)
+        },
+        "timings": {
+            "ingest": ingest_info,
+            "date_parsing": date_info,
+            "forecast": forecast_timings(fit_info),
+            "visualizations": render_timings
+        },
+        "visualizations": visualization_block,
+        "processed_images": processed_images,
+        "ai_generation": {
+            "gemini_url": gemini_url,
+            "prompt": gemini_prompt
+        },
+        "summary": {
+            "overall_aqi": statistics["recent_30_days"]["average"],
+            "overall_category": classify_aqi(statistics["recent_30_days"]["average"])[0],
+            "risk_level": health_recommendations["risk_level"],
+            "trend": statistics["recent_30_days"]["trend_direction"],
+            "predicted_tomorrow": safe_float(predicted_aqi),
+            "predicted_category": aqi_category,
+            "primary_pollutant": {
+                "name": max_aqi_pollutant,
+                "aqi": max_aqi_value
+            } if aqi_breakdown else None
         }
-        
-        # Clean the response data to ensure no NaN/inf values
-        response = clean_response_data(response)
-        
-        logger.info("Analysis completed successfully")
-        return response
+    }
+    
+    # NaN/inf are serialized as null by FastJSONResponse, no separate cleaning pass
+    stage_timer.finish()
+    if stage_spans:
+        stage_spans.pop().end()
+    logger.info("Analysis completed successfully")
+    return response
+
+async def run_profiled(profile: Optional[ProfileSession], pipeline: Awaitable[Dict]) -> Dict:
+    """Await a pipeline run, inside `profile` when the request is profiled (summary added as "profile")"""
+    if profile is None:
+        with span("pipeline"):
+            return await pipeline
+    
+    profile.start()
+    try:
+        with span("pipeline", profile_mode=profile.mode):
+            result = await pipeline
+    except BaseException:
+        # Slow failures are worth profiling too; the profile is stored, the error propagates
+        profile.finish(status="error")
+        raise
+    result["profile"] = profile.finish()
+    return result
+
+def add_trace_info(result: Dict, include_spans: bool) -> Dict:
+    """Add the request id and, when asked for, the span tree so far under timings.trace"""
+    trace = current_trace()
+    if trace is None:
+        return result
+    result["request_id"] = trace.request_id
+    if include_spans:
+        result.setdefault("timings", {})["trace"] = trace.tree()
+    return result
+
+def pipeline_response(result: Dict) -> FastJSONResponse:
+    """Serialize a pipeline result, observing the time as the pipeline's serialize stage"""
+    start = time.perf_counter()
+    with span("encode"):
+        response = FastJSONResponse(result)
+    PIPELINE_STAGE_SECONDS.observe(time.perf_counter() - start, stage="serialize")
+    return response
+
+# ================================
+# METRICS
+# ================================
+# Request and pipeline metrics are recorded as they happen (see metrics.py);
+# these gauges are read on every scrape of /metrics.
+
+_process = psutil.Process()
+
+def resource_metrics():
+    """Job queue, process RSS and the /system-resources disk and memory figures as raw numbers"""
+    jobs = job_manager.stats()
+    yield ("aqi_job_queue_depth", "gauge", "Analysis jobs waiting for a worker", [({}, jobs["queue_depth"])])
+    yield ("aqi_jobs", "gauge", "Analysis jobs held by the job manager, by status",
+           [({"status": status}, count) for status, count in jobs["jobs"].items()])
+    yield ("aqi_process_resident_memory_bytes", "gauge", "Resident set size of the API process",
+           [({}, _process.memory_info().rss)])
+    
+    memory = psutil.virtual_memory()
+    yield ("aqi_memory_bytes", "gauge", "System memory",
+           [({"kind": "total"}, memory.total), ({"kind": "available"}, memory.available), ({"kind": "used"}, memory.used)])
+    yield ("aqi_memory_usage_ratio", "gauge", "Fraction of system memory in use", [({}, memory.percent / 100)])
+    
+    disk = shutil.disk_usage('/')
+    yield ("aqi_disk_bytes", "gauge", "Root filesystem usage",
+           [({"kind": "total"}, disk.total), ({"kind": "used"}, disk.used), ({"kind": "free"}, disk.free)])
+    yield ("aqi_disk_usage_ratio", "gauge", "Fraction of the root filesystem in use", [({}, disk.used / disk.total)])
+    
+    yield ("aqi_gauge_cache_requests_total", "counter", "AQI gauge LRU lookups by result",
+           [({"result": "hit"}, _gauge_cache_stats["hits"]), ({"result": "miss"}, _gauge_cache_stats["misses"])])
+
+register_collector(resource_metrics)
+
+# ================================
+# WARM-UP
+# ================================
+# Run in the background after startup (AQI_WARMUP) or on POST /warmup. Each
+# step pays a cost the first real request would otherwise pay.
+
+# Imported inside request handlers, so lazy_import does not know about them
+WARMUP_MODULES = ["sklearn.metrics"]
+
+def warm_renderers() -> Dict:
+    """Load fonts and the Agg backend and rasterize the default gauge background"""
+    history = pd.DataFrame({'ds': pd.date_range("2024-01-01", periods=60, freq="D"), 'y': np.linspace(40.0, 80.0, 60)})
+    forecast = history.rename(columns={'y': 'yhat'})
+    forecast['yhat_lower'], forecast['yhat_upper'], forecast['trend'] = forecast['yhat'] - 5, forecast['yhat'] + 5, forecast['yhat']
+    forecast_plot_bytes(history, forecast, 60.0, dpi=20)
+    if PLOT_FORMAT != "svg":
+        _gauge_background(PLOT_DPI, 1.0)
+    return {"plot_dpi": PLOT_DPI, "gauge_cached": PLOT_FORMAT != "svg"}
+
+async def _warm_imports() -> List[str]:
+    return await run_in_threadpool(load_lazy_modules, WARMUP_MODULES)
+
+async def _warm_stan_model() -> List[Dict]:
+    # One tiny fit per worker (best effort: the pool decides which worker runs each)
+    return list(await asyncio.gather(*(run_stage(warm_up_prophet) for _ in range(max(POOL_WORKERS, 1)))))
+
+async def _warm_renderers() -> Dict:
+    result, timing = await run_render(warm_renderers)
+    return {**result, **timing}
+
+def warmup_steps() -> List[Tuple[str, Callable]]:
+    """Named warm-up steps, in the order they run"""
+    return [("imports", _warm_imports), ("stan_model", _warm_stan_model), ("renderers", _warm_renderers)]
+
+# ================================
+# API ENDPOINTS
+# ================================
+
+@app.get("/")
+async def root():
+    return {"message": "Air Quality Analysis API v2.0", "status": "active"}
+
+@app.post("/analyze")
+async def analyze_air_quality(
+    request: Request,
+    dataset: UploadFile = File(...),
+    ref_image: UploadFile = File(None),
+    series_id: Optional[str] = Form(None),
+    refit: bool = Form(True),
+    engine: str = Form("prophet"),
+    metrics: bool = Form(True),
+    intervals: str = Form("sampled"),
+    uncertainty_samples: Optional[int] = Form(None),
+    visualizations: str = Form("image"),
+    plot_format: Optional[str] = Form(None),
+    plot_dpi: Optional[int] = Form(None),
+    plot_scale: float = Form(1.0),
+    plot_max_points: Optional[int] = Form(None),
+    delivery: Optional[str] = Form(None),
+    image_format: Optional[str] = Form(None),
+    image_quality: Optional[int] = Form(None),
+    image_progressive: bool = Form(False),
+    timelapse: Optional[str] = Form(None),
+    trace: bool = Form(False)
+):
+    """
+    Comprehensive air quality analysis with forecasting and visualization
+    """
+    try:
+        logger.info("Starting analysis request")
+        engine = validate_engine(engine)
+        intervals = validate_intervals(intervals, uncertainty_samples)
+        plot_options = validate_visualizations(visualizations, plot_format, plot_dpi, plot_scale, plot_max_points)
+        delivery = validate_delivery(delivery)
+        image_options = validate_image_options(image_format, image_quality, image_progressive)
+        timelapse = validate_timelapse(timelapse)
+        mode = profile_mode(request.headers, request.query_params)
+        profile = ProfileSession(mode, current_request_id()) if mode else None
+        image_bytes = await ref_image.read() if ref_image else None
+        check_timelapse_memory(timelapse, image_bytes)
+        # The multipart body was received and parsed before the handler ran
+        record_since_request_start("upload_read")
+        response = await run_profiled(profile, run_analysis_pipeline(
+            dataset.file, image_bytes,
+            series_id=series_id, refit=refit, engine=engine,
+            metrics=metrics, intervals=intervals, uncertainty_samples=uncertainty_samples,
+            plot_options=plot_options,
+            delivery=delivery,
+            image_options=image_options,
+            timelapse=timelapse,
+            profile=profile
+        ))
+        # Returning the response class directly skips FastAPI's jsonable_encoder walk
+        return pipeline_response(add_trace_info(response, trace))
         
     except HTTPException as he:
         # Re-raise HTTP exceptions (these are expected errors)
@@ -1021,15 +1951,126 @@ async def analyze_air_quality(
                 content={"status": "error", "message": "Critical server error"}
             )
 
+@app.post("/analyze/jobs", status_code=202)
+async def submit_analysis_job(
+    request: Request,
+    dataset: UploadFile = File(...),
+    ref_image: UploadFile = File(None),
+    series_id: Optional[str] = Form(None),
+    refit: bool = Form(True),
+    engine: str = Form("prophet"),
+    metrics: bool = Form(True),
+    intervals: str = Form("sampled"),
+    uncertainty_samples: Optional[int] = Form(None),
+    visualizations: str = Form("image"),
+    plot_format: Optional[str] = Form(None),
+    plot_dpi: Optional[int] = Form(None),
+    plot_scale: float = Form(1.0),
+    plot_max_points: Optional[int] = Form(None),
+    delivery: Optional[str] = Form(None),
+    image_format: Optional[str] = Form(None),
+    image_quality: Optional[int] = Form(None),
+    image_progressive: bool = Form(False),
+    timelapse: Optional[str] = Form(None),
+    trace: bool = Form(False)
+):
+    """
+    Queue an analysis with the same inputs as /analyze and return its job id immediately
+    """
+    engine = validate_engine(engine)
+    intervals = validate_intervals(intervals, uncertainty_samples)
+    plot_options = validate_visualizations(visualizations, plot_format, plot_dpi, plot_scale, plot_max_points)
+    delivery = validate_delivery(delivery)
+    image_options = validate_image_options(image_format, image_quality, image_progressive)
+    timelapse = validate_timelapse(timelapse)
+    mode = profile_mode(request.headers, request.query_params)
+    submitted_by = current_request_id()
+
+    # Uploads are closed once the request ends, so read them before queueing
+    csv_bytes = await dataset.read()
+    image_bytes = await ref_image.read() if ref_image else None
+    check_timelapse_memory(timelapse, image_bytes)
+
+    async def runner(job):
+        # Profiled and traced while it runs, not while it waits in the queue; both are keyed by the job id
+        profile = ProfileSession(mode, job.id) if mode else None
+        async with new_trace("analysis job", job.id, submitted_by=submitted_by or ""):
+            result = await run_profiled(profile, run_analysis_pipeline(
+                io.BytesIO(csv_bytes), image_bytes,
+                on_stage=job.set_stage, series_id=series_id, refit=refit, engine=engine,
+                metrics=metrics, intervals=intervals, uncertainty_samples=uncertainty_samples,
+                plot_options=plot_options,
+                delivery=delivery,
+                image_options=image_options,
+                timelapse=timelapse,
+                profile=profile
+            ))
+            return add_trace_info(result, trace)
+
+    job = job_manager.submit(runner)
+    return job.to_status()
+
+@app.get("/analyze/jobs")
+async def get_analysis_job_stats():
+    """Get job queue depth, worker count and job counts by status"""
+    return {
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "jobs": job_manager.stats()
+    }
+
+@app.get("/analyze/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    """Poll a job: queued/running (with current stage)/done/failed"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or its result has expired")
+    return job.to_status()
+
+@app.get("/analyze/jobs/{job_id}/result")
+async def get_analysis_job_result(job_id: str):
+    """Fetch the stored result of a finished job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or its result has expired")
+
+    if not job.finished:
+        return JSONResponse(status_code=409, content=job.to_status())
+
+    if job.error:
+        return JSONResponse(
+            status_code=job.error["status_code"],
+            content={
+                "status": "error",
+                "timestamp": datetime.now().isoformat(),
+                "job_id": job.id,
+                "detail": job.error["detail"]
+            }
+        )
+
+    return pipeline_response(job.result)
+
 @app.post("/quick-forecast")
-async def quick_forecast(dataset: UploadFile = File(...)):
-    """Quick forecast endpoint for basic AQI prediction"""
+async def quick_forecast(
+    dataset: UploadFile = File(...),
+    series_id: Optional[str] = Form(None),
+    refit: bool = Form(True),
+    engine: str = Form(FASTEST_ENGINE),
+    metrics: bool = Form(True),
+    intervals: str = Form("sampled"),
+    uncertainty_samples: Optional[int] = Form(None),
+    trace: bool = Form(False)
+):
+    """Quick forecast endpoint for basic AQI prediction (defaults to the fastest engine)"""
     try:
         logger.info("Starting quick forecast")
+        record_since_request_start("upload_read")
+        engine = validate_engine(engine)
+        intervals = validate_intervals(intervals, uncertainty_samples)
         
         try:
-            df = pd.read_csv(dataset.file)
-            df.columns = df.columns.str.strip()
+            with span("sniff_header"):
+                header = await run_in_threadpool(sniff_header, dataset.file)
         except Exception as e:
             logger.error(f"Error reading CSV in quick-forecast: {str(e)}")
             raise HTTPException(
@@ -1037,20 +2078,25 @@ async def quick_forecast(dataset: UploadFile = File(...)):
                 detail=f"Error reading CSV file: {str(e)}"
             )
         
-        date_col = find_column(df, ['date', 'datetime', 'timestamp'])
-        pm25_col = find_column(df, ['pm25', 'pm2.5', 'aqi'])
+        date_col = find_column(header_frame(header), DATE_COLUMN_NAMES)
+        pm25_col = find_column(header_frame(header), PM25_COLUMN_NAMES)
         
         if not date_col or not pm25_col:
             raise HTTPException(status_code=400, detail="Required columns not found")
         
         try:
-            df[date_col] = pd.to_datetime(df[date_col], dayfirst=True, errors='coerce')
-            aqi_df = df[[date_col, pm25_col]].rename(columns={date_col:'ds', pm25_col:'y'})
-            aqi_df['y'] = pd.to_numeric(aqi_df['y'], errors='coerce')
-            aqi_df = aqi_df.dropna()
-            
-            # Sort by date to ensure chronological order
-            aqi_df = aqi_df.sort_values('ds').reset_index(drop=True)
+            with span("csv_parse"):
+                df, ingest_info = await run_in_threadpool(read_projected_csv, dataset.file, header, date_col, [pm25_col])
+        except Exception as e:
+            logger.error(f"Error reading CSV in quick-forecast: {str(e)}")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Error reading CSV file: {str(e)}"
+            )
+        
+        try:
+            with span("date_parse"):
+                aqi_df, date_info = await run_in_threadpool(prepare_series, df, date_col, pm25_col)
             
             if len(aqi_df) == 0:
                 raise HTTPException(
@@ -1067,48 +2113,57 @@ async def quick_forecast(dataset: UploadFile = File(...)):
             )
         
         try:
-            model = Prophet()
-            model.fit(aqi_df)
-            
-            future = model.make_future_dataframe(periods=7)  # 7 days for quick forecast
-            forecast = model.predict(future)
-            
-            # Calculate basic model metrics for quick forecast
-            from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-            
-            historical_forecast = forecast[forecast['ds'].isin(aqi_df['ds'])]
-            actual_values = aqi_df['y'].values
-            predicted_values = historical_forecast['yhat'].values
+            series_key = series_identity(aqi_df, date_col, pm25_col, series_id, header)
+            with span("forecast", engine=engine):
+                forecast, fit_info = await get_forecast(
+                    aqi_df, 7,  # 7 days for quick forecast
+                    model_key=registry_key(series_key), refit=refit,
+                    engine=engine,
+                    include_history=metrics,
+                    intervals=intervals,
+                    uncertainty_samples=uncertainty_samples
+                )
             
-            mae = safe_float(mean_absolute_error(actual_values, predicted_values))
-            rmse = safe_float(np.sqrt(mean_squared_error(actual_values, predicted_values)))
-            r2 = safe_float(r2_score(actual_values, predicted_values))
+            # Calculate basic model metrics for quick forecast (in-sample rows are only predicted when requested)
+            model_metrics = None
+            if metrics:
+                with span("metrics"):
+                    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+                    
+                    historical_forecast = forecast[forecast['ds'].isin(aqi_df['ds'])]
+                    actual_values = aqi_df['y'].values
+                    predicted_values = historical_forecast['yhat'].values
+                    
+                    model_metrics = {
+                        "mae": safe_float(mean_absolute_error(actual_values, predicted_values)),
+                        "rmse": safe_float(np.sqrt(mean_squared_error(actual_values, predicted_values))),
+                        "r2_score": safe_float(r2_score(actual_values, predicted_values))
+                    }
             
         except Exception as e:
-            logger.error(f"Error in Prophet forecasting for quick-forecast: {str(e)}")
+            logger.error(f"Error in {engine} forecasting for quick-forecast: {str(e)}")
             raise HTTPException(
                 status_code=500,
                 detail=f"Error in forecasting: {str(e)}"
             )
         
-        predictions = []
-        for _, row in forecast.tail(7).iterrows():
-            aqi_val = safe_float(row['yhat'])
-            category, color = classify_aqi(aqi_val)
-            predictions.append({
-                "date": row['ds'].strftime("%Y-%m-%d"),
-                "predicted_aqi": aqi_val,
-                "category": category,
-                "color": color
-            })
+        predictions = build_prediction_records(forecast.tail(7), include_haze=False, include_bounds=False)
         
         response = {
             "status": "success",
             "predictions": predictions,
-            "model_metrics": {
-                "mae": mae,
-                "rmse": rmse,
-                "r2_score": r2
+            "model_metrics": model_metrics,
+            "model_registry": {
+                "engine": engine,
+                "series_id": series_key,
+                "cache_hit": fit_info.get("cache_hit", False),
+                "refit": fit_info.get("refit", True),
+                "warm_start": fit_info.get("warm_start", False)
+            },
+            "timings": {
+                "ingest": ingest_info,
+                "date_parsing": date_info,
+                "forecast": forecast_timings(fit_info)
             },
             "summary": {
                 "next_day_aqi": predictions[0]["predicted_aqi"],
@@ -1116,8 +2171,9 @@ async def quick_forecast(dataset: UploadFile = File(...)):
             }
         }
         
-        # Clean the response data to ensure no NaN/inf values
-        return clean_response_data(response)
+        add_trace_info(response, trace)
+        with span("encode"):
+            return FastJSONResponse(response)
         
     except HTTPException as he:
         logger.warning(f"HTTP Exception in quick-forecast: {he.detail}")
@@ -1134,9 +2190,264 @@ async def quick_forecast(dataset: UploadFile = File(...)):
             }
         )
 
+@app.post("/forecast/batch")
+async def batch_forecast(
+    datasets: List[UploadFile] = File(...),
+    station_column: Optional[str] = Form(None),
+    periods: int = Form(30),
+    refit: bool = Form(True),
+    engine: str = Form("prophet"),
+    intervals: str = Form("sampled"),
+    uncertainty_samples: Optional[int] = Form(None)
+):
+    """Forecast many stations at once, from one CSV per station or a long-format CSV with a station column"""
+    engine = validate_engine(engine)
+    intervals = validate_intervals(intervals, uncertainty_samples)
+    if not 1 <= periods <= BATCH_MAX_PERIODS:
+        raise HTTPException(status_code=400, detail=f"periods must be between 1 and {BATCH_MAX_PERIODS}")
+    
+    start = time.perf_counter()
+    names = [os.path.splitext(os.path.basename(dataset.filename or ""))[0] or f"station_{i + 1}"
+             for i, dataset in enumerate(datasets)]
+    loaded = await asyncio.gather(
+        *(run_in_threadpool(load_station_frames, dataset.file, name, station_column)
+          for dataset, name in zip(datasets, names)),
+        return_exceptions=True
+    )
+    
+    files, stations, failed = [], {}, []
+    for name, outcome in zip(names, loaded):
+        if isinstance(outcome, Exception):
+            # An unreadable file fails the station it stands for, not the batch
+            logger.warning(f"Batch file '{name}' could not be read: {str(outcome)}")
+            files.append({"file": name, "status": "error", "detail": str(outcome)})
+            failed.append({"station": name, "status": "error", "detail": f"Error reading CSV file: {str(outcome)}"})
+            continue
+        groups, info = outcome
+        files.append({"status": "success", **info})
+        for station, frame in groups.items():
+            # Two uploads named data.csv (or a station repeated across files) are both forecast
+            key, n = station, 2
+            while key in stations:
+                key, n = f"{station}_{n}", n + 1
+            if key != station:
+                logger.warning(f"Duplicate station '{station}' in file '{name}' renamed to '{key}'")
+            stations[key] = (frame, info["columns"])
+    
+    if len(stations) > BATCH_MAX_STATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many stations ({len(stations)}). At most {BATCH_MAX_STATIONS} per batch."
+        )
+    ingest_seconds = time.perf_counter() - start
+    logger.info(f"Batch forecast for {len(stations)} stations from {len(datasets)} files ({BATCH_CONCURRENCY} at a time)")
+    
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    forecast_start = time.perf_counter()
+    results = await asyncio.gather(*(
+        forecast_station(
+            station, frame, columns, periods, semaphore,
+            refit=refit, engine=engine, intervals=intervals, uncertainty_samples=uncertainty_samples
+        )
+        for station, (frame, columns) in stations.items()
+    ))
+    forecast_seconds = time.perf_counter() - forecast_start
+    results = list(results) + failed
+    
+    succeeded = sum(result["status"] == "success" for result in results)
+    station_seconds = sum(result["timings"].get("forecast_seconds", 0.0) for result in results if "timings" in result)
+    return FastJSONResponse({
+        "status": "success" if succeeded == len(results) else "partial" if succeeded else "error",
+        "timestamp": datetime.now().isoformat(),
+        "engine": engine,
+        "periods": periods,
+        "summary": {
+            "stations": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "concurrency": BATCH_CONCURRENCY
+        },
+        "files": files,
+        "stations": results,
+        "timings": {
+            "ingest_seconds": round(ingest_seconds, 4),
+            "forecast_seconds": round(forecast_seconds, 4),
+            # Sum of per-station forecast times over the wall time they took together
+            "parallel_speedup": round(station_seconds / forecast_seconds, 2) if forecast_seconds > 0 else None,
+            "total_seconds": round(time.perf_counter() - start, 4)
+        }
+    })
+
+@app.post("/aqi/bulk")
+async def bulk_aqi(
+    dataset: UploadFile = File(...),
+    daily: bool = Form(True)
+):
+    """Convert whole pollutant columns to AQI sub-indices, overall AQI and primary pollutant"""
+    try:
+        header = await run_in_threadpool(sniff_header, dataset.file)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error reading CSV file: {str(e)}")
+    
+    columns = header_frame(header)
+    date_col = find_column(columns, DATE_COLUMN_NAMES)
+    pollutant_cols = {}
+    for param, names in {'pm25': PM25_COLUMN_NAMES, **POLLUTANT_COLUMN_NAMES}.items():
+        col = find_column(columns, names)
+        if col:
+            pollutant_cols[param] = col
+    
+    if not date_col or not pollutant_cols:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Required columns not found. Available: {columns.columns.tolist()}. Please provide a date column and at least one pollutant column."
+        )
+    
+    try:
+        df, ingest_info = await run_in_threadpool(
+            read_projected_csv, dataset.file, header, date_col, list(pollutant_cols.values())
+        )
+        dates, date_info = await run_in_threadpool(parse_dates, df[date_col], date_col)
+    except Exception as e:
+        logger.error(f"Error reading CSV in bulk AQI: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Error reading CSV file: {str(e)}")
+    
+    concentrations = pd.DataFrame({param: widen_floats(df[col]) for param, col in pollutant_cols.items()})
+    start = time.perf_counter()
+    if daily:
+        aqi_frame = await run_in_threadpool(compute_daily_aqi, dates, concentrations)
+        payload = aqi_series_payload(aqi_frame)
+    else:
+        concentrations.index = pd.DatetimeIndex(dates)
+        concentrations = concentrations[concentrations.index.notna()].sort_index()
+        aqi_frame = await run_in_threadpool(compute_aqi_frame, concentrations)
+        payload = aqi_series_payload(aqi_frame, "%Y-%m-%d %H:%M:%S")
+    aqi_seconds = time.perf_counter() - start
+    
+    return FastJSONResponse({
+        "status": "success",
+        "rows": len(df),
+        "points": len(aqi_frame),
+        "aggregation": "daily" if daily else "row",
+        "pollutants": pollutant_cols,
+        "series": payload,
+        "timings": {
+            "ingest": ingest_info,
+            "date_parsing": date_info,
+            "aqi_seconds": round(aqi_seconds, 4)
+        }
+    })
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    return {"status": "healthy", "timestamp": datetime.now().isoformat(), "warmup": warmup.status}
+
+@app.post("/warmup", status_code=202)
+async def start_warmup(force: bool = False):
+    """Pre-load heavy modules, Prophet's Stan model and the renderers in the background"""
+    started = warmup.start(warmup_steps(), force=force)
+    return {
+        "status": "started" if started else warmup.status,
+        "timestamp": datetime.now().isoformat(),
+        "warmup": warmup.info()
+    }
+
+@app.get("/startup")
+async def get_startup_report():
+    """Cold-start report: per-import timings, startup milestones and warm-up progress"""
+    return {
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "startup": startup_report()
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Request, pipeline stage and resource metrics in Prometheus text format"""
+    return Response(content=await run_in_threadpool(render_metrics), media_type=CONTENT_TYPE)
+
+@app.get("/profiles")
+async def get_profiles():
+    """List stored request profiles, newest first"""
+    return {
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "profiles": await run_in_threadpool(list_profiles)
+    }
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """Summary of a stored profile: per-stage wall/CPU/memory and the top functions"""
+    summary = await run_in_threadpool(load_profile, profile_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {"status": "success", "profile": summary}
+
+@app.get("/profiles/{profile_id}/raw")
+async def download_profile(profile_id: str):
+    """Raw profile: collapsed stacks (sampling) or a pstats file (cprofile)"""
+    path = await run_in_threadpool(raw_profile_path, profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "text/plain" if path.endswith(".folded") else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path))
+
+@app.get("/executor")
+async def get_executor_status():
+    """Get the pipeline process pool configuration"""
+    return {
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "executor": get_executor_info()
+    }
+
+@app.get("/forecast-cache")
+async def get_forecast_cache_stats():
+    """Get forecast cache hit/miss counters and tier sizes"""
+    return {
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "forecast_cache": await run_in_threadpool(forecast_cache.stats)
+    }
+
+@app.get("/artifacts")
+async def get_artifact_stats():
+    """Get the number and total size of stored artifacts"""
+    return {
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "artifacts": await run_in_threadpool(artifact_stats)
+    }
+
+@app.delete("/forecast-cache")
+async def clear_forecast_cache():
+    """Drop every cached forecast (memory and disk)"""
+    await run_in_threadpool(forecast_cache.clear)
+    return {
+        "status": "success",
+        "message": "Forecast cache cleared",
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/models")
+async def get_registered_models():
+    """List fitted models stored in the model registry"""
+    return {
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "models": await run_in_threadpool(list_models)
+    }
+
+@app.delete("/models/{model_key}")
+async def delete_registered_model(model_key: str):
+    """Remove a stored model so the next upload of that series fits from scratch"""
+    if not await run_in_threadpool(delete_model, model_key):
+        raise HTTPException(status_code=404, detail="Model not found")
+    return {
+        "status": "success",
+        "message": f"Model {model_key} deleted",
+        "timestamp": datetime.now().isoformat()
+    }
 
 @app.get("/system-resources")
 async def get_system_resources():
@@ -1186,6 +2497,8 @@ async def trigger_system_check():
             "timestamp": datetime.now().isoformat()
         }
 
+mark("imported")
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,259 @@
+"""
+Prometheus text-format metrics for GET /metrics.
+
+A small in-process registry (counters, gauges, histograms with labels)
+rendered in the text exposition format 0.0.4, so no client library is
+needed. Values are kept per process: with several uvicorn workers each one
+is scraped (or load balanced) on its own.
+
+Three kinds of metrics are exposed:
+    request metrics     MetricsMiddleware counts requests and observes their
+                        latency per method and route template, and tracks
+                        in-flight requests
+    pipeline metrics    StageTimer observes the duration of each STEP of the
+                        analysis pipeline; Prophet fit/predict are observed
+                        separately from the engine's own timings
+    scrape-time gauges  collectors registered with register_collector are
+                        called on every scrape (queue depth, RSS, disk, memory)
+"""
+
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; spans a cached quick forecast up to a large Prophet fit with image rendering
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (label values, value) pairs for one metric
+Samples = List[Tuple[Dict[str, str], float]]
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+# ================================
+# METRIC TYPES
+# ================================
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {list(self.labelnames)}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: Tuple[str, ...], value) -> List[str]:
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"]
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    """Cumulative buckets plus sum and count of observed values"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, sum, count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key: Tuple[str, ...], value) -> List[str]:
+        counts, total, count = value
+        labels = self._labels(key)
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+        lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+# ================================
+# REGISTRY
+# ================================
+
+# A collector returns (name, type, help, samples) for gauges computed at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, Samples]]]
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Collector] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+def register_collector(collector: Collector):
+    REGISTRY.register_collector(collector)
+
+def render_metrics() -> str:
+    """The whole registry in Prometheus text format"""
+    return REGISTRY.render()
+
+# ================================
+# HTTP AND PIPELINE METRICS
+# ================================
+
+HTTP_REQUESTS = counter("aqi_http_requests_total", "HTTP requests by method, route and status", ("method", "route", "status"))
+HTTP_LATENCY = histogram("aqi_http_request_duration_seconds", "HTTP request latency by method and route", ("method", "route"))
+HTTP_IN_FLIGHT = gauge("aqi_http_requests_in_flight", "HTTP requests being handled")
+PIPELINE_STAGE_SECONDS = histogram("aqi_pipeline_stage_seconds", "Duration of each analysis pipeline stage", ("stage",))
+FORECAST_SECONDS = histogram("aqi_forecast_seconds", "Forecast engine fit and predict time (cache misses only)", ("engine", "phase"))
+
+def route_template(scope) -> str:
+    """
+    Route path template (/analyze/jobs/{job_id}), so label values stay bounded.
+
+    Mounted apps (the /outputs and /plots static files) set no route, only
+    extend root_path with the mount path, so they are labelled /outputs/{path}.
+    """
+    path = getattr(scope.get("route"), "path", None)
+    if path is not None:
+        return path
+    root_path = scope.get("root_path", "")
+    mount_path = root_path[len(scope.get("app_root_path", "")):]
+    return f"{mount_path}/{{path}}" if mount_path else "unmatched"
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and observing their latency per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            route = route_template(scope)
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=str(status["code"]))
+            HTTP_LATENCY.observe(seconds, method=scope["method"], route=route)
+
+class StageTimer:
+    """Observes how long each named stage ran, from its start to the next stage (or finish)"""
+
+    def __init__(self, histogram: Histogram = PIPELINE_STAGE_SECONDS):
+        self.histogram = histogram
+        self._current: Optional[str] = None
+        self._started = 0.0
+
+    def start(self, name: str):
+        self.finish()
+        self._current, self._started = name, time.perf_counter()
+
+    def finish(self):
+        if self._current is not None:
+            self.histogram.observe(time.perf_counter() - self._started, stage=self._current)
+            self._current = None
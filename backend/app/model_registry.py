@@ -0,0 +1,191 @@
+"""
+On-disk registry of fitted Prophet models, one per series identity.
+
+Station data is appended daily, so consecutive uploads of a series differ by
+a handful of rows. Instead of fitting from scratch every time, the previous
+fit's parameters are used as Stan initial values (warm start), which cuts the
+optimizer's work sharply. A stored model can also serve a forecast with no
+refit at all.
+
+Models are written with Prophet's JSON serialization. Registry functions run
+inside the pipeline worker processes, so all state lives on disk.
+
+Configuration (environment variables):
+    AQI_MODEL_REGISTRY              Enable the registry (default: 1)
+    AQI_MODEL_REGISTRY_DIR          Storage directory (default: models)
+    AQI_MODEL_REGISTRY_MAX_MODELS   Stored models before least-recently-fitted eviction (default: 200)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Imported lazily (see engines.py): only loading and saving models needs prophet
+if TYPE_CHECKING:
+    from prophet import Prophet
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_ENABLED = os.getenv("AQI_MODEL_REGISTRY", "1") == "1"
+REGISTRY_DIR = os.getenv("AQI_MODEL_REGISTRY_DIR", "models")
+REGISTRY_MAX_MODELS = int(os.getenv("AQI_MODEL_REGISTRY_MAX_MODELS", "200"))
+# Leading (ds, y) rows hashed into a derived identity
+FINGERPRINT_ROWS = 48
+
+# ================================
+# SERIES IDENTITY
+# ================================
+
+def series_identity(aqi_df: pd.DataFrame, date_col: str, value_col: str, series_id: Optional[str] = None,
+                    columns: Sequence[str] = ()) -> str:
+    """
+    Identify the series a dataset belongs to.
+
+    An explicit `series_id` (e.g. a station code) wins. Otherwise the identity
+    is a fingerprint of the file's columns (`columns`, the full header) and
+    its first FINGERPRINT_ROWS (ds, y) rows, which stays stable while new rows
+    are appended to the end of the series but differs between stations that
+    happen to share a header and a start date.
+    """
+    if series_id:
+        cleaned = re.sub(r'[^A-Za-z0-9_.-]', '_', series_id.strip())[:64]
+        if cleaned:
+            return cleaned
+
+    names = sorted({str(col).strip().lower() for col in columns} - {date_col.strip().lower()})
+    digest = hashlib.sha256(f"{date_col.strip().lower()}|{value_col.strip().lower()}|{','.join(names)}".encode())
+    if len(aqi_df):
+        # Every row up to the last leading timestamp, ordered by value too, so ties sort the same each upload
+        cutoff = aqi_df['ds'].iloc[min(FINGERPRINT_ROWS, len(aqi_df)) - 1]
+        leading = aqi_df[aqi_df['ds'] <= cutoff].sort_values(['ds', 'y'])
+        digest.update(leading['ds'].to_numpy(dtype='datetime64[ns]').astype(np.int64).tobytes())
+        digest.update(np.round(leading['y'].to_numpy(dtype=np.float64), 6).tobytes())
+    return "auto-" + digest.hexdigest()[:16]
+
+def registry_key(identity: str, prophet_kwargs: Optional[Dict] = None) -> str:
+    """Models are only reusable with identical settings, so those are part of the key"""
+    settings = json.dumps(prophet_kwargs or {}, sort_keys=True, default=str)
+    return f"{identity}__{hashlib.sha256(settings.encode()).hexdigest()[:12]}"
+
+# ================================
+# STORAGE
+# ================================
+
+_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+def _valid_key(key: str) -> bool:
+    # Keys end up in file paths, so reject anything that could escape REGISTRY_DIR
+    return bool(_KEY_PATTERN.match(key)) and '..' not in key
+
+def _model_path(key: str) -> str:
+    return os.path.join(REGISTRY_DIR, f"{key}.json")
+
+def _meta_path(key: str) -> str:
+    return os.path.join(REGISTRY_DIR, f"{key}.meta.json")
+
+def _atomic_write(path: str, content: str):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def load_model(key: str) -> Optional["Prophet"]:
+    """Load a fitted model, or None if the key is unknown or unreadable"""
+    if not REGISTRY_ENABLED or not _valid_key(key):
+        return None
+
+    from prophet.serialize import model_from_json
+
+    try:
+        with open(_model_path(key), "r") as f:
+            return model_from_json(f.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Discarding unreadable registry model {key}: {str(e)}")
+        delete_model(key)
+        return None
+
+def save_model(key: str, model: "Prophet", metadata: Dict[str, Any]):
+    """Serialize a fitted model and its metadata, then enforce the model cap"""
+    if not REGISTRY_ENABLED or not _valid_key(key):
+        return
+
+    from prophet.serialize import model_to_json
+
+    try:
+        os.makedirs(REGISTRY_DIR, exist_ok=True)
+        _atomic_write(_model_path(key), model_to_json(model))
+        _atomic_write(_meta_path(key), json.dumps({"key": key, "saved_at": time.time(), **metadata}, default=str))
+        _evict()
+    except Exception as e:
+        logger.warning(f"Could not store registry model {key}: {str(e)}")
+
+def delete_model(key: str) -> bool:
+    """Remove a model and its metadata; returns whether anything was deleted"""
+    if not _valid_key(key):
+        return False
+
+    removed = False
+    for path in (_model_path(key), _meta_path(key)):
+        try:
+            os.remove(path)
+            removed = True
+        except OSError:
+            pass
+    return removed
+
+def list_models() -> List[Dict[str, Any]]:
+    """Metadata of every stored model, most recently fitted first"""
+    if not os.path.isdir(REGISTRY_DIR):
+        return []
+
+    models = []
+    for entry in os.scandir(REGISTRY_DIR):
+        if entry.name.endswith(".meta.json"):
+            try:
+                with open(entry.path, "r") as f:
+                    models.append(json.load(f))
+            except Exception:
+                continue
+    return sorted(models, key=lambda m: m.get("saved_at", 0), reverse=True)
+
+def _evict():
+    """Drop the least recently fitted models beyond the configured cap"""
+    models = list_models()
+    for meta in models[REGISTRY_MAX_MODELS:]:
+        delete_model(meta["key"])
+
+# ================================
+# WARM START
+# ================================
+
+def warm_start_params(model: "Prophet") -> Dict[str, Any]:
+    """Extract a fitted model's parameters in the shape Stan expects as initial values"""
+    params = {}
+    for name in ['k', 'm', 'sigma_obs']:
+        if model.mcmc_samples == 0:
+            params[name] = model.params[name][0][0]
+        else:
+            params[name] = np.mean(model.params[name])
+    for name in ['delta', 'beta']:
+        if model.mcmc_samples == 0:
+            params[name] = model.params[name][0]
+        else:
+            params[name] = np.mean(model.params[name], axis=0)
+    return params
+
+def future_frame(aqi_df: pd.DataFrame, periods: int) -> pd.DataFrame:
+    """Same layout as Prophet.make_future_dataframe, built from the uploaded history"""
+    history_dates = pd.to_datetime(aqi_df['ds']).drop_duplicates().sort_values()
+    last_date = history_dates.max()
+    dates = pd.date_range(start=last_date, periods=periods + 1, freq='D')
+    dates = dates[dates > last_date][:periods]
+    return pd.DataFrame({'ds': np.concatenate((history_dates.to_numpy(), dates.to_numpy()))})
@@ -0,0 +1,328 @@
+"""
+Opt-in profiling of analysis requests.
+
+A request is profiled when it carries the ``X-AQI-Profile`` header or a
+``profile`` query parameter (value: a mode, or 1/true for the default mode),
+or when it is picked by AQI_PROFILE_SAMPLE_RATE. Modes:
+
+    sampling    a background thread samples the stacks of every thread in
+                the process every AQI_PROFILE_INTERVAL_MS, so work handed to
+                the thread pools (CSV parsing, rendering) is seen too; idle
+                waits are dropped
+    cprofile    deterministic cProfile of the event-loop thread only
+
+Both see the whole process, so requests running at the same time show up in
+each other's profiles. Forecasts fitted in the process pool are not profiled
+function by function. They still show up as time in the forecast stage.
+
+Per pipeline STEP the wall time, process CPU time (all threads of the API
+process) and, with AQI_PROFILE_TRACE_MEMORY, the tracemalloc peak are
+recorded. Each profile is written to AQI_PROFILE_DIR as ``<id>.json`` (summary)
+plus the raw profile (``<id>.folded`` collapsed stacks for sampling,
+``<id>.prof`` pstats for cprofile). Only the newest AQI_PROFILE_MAX_PROFILES
+are kept.
+
+Configuration (environment variables):
+    AQI_PROFILE_SAMPLE_RATE     Fraction of analyses profiled without being asked (default: 0)
+    AQI_PROFILE_MODE            Default mode: sampling or cprofile (default: sampling)
+    AQI_PROFILE_INTERVAL_MS     Sampling interval (default: 5)
+    AQI_PROFILE_TRACE_MEMORY    Record tracemalloc peaks per stage (default: 1)
+    AQI_PROFILE_TOP             Functions listed in the summary (default: 20)
+    AQI_PROFILE_DIR             Storage directory (default: profiles)
+    AQI_PROFILE_MAX_PROFILES    Stored profiles before the oldest are deleted (default: 50)
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from .ingest import memory_trace_lock
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("sampling", "cprofile")
+PROFILE_SAMPLE_RATE = float(os.getenv("AQI_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MODE = os.getenv("AQI_PROFILE_MODE", "sampling")
+PROFILE_INTERVAL_MS = float(os.getenv("AQI_PROFILE_INTERVAL_MS", "5"))
+PROFILE_TRACE_MEMORY = os.getenv("AQI_PROFILE_TRACE_MEMORY", "1") == "1"
+PROFILE_TOP = int(os.getenv("AQI_PROFILE_TOP", "20"))
+PROFILE_DIR = os.getenv("AQI_PROFILE_DIR", "profiles")
+PROFILE_MAX_PROFILES = int(os.getenv("AQI_PROFILE_MAX_PROFILES", "50"))
+
+PROFILE_HEADER = "x-aqi-profile"
+RAW_EXTENSIONS = {"sampling": "folded", "cprofile": "prof"}
+_PROFILE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_store_lock = threading.Lock()
+# Only one cProfile can be active on the event-loop thread; later requests fall back to sampling
+_cprofile_lock = threading.Lock()
+
+def profile_mode(headers, query_params) -> Optional[str]:
+    """Requested profiling mode (None = not profiled), rejecting unknown modes with a 400"""
+    requested = headers.get(PROFILE_HEADER) or query_params.get("profile")
+    if requested is None:
+        return PROFILE_MODE if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE else None
+
+    requested = requested.strip().lower()
+    if requested in ("", "0", "false", "off"):
+        return None
+    if requested in ("1", "true", "on"):
+        return PROFILE_MODE
+    if requested not in PROFILE_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown profile mode '{requested}'. Available: {list(PROFILE_MODES)}"
+        )
+    return requested
+
+# ================================
+# STACK SAMPLER
+# ================================
+
+# Leaf frames of threads that are waiting, not working (pool workers, the idle event loop)
+_IDLE_LEAVES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"), ("queue.py", "get"), ("thread.py", "_worker")
+}
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler(threading.Thread):
+    """Samples every other thread's Python stack at a fixed interval"""
+
+    def __init__(self, interval: float):
+        super().__init__(name="aqi-profiler", daemon=True)
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(ident, str(ident)))
+                self.stacks[tuple(reversed(labels))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def top_functions(self, seconds_per_sample: float, limit: int) -> List[Dict]:
+        """Functions by inclusive samples, with self samples, converted to seconds"""
+        inclusive, own = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            # Recursion must not count a function twice per sample
+            for label in set(stack[1:]):
+                inclusive[label] += count
+        return [
+            {
+                "function": label,
+                "total_seconds": round(count * seconds_per_sample, 4),
+                "self_seconds": round(own[label] * seconds_per_sample, 4),
+                "samples": count
+            }
+            for label, count in inclusive.most_common(limit)
+        ]
+
+    def folded(self) -> bytes:
+        """Collapsed stacks, one 'frame;frame;... count' line each (flame graph input)"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common()).encode()
+
+# ================================
+# SESSION
+# ================================
+
+class ProfileSession:
+    """Profiles one pipeline run: a profiler around it plus wall/CPU/memory per stage"""
+
+    def __init__(self, mode: str, profile_id: Optional[str] = None):
+        self.id = profile_id if profile_id and _PROFILE_ID.match(profile_id) else uuid.uuid4().hex
+        self.mode = mode
+        self.stages: List[Dict] = []
+        self._current: Optional[Tuple[str, float, float]] = None
+        self._sampler: Optional[StackSampler] = None
+        self._profiler: Optional[cProfile.Profile] = None
+        self._trace_memory = False
+
+    def start(self):
+        # The ingest step's own memory measurement is skipped while a profile traces memory
+        self._trace_memory = (PROFILE_TRACE_MEMORY and not tracemalloc.is_tracing()
+                              and memory_trace_lock.acquire(blocking=False))
+        if self._trace_memory:
+            tracemalloc.start()
+
+        if self.mode == "cprofile" and not _cprofile_lock.acquire(blocking=False):
+            logger.info(f"Another cProfile session is active, profiling {self.id} by sampling")
+            self.mode = "sampling"
+
+        self._started = (time.perf_counter(), time.process_time())
+        if self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = StackSampler(PROFILE_INTERVAL_MS / 1000)
+            self._sampler.start()
+
+    def stage(self, name: Optional[str]):
+        """Close the running stage (if any) and start timing `name`"""
+        now = (time.perf_counter(), time.process_time())
+        if self._current is not None:
+            current, wall, cpu = self._current
+            entry = {
+                "stage": current,
+                "wall_seconds": round(now[0] - wall, 4),
+                "cpu_seconds": round(now[1] - cpu, 4)
+            }
+            if self._trace_memory:
+                entry["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+            self.stages.append(entry)
+        self._current = (name, *now) if name is not None else None
+        if self._trace_memory:
+            tracemalloc.reset_peak()
+
+    def finish(self, status: str = "success") -> Dict:
+        """Stop profiling, store the profile and return its summary"""
+        self.stage(None)
+        wall = time.perf_counter() - self._started[0]
+        cpu = time.process_time() - self._started[1]
+
+        if self._profiler is not None:
+            self._profiler.disable()
+            _cprofile_lock.release()
+            top, raw = self._cprofile_top(), self._profiler
+        else:
+            self._sampler.stop()
+            seconds_per_sample = wall / max(self._sampler.samples, 1)
+            top, raw = self._sampler.top_functions(seconds_per_sample, PROFILE_TOP), self._sampler.folded()
+
+        peak = None
+        if self._trace_memory:
+            peak = max((entry.get("peak_memory_bytes", 0) for entry in self.stages), default=0)
+            tracemalloc.stop()
+            memory_trace_lock.release()
+
+        summary = {
+            "profile_id": self.id,
+            "mode": self.mode,
+            "status": status,
+            "created_at": datetime.now().isoformat(),
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(cpu, 4),
+            "peak_memory_bytes": peak,
+            "samples": self._sampler.samples if self._sampler is not None else None,
+            "stages": self.stages,
+            "top_functions": top,
+            "url": f"/profiles/{self.id}",
+            "raw_url": f"/profiles/{self.id}/raw"
+        }
+        try:
+            save_profile(summary, raw, RAW_EXTENSIONS[self.mode])
+        except Exception as e:
+            logger.warning(f"Could not store profile {self.id}: {str(e)}")
+        logger.info(f"Profiled request {self.id} ({self.mode}): {wall:.2f}s wall, {cpu:.2f}s CPU")
+        return summary
+
+    def _cprofile_top(self) -> List[Dict]:
+        stats = pstats.Stats(self._profiler, stream=io.StringIO())
+        rows = []
+        for (filename, line, name), (_, calls, own, total, _) in stats.stats.items():
+            rows.append({
+                "function": f"{name} ({os.path.basename(filename)}:{line})",
+                "total_seconds": round(total, 4),
+                "self_seconds": round(own, 4),
+                "calls": calls
+            })
+        rows.sort(key=lambda row: row["total_seconds"], reverse=True)
+        return rows[:PROFILE_TOP]
+
+# ================================
+# STORAGE
+# ================================
+
+def _summary_path(profile_id: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{profile_id}.json")
+
+def save_profile(summary: Dict, raw, raw_ext: str):
+    """Write the summary and raw profile, then delete the oldest beyond the cap"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    raw_path = os.path.join(PROFILE_DIR, f"{summary['profile_id']}.{raw_ext}")
+    if isinstance(raw, bytes):
+        with open(raw_path, "wb") as f:
+            f.write(raw)
+    else:
+        raw.dump_stats(raw_path)
+    with open(_summary_path(summary["profile_id"]), "w") as f:
+        json.dump(summary, f)
+
+    with _store_lock:
+        summaries = sorted(
+            (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in summaries[:max(len(summaries) - PROFILE_MAX_PROFILES, 0)]:
+            delete_profile(entry.name[:-len(".json")])
+
+def load_profile(profile_id: str) -> Optional[Dict]:
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(_summary_path(profile_id), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def raw_profile_path(profile_id: str) -> Optional[str]:
+    """Path of the stored raw profile, or None"""
+    summary = load_profile(profile_id)
+    if summary is None:
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.{RAW_EXTENSIONS[summary['mode']]}")
+    return path if os.path.exists(path) else None
+
+def delete_profile(profile_id: str):
+    for ext in ("json", *RAW_EXTENSIONS.values()):
+        try:
+            os.remove(os.path.join(PROFILE_DIR, f"{profile_id}.{ext}"))
+        except FileNotFoundError:
+            pass
+
+def list_profiles() -> List[Dict]:
+    """Stored profiles, newest first, without their function lists"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        if entry.name.endswith(".json"):
+            summary = load_profile(entry.name[:-len(".json")])
+            if summary is not None:
+                profiles.append({key: summary[key] for key in
+                                 ("profile_id", "mode", "status", "created_at", "wall_seconds", "cpu_seconds", "url")})
+    return sorted(profiles, key=lambda item: item["created_at"], reverse=True)
@@ -0,0 +1,82 @@
+"""
+Fast, NaN-safe JSON responses.
+
+Returning a dict from an endpoint costs two full Python walks of the payload:
+`clean_response_data` replacing NaN/inf, then FastAPI's `jsonable_encoder`
+before `json.dumps`. `FastJSONResponse` serializes the content in a single
+pass with orjson instead:
+
+    NaN / inf                       null
+    NumPy arrays and scalars        native (no .tolist() needed)
+    pandas Timestamp / Series       ISO string / array
+
+Return a `FastJSONResponse(...)` directly from an endpoint to skip
+`jsonable_encoder`. Without orjson installed, the payload is converted with
+a pure-Python walk and encoded with the standard json module (same output).
+"""
+
+import json
+import math
+from datetime import date, datetime
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+def _default(obj: Any) -> Any:
+    """Types orjson does not serialize natively (also used by the fallback walk)"""
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return obj.to_numpy()
+    if isinstance(obj, pd.Categorical):
+        return np.asarray(obj, dtype=object)
+    if isinstance(obj, np.ndarray):
+        # Object/string arrays; numeric arrays never reach here with orjson
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def _to_builtin(obj: Any) -> Any:
+    """Fallback conversion to JSON-safe builtins when orjson is not installed"""
+    if isinstance(obj, dict):
+        return {str(k): _to_builtin(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_to_builtin(item) for item in obj]
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if obj is None or isinstance(obj, (str, bool, int)):
+        return obj
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return _to_builtin(_default(obj))
+
+def dumps(content: Any) -> bytes:
+    """Serialize a response payload to compact JSON bytes"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(
+        _to_builtin(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered in one pass, with NaN/inf as null"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,202 @@
+"""
+Cold-start accounting and background warm-up.
+
+Importing the app used to pull in prophet/cmdstanpy, matplotlib, seaborn and
+OpenCV before the first byte could be served. Heavy modules are now bound
+with ``lazy_import`` and load on first attribute access; prophet is imported
+inside the functions that fit or load models. Every timed import records its
+duration and the phase it happened in:
+
+    startup     core dependencies imported with the app (timed_imports)
+    lazy        loaded on first use by a request
+    warmup      loaded by the background warm-up
+
+Warm-up runs a list of named async steps once in the background (started by
+POST /warmup, or right after startup with AQI_WARMUP=1), so the first real
+request does not pay for imports and Prophet's first model load.
+GET /startup reports all of it.
+
+Configuration (environment variables):
+    AQI_WARMUP      Start the warm-up in the background on startup (default: 1)
+"""
+
+import asyncio
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from types import ModuleType
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ON_STARTUP = os.getenv("AQI_WARMUP", "1") == "1"
+
+# Reference point for the app's own import time (this module is imported first)
+_module_loaded = time.perf_counter()
+_process_started = psutil.Process().create_time()
+
+_imports: "OrderedDict[str, Dict]" = OrderedDict()
+_imports_lock = threading.Lock()
+_lazy_modules: List["LazyModule"] = []
+_milestones: Dict[str, float] = {}
+
+# ================================
+# TIMED IMPORTS
+# ================================
+
+def timed_import(name: str, phase: str = "startup") -> ModuleType:
+    """Import `name`, recording how long it took if it was not loaded yet"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    seconds = time.perf_counter() - start
+    with _imports_lock:
+        if name not in _imports:
+            _imports[name] = {"module": name, "phase": phase, "seconds": round(seconds, 4)}
+    logger.info(f"Imported {name} in {seconds:.3f}s ({phase})")
+    return module
+
+def timed_imports(*names: str):
+    """Import and time core dependencies up front, in order"""
+    for name in names:
+        timed_import(name)
+
+class LazyModule:
+    """Stand-in for a module that is imported (and timed) on first attribute access"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def _load(self, phase: str = "lazy") -> ModuleType:
+        if self._module is None:
+            self._module = timed_import(self._name, phase)
+        return self._module
+
+    @property
+    def _loaded(self) -> bool:
+        return self._module is not None or self._name in sys.modules
+
+    def __getattr__(self, attr: str):
+        value = getattr(self._load(), attr)
+        # Later lookups of the same name skip __getattr__ entirely
+        setattr(self, attr, value)
+        return value
+
+    def __repr__(self) -> str:
+        return f"<lazy module '{self._name}' ({'loaded' if self._loaded else 'not loaded'})>"
+
+def lazy_import(name: str) -> LazyModule:
+    """Bind a heavy module without importing it yet"""
+    module = LazyModule(name)
+    _lazy_modules.append(module)
+    return module
+
+def load_lazy_modules(extra: Sequence[str] = (), phase: str = "warmup") -> List[str]:
+    """Import every module bound with lazy_import that is still pending, plus `extra` modules"""
+    pending = [module._name for module in _lazy_modules if not module._loaded]
+    # The same module may be bound in several places
+    pending = list(dict.fromkeys(pending + [name for name in extra if name not in sys.modules]))
+    for name in pending:
+        timed_import(name, phase)
+    return pending
+
+# ================================
+# STARTUP REPORT
+# ================================
+
+def mark(milestone: str):
+    """Record when a startup milestone (imported, ready) was reached"""
+    _milestones.setdefault(milestone, time.perf_counter())
+
+def startup_report() -> Dict:
+    """Per-import timings, startup milestones and lazy module state"""
+    since_process = time.time() - _process_started
+    since_module = time.perf_counter() - _module_loaded
+    with _imports_lock:
+        imports = sorted(_imports.values(), key=lambda item: item["seconds"], reverse=True)
+    return {
+        "process_started": datetime.fromtimestamp(_process_started).isoformat(),
+        # Interpreter start-up, server imports and everything before the app
+        "before_app_seconds": round(since_process - since_module, 4),
+        "milestones": {
+            name: round(at - _module_loaded, 4) for name, at in _milestones.items()
+        },
+        "imports": imports,
+        "import_seconds": {
+            phase: round(sum(item["seconds"] for item in imports if item["phase"] == phase), 4)
+            for phase in ("startup", "lazy", "warmup")
+        },
+        "lazy_modules": {module._name: module._loaded for module in _lazy_modules},
+        "warmup": warmup.info()
+    }
+
+# ================================
+# WARM-UP
+# ================================
+
+class Warmup:
+    """Runs named warm-up steps once, in the background, and records how each went"""
+
+    def __init__(self):
+        self.status = "idle"
+        self.started_at: Optional[str] = None
+        self.seconds: Optional[float] = None
+        self.steps: "OrderedDict[str, Dict]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, steps: List[Tuple[str, Callable[[], Awaitable]]], force: bool = False) -> bool:
+        """Schedule the steps on the running loop; False if a warm-up is running or already done"""
+        if self.status == "running" or (self.status == "done" and not force):
+            return False
+        self.status = "running"
+        self.started_at = datetime.now().isoformat()
+        self.seconds = None
+        self.steps = OrderedDict()
+        self._task = asyncio.create_task(self._run(steps))
+        return True
+
+    async def _run(self, steps: List[Tuple[str, Callable[[], Awaitable]]]):
+        start = time.perf_counter()
+        for name, step in steps:
+            step_start = time.perf_counter()
+            try:
+                result = await step()
+                self.steps[name] = {"status": "done", "result": result}
+            except Exception as e:
+                # A failed step only means the first request pays for it
+                logger.warning(f"Warm-up step '{name}' failed: {str(e)}")
+                self.steps[name] = {"status": "error", "detail": str(e)}
+            self.steps[name]["seconds"] = round(time.perf_counter() - step_start, 4)
+        self.seconds = round(time.perf_counter() - start, 4)
+        self.status = "done"
+        logger.info(f"Warm-up finished in {self.seconds:.2f}s")
+
+    async def stop(self):
+        """Cancel a running warm-up (application shutdown)"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def info(self) -> Dict:
+        return {
+            "status": self.status,
+            "started_at": self.started_at,
+            "seconds": self.seconds,
+            "steps": dict(self.steps)
+        }
+
+warmup = Warmup()
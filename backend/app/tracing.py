@@ -0,0 +1,324 @@
+"""
+Per-request trace spans and request ids.
+
+TracingMiddleware gives every HTTP request a request id (the client's
+``X-Request-ID`` when it is a safe token, otherwise a new one), echoes it in
+the ``X-Request-ID`` response header and opens a root span for the request.
+Handlers nest spans under it with ``span()``/``traced()``; the current span
+is held in a context variable, so spans opened in thread-pool calls and in
+tasks started with asyncio.gather get the right parent. Work done in the
+process pool is added afterwards from its own timings with ``record_spans``.
+
+A request to /analyze looks like:
+
+    POST /analyze
+        upload_read             receiving and parsing the multipart body
+        pipeline
+            ingest              sniff_header, csv_parse, date_parse
+            forecast            cache_lookup, fit, predict, metrics
+            multi_parameter     aqi_breakdown, daily_aqi
+            image               smog_render, timelapse
+            visualizations      plot_render, gauge_render, deliver
+            ...
+        encode                  JSON serialization of the response
+
+With AQI_TRACE_FILE set, each finished trace is appended to that file as one
+line of OTLP/JSON (the OpenTelemetry collector's file exporter format), so
+traces can be inspected with jq or loaded into any OTLP-compatible backend
+without running a collector. The file is rotated to ``<file>.1`` once it
+exceeds AQI_TRACE_MAX_BYTES. Monitoring endpoints are not exported.
+
+Configuration (environment variables):
+    AQI_TRACE_FILE              JSON-lines export file (default: unset = no export)
+    AQI_TRACE_MAX_BYTES         Size before the file is rotated (default: 52428800)
+    AQI_TRACE_SERVICE_NAME      service.name resource attribute (default: aqi-backend)
+"""
+
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from .metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+TRACE_FILE = os.getenv("AQI_TRACE_FILE", "")
+TRACE_MAX_BYTES = int(os.getenv("AQI_TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_SERVICE_NAME = os.getenv("AQI_TRACE_SERVICE_NAME", "aqi-backend")
+
+REQUEST_ID_HEADER = "x-request-id"
+# Scraped or polled constantly; their traces would drown out the analyses
+UNEXPORTED_ROUTES = ("/metrics", "/health", "/analyze/jobs/{job_id}")
+
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+_current_span: ContextVar[Optional["Span"]] = ContextVar("aqi_current_span", default=None)
+_export_lock = threading.Lock()
+
+# OTLP span kinds and status codes
+_KIND_INTERNAL, _KIND_SERVER = 1, 2
+_STATUS_OK, _STATUS_ERROR = 1, 2
+
+# ================================
+# SPANS
+# ================================
+
+class Span:
+    """A named, timed unit of work with attributes and child spans"""
+
+    def __init__(self, name: str, trace: "Trace", parent: Optional["Span"] = None, **attributes):
+        self.name = name
+        self.trace = trace
+        self.parent = parent
+        self.span_id = secrets.token_hex(8)
+        self.attributes = attributes
+        self.children: List["Span"] = []
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+        self._token = None
+        if parent is not None:
+            parent.children.append(self)
+
+    def activate(self) -> "Span":
+        """Make this the parent of spans opened from now on in the current context"""
+        self._token = _current_span.set(self)
+        return self
+
+    def end(self, error: Optional[str] = None):
+        """End the span, ending any children still open with it"""
+        if self.end_ns is not None:
+            return
+        for child in self.children:
+            child.end(error)
+        self.end_ns = time.time_ns()
+        self.error = self.error or error
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Activated in another context (a task that has finished)
+                pass
+            self._token = None
+
+    def tree(self, origin_ns: int) -> Dict:
+        """Nested {name, start_ms, duration_ms, ...} relative to `origin_ns`; open spans report time so far"""
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        node = {
+            "name": self.name,
+            "start_ms": round((self.start_ns - origin_ns) / 1e6, 3),
+            "duration_ms": round((end_ns - self.start_ns) / 1e6, 3)
+        }
+        if self.attributes:
+            node["attributes"] = self.attributes
+        if self.error:
+            node["error"] = self.error
+        if self.end_ns is None:
+            node["open"] = True
+        if self.children:
+            node["children"] = [child.tree(origin_ns) for child in self.children]
+        return node
+
+    def walk(self) -> Iterator["Span"]:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+class Trace:
+    """All spans of one request, under a single root"""
+
+    def __init__(self, name: str, request_id: Optional[str] = None, **attributes):
+        self.trace_id = secrets.token_hex(16)
+        self.request_id = request_id if request_id and _REQUEST_ID.match(request_id) else self.trace_id
+        self.root = Span(name, self, request_id=self.request_id, **attributes)
+
+    def tree(self) -> Dict:
+        """The span tree with times relative to the start of the request"""
+        return self.root.tree(self.root.start_ns)
+
+    def to_otlp(self) -> Dict:
+        """The trace as one OTLP/JSON ExportTraceServiceRequest"""
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": TRACE_SERVICE_NAME})},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [self._otlp_span(span) for span in self.root.walk()]
+                }]
+            }]
+        }
+
+    def _otlp_span(self, span: Span) -> Dict:
+        status = {"code": _STATUS_ERROR, "message": span.error} if span.error else {"code": _STATUS_OK}
+        return {
+            "traceId": self.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent.span_id if span.parent is not None else "",
+            "name": span.name,
+            "kind": _KIND_SERVER if span is self.root else _KIND_INTERNAL,
+            # 64-bit integers are strings in OTLP/JSON
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns if span.end_ns is not None else time.time_ns()),
+            "attributes": _otlp_attributes(span.attributes),
+            "status": status
+        }
+
+def _otlp_attributes(attributes: Dict) -> List[Dict]:
+    values = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        values.append({"key": key, "value": typed})
+    return values
+
+# ================================
+# CURRENT SPAN HELPERS
+# ================================
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def current_trace() -> Optional[Trace]:
+    span = _current_span.get()
+    return span.trace if span is not None else None
+
+def current_request_id() -> Optional[str]:
+    trace = current_trace()
+    return trace.request_id if trace is not None else None
+
+def start_span(name: str, **attributes) -> Optional[Span]:
+    """Open and activate a child of the current span; None outside a trace. End it with span.end()"""
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    return Span(name, parent.trace, parent, **attributes).activate()
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Time the block as a child of the current span (a no-op outside a trace)"""
+    child = start_span(name, **attributes)
+    try:
+        yield child
+    except BaseException as e:
+        if child is not None:
+            child.end(error=type(e).__name__)
+        raise
+    if child is not None:
+        child.end()
+
+async def traced(name: str, awaitable: Awaitable, **attributes):
+    """Await `awaitable` inside a span, e.g. as one of several asyncio.gather arguments"""
+    with span(name, **attributes):
+        return await awaitable
+
+def record_spans(phases: Sequence[Tuple[str, float]], **attributes):
+    """Add finished child spans for consecutive phases measured elsewhere (the process pool), ending now"""
+    parent = _current_span.get()
+    if parent is None:
+        return
+    end_ns = time.time_ns()
+    start_ns = end_ns - int(sum(seconds for _, seconds in phases) * 1e9)
+    for name, seconds in phases:
+        child = Span(name, parent.trace, parent, **attributes)
+        child.start_ns, child.end_ns = start_ns, start_ns + int(seconds * 1e9)
+        start_ns = child.end_ns
+
+def record_since_request_start(name: str, **attributes):
+    """Add a finished span from the start of the request until now (work done before the handler ran)"""
+    parent = _current_span.get()
+    if parent is None:
+        return
+    child = Span(name, parent.trace, parent, **attributes)
+    child.start_ns, child.end_ns = parent.trace.root.start_ns, time.time_ns()
+
+@asynccontextmanager
+async def new_trace(name: str, request_id: Optional[str] = None, **attributes) -> AsyncIterator[Trace]:
+    """Run the block as its own trace (background jobs outlive the request that queued them)"""
+    trace = Trace(name, request_id, **attributes)
+    trace.root.activate()
+    try:
+        yield trace
+    except BaseException as e:
+        trace.root.end(error=type(e).__name__)
+        raise
+    finally:
+        trace.root.end()
+        if TRACE_FILE:
+            await run_in_threadpool(export_trace, trace)
+
+# ================================
+# EXPORT
+# ================================
+
+def export_trace(trace: Trace):
+    """Append the trace to AQI_TRACE_FILE as one OTLP/JSON line, rotating the file when it is full"""
+    line = json.dumps(trace.to_otlp(), separators=(",", ":")) + "\n"
+    try:
+        with _export_lock:
+            directory = os.path.dirname(TRACE_FILE)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.exists(TRACE_FILE) and os.path.getsize(TRACE_FILE) + len(line) > TRACE_MAX_BYTES:
+                os.replace(TRACE_FILE, f"{TRACE_FILE}.1")
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line)
+    except OSError as e:
+        logger.warning(f"Could not export trace {trace.request_id}: {str(e)}")
+
+# ================================
+# MIDDLEWARE
+# ================================
+
+class TracingMiddleware:
+    """ASGI middleware opening a root span per request and echoing its request id"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        client_id = headers.get(REQUEST_ID_HEADER.encode(), b"").decode("latin-1")
+        # Renamed to the route template once routing has happened
+        trace = Trace(f"{scope['method']} {scope['path']}", client_id, **{"http.method": scope["method"], "http.target": scope["path"]})
+        trace.root.activate()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (REQUEST_ID_HEADER.encode(), trace.request_id.encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            trace.root.end(error=type(e).__name__)
+            raise
+        finally:
+            route = route_template(scope)
+            trace.root.name = f"{scope['method']} {route}"
+            trace.root.attributes.update({"http.route": route, "http.status_code": status["code"]})
+            trace.root.end(error=f"HTTP {status['code']}" if status["code"] >= 500 else None)
+            if TRACE_FILE and route not in UNEXPORTED_ROUTES:
+                await run_in_threadpool(export_trace, trace)
@@ -0,0 +1,8 @@
+"""
+Micro-benchmarks for the analysis pipeline.
+
+Run from the backend directory, e.g. ``python -m benchmarks.aqi_engine``.
+Each benchmark prints its results as JSON. ``benchmarks.synthetic`` generates
+station-like CSV uploads and ``benchmarks.pipeline`` times the whole pipeline
+on them at several sizes, for comparison across commits.
+"""
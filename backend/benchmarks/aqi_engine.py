@@ -0,0 +1,67 @@
+"""
+Scalar vs vectorized AQI computation.
+
+Converts random pollutant columns with the per-value `calculate_detailed_aqi`
+loop and with `compute_aqi_frame`, and reports both timings and how many
+sub-indices differ. Both truncate to the breakpoint tables' precision, so
+values between two breakpoints (12.05 µg/m³) fall into the lower band in
+either version.
+
+    python -m benchmarks.aqi_engine --rows 100000
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.aqi import POLLUTANTS, TRUNCATION_DECIMALS, compute_aqi_frame
+from app.main import calculate_detailed_aqi
+
+# Rough upper bounds that exercise every breakpoint band plus the over-range cap
+RANGES = {'pm25': 550, 'pm10': 650, 'o3': 220, 'no2': 1300, 'so2': 650, 'co': 32}
+
+def synthetic_concentrations(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    # Generated at each table's precision, so both versions see the same inputs
+    return pd.DataFrame({p: rng.uniform(0, RANGES[p], rows).round(TRUNCATION_DECIMALS[p]) for p in POLLUTANTS})
+
+def run(rows: int, scalar_rows: int) -> dict:
+    data = synthetic_concentrations(rows)
+
+    start = time.perf_counter()
+    vectorized = compute_aqi_frame(data)
+    vectorized_seconds = time.perf_counter() - start
+
+    # The scalar loop is slow, so it is timed on a prefix and extrapolated
+    sample = data.head(scalar_rows)
+    start = time.perf_counter()
+    scalar = [calculate_detailed_aqi(row) for row in sample.to_dict('records')]
+    scalar_seconds = time.perf_counter() - start
+    scalar_frame = pd.DataFrame(scalar)
+
+    mismatches = {
+        p: int((scalar_frame[p].to_numpy() != vectorized[f"{p}_aqi"].head(scalar_rows).to_numpy()).sum())
+        for p in POLLUTANTS
+    }
+    scalar_per_row = scalar_seconds / max(len(sample), 1)
+    return {
+        "rows": rows,
+        "vectorized_seconds": round(vectorized_seconds, 4),
+        "scalar_rows_timed": len(sample),
+        "scalar_seconds_estimated": round(scalar_per_row * rows, 4),
+        "speedup": round(scalar_per_row * rows / max(vectorized_seconds, 1e-9), 1),
+        "sub_index_mismatches": mismatches
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--scalar-rows", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, min(args.rows, args.scalar_rows)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Forecast plot rendering with and without history downsampling.
+
+Renders `create_forecast_plot` for an hourly history of `--rows` points with
+every point drawn (max_points=0) and with MinMax-LTTB downsampling to
+`--max-points`, and reports render times, the downsampling time itself and
+whether the extremes survived.
+
+    python -m benchmarks.downsampling --rows 1000000 --format png
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.downsample import downsample_frame
+from app.main import create_forecast_plot
+
+def synthetic_history(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    hours = np.arange(rows)
+    y = 60 + 25 * np.sin(hours / (24 * 58)) + 10 * np.sin(hours / 24 * 2 * np.pi) + rng.normal(0, 8, rows)
+    return pd.DataFrame({"ds": pd.date_range("2000-01-01", periods=rows, freq="h"), "y": np.abs(y)})
+
+def synthetic_forecast(history: pd.DataFrame, periods: int = 30) -> pd.DataFrame:
+    ds = pd.date_range(history["ds"].iloc[-1], periods=periods + 1, freq="D")[1:]
+    yhat = np.full(periods, history["y"].tail(24 * 7).mean())
+    forecast = pd.DataFrame({"ds": ds, "yhat": yhat, "yhat_lower": yhat - 10, "yhat_upper": yhat + 10})
+    forecast["trend"] = yhat
+    # Prophet's forecast frame covers the history too
+    trend = pd.DataFrame({"ds": history["ds"], "trend": history["y"].rolling(24 * 30, min_periods=1).mean()})
+    return pd.concat([trend, forecast], ignore_index=True)
+
+def _render(history, forecast, fmt, dpi, max_points):
+    start = time.perf_counter()
+    image = create_forecast_plot(history, forecast, 70.0, dpi=dpi, fmt=fmt, max_points=max_points)
+    return time.perf_counter() - start, len(image)
+
+def run(rows: int, max_points: int, fmt: str, dpi: int) -> dict:
+    history = synthetic_history(rows)
+    forecast = synthetic_forecast(history)
+    # Warm up fonts and the Agg backend so neither run pays for them
+    _render(history.tail(100), forecast.tail(100), fmt, dpi, 0)
+
+    start = time.perf_counter()
+    reduced = downsample_frame(history, "ds", "y", max_points)
+    downsample_seconds = time.perf_counter() - start
+
+    full_seconds, full_bytes = _render(history, forecast, fmt, dpi, 0)
+    reduced_seconds, reduced_bytes = _render(history, forecast, fmt, dpi, max_points)
+    return {
+        "rows": rows,
+        "max_points": max_points,
+        "kept_points": len(reduced),
+        "format": fmt,
+        "downsample_seconds": round(downsample_seconds, 4),
+        "extremes_kept": bool(reduced["y"].max() == history["y"].max() and reduced["y"].min() == history["y"].min()),
+        "full": {"seconds": round(full_seconds, 3), "bytes": full_bytes},
+        "downsampled": {"seconds": round(reduced_seconds, 3), "bytes": reduced_bytes},
+        "speedup": round(full_seconds / max(reduced_seconds, 1e-9), 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--max-points", type=int, default=2000)
+    parser.add_argument("--format", default="png", choices=["png", "webp", "svg"])
+    parser.add_argument("--dpi", type=int, default=100)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.max_points, args.format, args.dpi), indent=2))
+
+if __name__ == "__main__":
+    main()
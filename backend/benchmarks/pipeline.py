@@ -0,0 +1,276 @@
+"""
+Pipeline benchmark suite on synthetic uploads.
+
+For each `--rows` size a station export is generated (see benchmarks.synthetic)
+and the functions each analysis runs are timed on it:
+
+    read_csv                sniff_header + read_projected_csv on the CSV bytes
+    parse_dates             format inference and parsing (format cache cleared)
+    prophet                 fit/predict, up to --forecast-max-rows rows
+    compute_daily_aqi       per-day AQI of every pollutant over the history
+    create_forecast_plot    the 2x2 forecast figure (numpy engine's forecast)
+    clean_response_data     on an /analyze-shaped payload built from the data
+    encode_response         FastJSONResponse of that payload (response bytes)
+
+Functions whose cost does not depend on the upload (find_column on the header,
+calculate_detailed_aqi on the latest values, create_aqi_gauge and
+apply_atmospheric_effects on a --megapixels photo) are timed once.
+
+Each entry records the median and best of --repeat runs after a warm-up
+run, the tracemalloc peak of one extra run and, where there is one, the
+output size. The report carries the git commit and environment; pass an
+earlier report with --compare to list functions that got slower by more
+than --threshold.
+
+    python -m benchmarks.pipeline --rows 1000 10000 100000 1000000 --output bench.json
+    python -m benchmarks.pipeline --rows 1000 10000 --compare bench.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app import dates
+from app.aqi import aqi_series_payload, compute_daily_aqi
+from app.engines import run_forecast
+from app.ingest import header_frame, read_projected_csv, sniff_header
+from app.main import (DATE_COLUMN_NAMES, PM25_COLUMN_NAMES, POLLUTANT_COLUMN_NAMES, apply_atmospheric_effects,
+                      aqi_to_haze_intensity, build_prediction_records, calculate_detailed_aqi, classify_aqi,
+                      clean_response_data, create_aqi_gauge, create_forecast_plot, find_column, series_frame,
+                      series_statistics)
+from app.serialization import FastJSONResponse
+from benchmarks.smog_blend import synthetic_photo
+from benchmarks.synthetic import add_dataset_arguments, dataset_options, synthetic_csv
+
+PROPHET_KWARGS = {"daily_seasonality": True, "yearly_seasonality": True}
+# Sub-millisecond timings are mostly noise; they are compared but never reported as regressions
+MIN_REGRESSION_SECONDS = 0.001
+
+def measure(func, repeat: int, memory: bool = True, setup=None, warmup: bool = True):
+    """Median/best seconds of `repeat` runs plus the tracemalloc peak of one more; returns (entry, result)"""
+    if warmup:
+        if setup is not None:
+            setup()
+        func()
+
+    times, result = [], None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    entry = {"seconds": round(statistics.median(times), 5), "best": round(min(times), 5), "runs": repeat}
+
+    if memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            func()
+            entry["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return entry, result
+
+# ================================
+# PER-SIZE FUNCTIONS
+# ================================
+
+def detect_columns(header) -> dict:
+    columns = header_frame(header)
+    return {
+        "date": find_column(columns, DATE_COLUMN_NAMES),
+        "pm25": find_column(columns, PM25_COLUMN_NAMES),
+        **{param: find_column(columns, names) for param, names in POLLUTANT_COLUMN_NAMES.items()}
+    }
+
+def read_csv(csv_bytes: bytes, header, columns: dict) -> pd.DataFrame:
+    numeric = [columns["pm25"]] + [col for param, col in columns.items() if param not in ("date", "pm25") and col]
+    df, _ = read_projected_csv(io.BytesIO(csv_bytes), header, columns["date"], numeric)
+    return df
+
+def analyze_payload(aqi_df: pd.DataFrame, forecast: pd.DataFrame, daily_aqi: pd.DataFrame,
+                    forecast_plot: str, aqi_gauge: str) -> dict:
+    """The parts of an /analyze response whose size depends on the upload"""
+    predicted = float(forecast["yhat"].iloc[-1])
+    return {
+        "status": "success",
+        "predictions": build_prediction_records(forecast.tail(30)),
+        "statistics": series_statistics(aqi_df),
+        "daily_aqi": aqi_series_payload(daily_aqi),
+        "visualizations": {"forecast_plot": forecast_plot, "aqi_gauge": aqi_gauge},
+        "summary": {"predicted_tomorrow": predicted, "predicted_category": classify_aqi(predicted)[0]}
+    }
+
+def run_size(rows: int, options: dict, args: argparse.Namespace, aqi_gauge: str) -> dict:
+    csv_bytes = synthetic_csv(rows, **options)
+    header = sniff_header(io.BytesIO(csv_bytes))
+    columns = detect_columns(header)
+    results = {}
+
+    results["read_csv"], df = measure(lambda: read_csv(csv_bytes, header, columns), args.repeat, args.memory)
+    results["read_csv"]["input_bytes"] = len(csv_bytes)
+
+    # A new station's upload: the format is inferred, not taken from the cache
+    results["parse_dates"], (parsed, date_info) = measure(
+        lambda: dates.parse_dates(df[columns["date"]], columns["date"]), args.repeat, args.memory,
+        setup=dates._format_cache.clear
+    )
+    results["parse_dates"].update({"format": date_info["format"], "invalid_rows": date_info["invalid_rows"]})
+    aqi_df = series_frame(parsed, df[columns["pm25"]])
+
+    if len(aqi_df) <= args.forecast_max_rows:
+        entry, (_, fit_info) = measure(
+            lambda: run_forecast("prophet", aqi_df, 30, prophet_kwargs=PROPHET_KWARGS),
+            args.forecast_repeat, args.memory, warmup=False
+        )
+        results["prophet"] = {**entry, "fit_seconds": fit_info["fit_seconds"], "predict_seconds": fit_info["predict_seconds"]}
+    else:
+        results["prophet"] = {"skipped": f"more than --forecast-max-rows ({args.forecast_max_rows}) rows"}
+
+    concentrations = pd.DataFrame({
+        param: df[col] for param, col in columns.items() if param != "date" and col
+    })
+    results["compute_daily_aqi"], daily_aqi = measure(
+        lambda: compute_daily_aqi(parsed, concentrations), args.repeat, args.memory
+    )
+
+    forecast, _ = run_forecast("numpy", aqi_df, 30)
+    predicted = float(forecast["yhat"].iloc[-1])
+    results["create_forecast_plot"], forecast_plot = measure(
+        lambda: create_forecast_plot(aqi_df, forecast, predicted), args.repeat, args.memory
+    )
+    results["create_forecast_plot"]["output_bytes"] = len(forecast_plot)
+
+    payload = analyze_payload(aqi_df, forecast, daily_aqi, forecast_plot, aqi_gauge)
+    results["clean_response_data"], cleaned = measure(lambda: clean_response_data(payload), args.repeat, args.memory)
+    results["encode_response"], body = measure(lambda: FastJSONResponse(cleaned).body, args.repeat, args.memory)
+    results["encode_response"]["response_bytes"] = len(body)
+
+    return {
+        "rows": rows,
+        "dataset": {
+            "csv_rows": len(df),
+            "series_rows": len(aqi_df),
+            "days": int(aqi_df["ds"].dt.normalize().nunique()),
+            "columns": [col for col in columns.values() if col]
+        },
+        "functions": results
+    }
+
+# ================================
+# SIZE-INDEPENDENT FUNCTIONS
+# ================================
+
+def run_fixed(options: dict, args: argparse.Namespace):
+    header = sniff_header(io.BytesIO(synthetic_csv(100, **options)))
+    results = {}
+    results["find_column"], _ = measure(lambda: detect_columns(header), args.repeat, args.memory)
+
+    latest = {"pm25": 87.3, "pm10": 152.0, "o3": 41.0, "no2": 58.0, "so2": 12.0, "co": 1.4}
+    results["calculate_detailed_aqi"], breakdown = measure(lambda: calculate_detailed_aqi(latest), args.repeat, args.memory)
+
+    predicted = float(max(breakdown.values()))
+    category = classify_aqi(predicted)[0]
+    results["create_aqi_gauge"], aqi_gauge = measure(lambda: create_aqi_gauge(predicted, category), args.repeat, args.memory)
+    results["create_aqi_gauge"]["output_bytes"] = len(aqi_gauge)
+
+    image = synthetic_photo(args.megapixels)
+    intensity = aqi_to_haze_intensity(predicted)
+    results["apply_atmospheric_effects"], _ = measure(
+        lambda: apply_atmospheric_effects(image, predicted, intensity), args.repeat, args.memory
+    )
+    results["apply_atmospheric_effects"]["megapixels"] = args.megapixels
+    return results, aqi_gauge
+
+# ================================
+# REPORT
+# ================================
+
+def _git(*command: str) -> str:
+    try:
+        return subprocess.run(["git", *command], capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+def environment() -> dict:
+    return {
+        "commit": _git("rev-parse", "HEAD") or None,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__
+    }
+
+def compare(report: dict, baseline: dict, threshold: float) -> dict:
+    """Ratio of current to baseline median seconds per function, and those above 1 + threshold"""
+    def by_key(result):
+        entries = {("fixed", name): entry for name, entry in result["fixed"].items()}
+        for size in result["sizes"]:
+            entries.update({(str(size["rows"]), name): entry for name, entry in size["functions"].items()})
+        return entries
+
+    current, previous = by_key(report), by_key(baseline)
+    ratios, regressions = {}, []
+    for key in current.keys() & previous.keys():
+        if "seconds" not in current[key] or "seconds" not in previous[key]:
+            continue
+        ratio = round(current[key]["seconds"] / max(previous[key]["seconds"], 1e-9), 3)
+        ratios.setdefault(key[0], {})[key[1]] = ratio
+        if ratio > 1 + threshold and current[key]["seconds"] >= MIN_REGRESSION_SECONDS:
+            regressions.append({"rows": key[0], "function": key[1], "ratio": ratio})
+    return {
+        "baseline_commit": baseline.get("environment", {}).get("commit"),
+        "threshold": threshold,
+        "ratios": ratios,
+        "regressions": sorted(regressions, key=lambda item: item["ratio"], reverse=True)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    add_dataset_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--forecast-max-rows", type=int, default=10_000)
+    parser.add_argument("--forecast-repeat", type=int, default=1)
+    parser.add_argument("--megapixels", type=float, default=12)
+    parser.add_argument("--no-memory", dest="memory", action="store_false")
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    options = dataset_options(args)
+    fixed, aqi_gauge = run_fixed(options, args)
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "environment": environment(),
+        "dataset_options": options,
+        "fixed": fixed,
+        "sizes": [run_size(rows, options, args, aqi_gauge) for rows in args.rows]
+    }
+    if args.compare:
+        with open(args.compare, "r") as f:
+            report["comparison"] = compare(report, json.load(f), args.threshold)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+if __name__ == "__main__":
+    main()
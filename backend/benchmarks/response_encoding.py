@@ -0,0 +1,98 @@
+"""
+Response encoding: legacy dict path vs FastJSONResponse.
+
+Builds an /analyze-shaped payload (30 predictions, a per-day AQI series over
+`--days` days, statistics and two base64 images of `--image-kb` each) and
+times the full encoding path of each approach:
+
+    legacy      clean_response_data + jsonable_encoder + JSONResponse.render
+    fast        FastJSONResponse.render (orjson when installed)
+    fallback    the pure-Python path FastJSONResponse uses without orjson
+
+    python -m benchmarks.response_encoding --days 3650
+"""
+
+import argparse
+import base64
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import serialization
+from app.aqi import aqi_series_payload, compute_daily_aqi
+from app.main import build_prediction_records, clean_response_data, safe_series_stats
+
+def analyze_payload(days: int, image_kb: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2015-01-01", periods=days, freq="D")
+    pm25 = np.abs(60 + 30 * np.sin(np.arange(days) / 58) + rng.normal(0, 12, days))
+    concentrations = pd.DataFrame({
+        "pm25": pm25, "pm10": pm25 * 1.6, "o3": rng.uniform(10, 90, days),
+        "no2": rng.uniform(5, 80, days), "so2": rng.uniform(1, 40, days), "co": rng.uniform(0.1, 6, days)
+    })
+    concentrations.loc[rng.choice(days, days // 50, replace=False), "o3"] = np.nan
+
+    future = pd.DataFrame({"ds": pd.date_range(dates[-1], periods=31, freq="D")[1:]})
+    future["yhat"] = rng.uniform(20, 180, 30)
+    future["yhat_lower"] = future["yhat"] - 10
+    future["yhat_upper"] = future["yhat"] + 10
+
+    image = base64.b64encode(rng.bytes(image_kb * 1024)).decode()
+    return {
+        "status": "success",
+        "predictions": build_prediction_records(future),
+        "statistics": {"recent_30_days": safe_series_stats(pd.Series(pm25[-30:]))},
+        "daily_aqi": aqi_series_payload(compute_daily_aqi(pd.Series(dates), concentrations)),
+        "visualizations": {"forecast_plot": image, "aqi_gauge": image},
+        "summary": {"predicted_tomorrow": float(future["yhat"].iloc[0]), "trend": "Stable"}
+    }
+
+def _time(func, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def run(days: int, image_kb: int, repeat: int) -> dict:
+    payload = analyze_payload(days, image_kb)
+    # The legacy path received plain lists (the series used to be built with .tolist())
+    legacy_payload = json.loads(serialization.dumps(payload))
+
+    legacy_seconds, legacy_body = _time(
+        lambda: JSONResponse(jsonable_encoder(clean_response_data(legacy_payload))).body, repeat
+    )
+    fast_seconds, fast_body = _time(lambda: serialization.FastJSONResponse(payload).body, repeat)
+
+    orjson_available = serialization.ORJSON_AVAILABLE
+    serialization.ORJSON_AVAILABLE = False
+    try:
+        fallback_seconds, fallback_body = _time(lambda: serialization.FastJSONResponse(payload).body, repeat)
+    finally:
+        serialization.ORJSON_AVAILABLE = orjson_available
+
+    return {
+        "days": days,
+        "image_kb": image_kb,
+        "orjson": orjson_available,
+        "legacy": {"seconds": round(legacy_seconds, 5), "bytes": len(legacy_body)},
+        "fast": {"seconds": round(fast_seconds, 5), "bytes": len(fast_body)},
+        "fallback": {"seconds": round(fallback_seconds, 5), "bytes": len(fallback_body)},
+        "speedup": round(legacy_seconds / max(fast_seconds, 1e-9), 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=3650)
+    parser.add_argument("--image-kb", type=int, default=700)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.days, args.image_kb, args.repeat), indent=2))
+
+if __name__ == "__main__":
+    main()
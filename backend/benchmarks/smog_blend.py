@@ -0,0 +1,94 @@
+"""
+Smog/haze blending: float32 addWeighted chain vs per-channel LUT.
+
+Applies the previous float implementation (kept below as the reference) and
+`apply_atmospheric_effects` to synthetic photos of `--megapixels` for every
+AQI band and reports timings and the largest per-pixel difference, which
+must stay within 1.
+
+    python -m benchmarks.smog_blend --megapixels 12 24
+"""
+
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from app.main import apply_atmospheric_effects, aqi_to_haze_intensity
+
+# One AQI per band above Good (Good returns the image untouched)
+BAND_AQI = {"moderate": 75, "sensitive": 125, "unhealthy": 175, "very_unhealthy": 250, "hazardous": 400}
+
+def reference_atmospheric_effects(image: np.ndarray, aqi_value: float, intensity: int) -> np.ndarray:
+    """The float32 implementation the LUT replaced"""
+    result = image.copy().astype(np.float32)
+
+    if aqi_value <= 50:
+        return image
+    elif aqi_value <= 100:
+        yellow_tint = np.full_like(result, [0, 200, 255])
+        result = cv2.addWeighted(result, 0.9, yellow_tint, 0.1, 0)
+    elif aqi_value <= 150:
+        brown_haze = np.full_like(result, [100, 150, 200])
+        result = cv2.addWeighted(result, 0.8, brown_haze, 0.2, 0)
+    elif aqi_value <= 200:
+        thick_smog = np.full_like(result, [120, 120, 150])
+        result = cv2.addWeighted(result, 0.6, thick_smog, 0.4, 0)
+    elif aqi_value <= 300:
+        dark_smog = np.full_like(result, [80, 80, 120])
+        result = cv2.addWeighted(result, 0.4, dark_smog, 0.6, 0)
+    else:
+        extreme_smog = np.full_like(result, [60, 60, 90])
+        result = cv2.addWeighted(result, 0.3, extreme_smog, 0.7, 0)
+
+    haze = np.full_like(result, [200, 200, 200])
+    alpha = min(intensity / 255.0, 0.8)
+    result = cv2.addWeighted(result, 1-alpha, haze, alpha, 0)
+
+    return np.clip(result, 0, 255).astype(np.uint8)
+
+def synthetic_photo(megapixels: float, seed: int = 0) -> np.ndarray:
+    """4:3 image with smooth gradients plus noise, covering all 256 levels per channel"""
+    height = int(round(np.sqrt(megapixels * 1e6 * 3 / 4)))
+    width = int(round(height * 4 / 3))
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.integers(-40, 41, (height, width, 3), dtype=np.int16)
+    return np.clip(gradient + noise, 0, 255).astype(np.uint8)
+
+def _time(func, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def run(megapixels: float, repeat: int) -> dict:
+    image = synthetic_photo(megapixels)
+    bands = {}
+    for band, aqi in BAND_AQI.items():
+        intensity = aqi_to_haze_intensity(aqi)
+        reference_seconds, expected = _time(lambda: reference_atmospheric_effects(image, aqi, intensity), repeat)
+        lut_seconds, actual = _time(lambda: apply_atmospheric_effects(image, aqi, intensity), repeat)
+        diff = np.abs(expected.astype(np.int16) - actual)
+        bands[band] = {
+            "reference_seconds": round(reference_seconds, 4),
+            "lut_seconds": round(lut_seconds, 4),
+            "speedup": round(reference_seconds / max(lut_seconds, 1e-9), 1),
+            "max_abs_diff": int(diff.max()),
+            "differing_values": int(np.count_nonzero(diff))
+        }
+    return {"megapixels": megapixels, "shape": list(image.shape), "bands": bands}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[12, 24])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps([run(mp, args.repeat) for mp in args.megapixels], indent=2))
+
+if __name__ == "__main__":
+    main()
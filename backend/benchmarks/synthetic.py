@@ -0,0 +1,167 @@
+"""
+Synthetic AQI station exports for the benchmarks.
+
+Builds a CSV shaped like a real upload: a date column plus PM2.5 and any of
+the optional pm10/o3/no2/so2/co columns, with column names in the casing
+stations use (``Date``, ``PM2.5``, ``O3``...). PM2.5 follows a slow trend plus
+yearly, weekly and (for hourly data) daily cycles scaled by `seasonality`,
+with noise; the other pollutants are derived from it. Real exports are
+untidy, so the generator can add:
+
+    gaps          outages: runs of 1-48 missing rows, about this fraction of rows
+    duplicates    re-reported rows (same timestamp, slightly different values)
+    missing       empty cells in the optional pollutant columns
+    date formats  iso, dayfirst, monthfirst, epoch, or messy (day-first with
+                  a `messy_fraction` of cells in other formats, padded with
+                  whitespace or unparseable)
+
+    python -m benchmarks.synthetic --days 365 --freq h --gaps 0.02 --duplicates 0.01 \\
+        --date-format messy --output station.csv
+"""
+
+import argparse
+import json
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+FREQUENCIES = {"h": 24, "D": 1}
+POLLUTANTS = ("pm10", "o3", "no2", "so2", "co")
+# Header names as stations export them; find_column matches them case-insensitively
+COLUMN_NAMES = {"date": "Date", "pm25": "PM2.5", "pm10": "PM10", "o3": "O3", "no2": "NO2", "so2": "SO2", "co": "CO"}
+DATE_FORMATS = {
+    "iso": "%Y-%m-%d %H:%M:%S",
+    "dayfirst": "%d/%m/%Y %H:%M",
+    "monthfirst": "%m/%d/%Y %I:%M %p",
+    "epoch": None,
+    "messy": "%d/%m/%Y %H:%M"
+}
+# Formats mixed into a "messy" column
+_STRAY_FORMATS = ("%Y-%m-%d %H:%M:%S", "%d-%m-%Y %H:%M", "%d %b %Y")
+
+def _pm25(timestamps: pd.DatetimeIndex, seasonality: float, rng: np.random.Generator) -> np.ndarray:
+    days = (timestamps - timestamps[0]).total_seconds().to_numpy() / 86400
+    cycles = (
+        18 * np.sin(2 * np.pi * days / 365.25)
+        + 6 * np.sin(2 * np.pi * days / 7)
+        + 10 * np.sin(2 * np.pi * (days % 1) - np.pi / 2)
+    )
+    trend = 0.01 * days
+    return np.clip(55 + trend + seasonality * cycles + rng.normal(0, 8, len(days)), 1, None)
+
+def _outage_mask(rows: int, gaps: float, rng: np.random.Generator) -> np.ndarray:
+    """True for rows lost in outages of 1-48 consecutive rows, about `gaps` of all rows"""
+    mask = np.zeros(rows, dtype=bool)
+    if gaps <= 0:
+        return mask
+    lengths = rng.integers(1, 49, max(1, int(rows * gaps / 24.5)))
+    for start, length in zip(rng.integers(0, rows, len(lengths)), lengths):
+        mask[start:start + length] = True
+    return mask
+
+def _format_dates(timestamps: pd.Series, date_format: str, messy_fraction: float,
+                  rng: np.random.Generator) -> pd.Series:
+    if date_format == "epoch":
+        return ((timestamps - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)).astype(str)
+
+    dates = timestamps.dt.strftime(DATE_FORMATS[date_format])
+    if date_format != "messy" or messy_fraction <= 0:
+        return dates
+
+    picked = rng.random(len(dates)) < messy_fraction
+    kinds = rng.integers(0, len(_STRAY_FORMATS) + 2, len(dates))
+    for kind, fmt in enumerate(_STRAY_FORMATS):
+        rows = picked & (kinds == kind)
+        dates[rows] = timestamps[rows].dt.strftime(fmt)
+    padded = picked & (kinds == len(_STRAY_FORMATS))
+    dates[padded] = "  " + dates[padded] + " "
+    dates[picked & (kinds == len(_STRAY_FORMATS) + 1)] = "n/a"
+    return dates
+
+def synthetic_frame(
+    rows: int,
+    freq: str = "h",
+    seasonality: float = 1.0,
+    gaps: float = 0.0,
+    duplicates: float = 0.0,
+    missing: float = 0.0,
+    pollutants: Sequence[str] = POLLUTANTS,
+    date_format: str = "iso",
+    messy_fraction: float = 0.05,
+    start: str = "2015-01-01",
+    seed: int = 0
+) -> pd.DataFrame:
+    """Raw upload frame (dates as text) with about `rows` rows before gaps and duplicates"""
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range(start, periods=rows, freq=freq)
+    pm25 = _pm25(timestamps, seasonality, rng)
+
+    data = {"date": pd.Series(timestamps), "pm25": pm25}
+    derived = {
+        "pm10": lambda: pm25 * rng.uniform(1.3, 2.0, rows),
+        "o3": lambda: np.clip(45 - 0.2 * pm25 + rng.normal(0, 10, rows), 0, None),
+        "no2": lambda: np.clip(0.6 * pm25 + rng.normal(0, 6, rows), 0, None),
+        "so2": lambda: np.clip(0.15 * pm25 + rng.normal(0, 3, rows), 0, None),
+        "co": lambda: np.clip(0.02 * pm25 + rng.normal(0, 0.2, rows), 0.05, None)
+    }
+    for pollutant in pollutants:
+        values = derived[pollutant]().round(2)
+        if missing > 0:
+            values[rng.random(rows) < missing] = np.nan
+        data[pollutant] = values
+    frame = pd.DataFrame(data)
+    frame["pm25"] = frame["pm25"].round(1)
+
+    frame = frame[~_outage_mask(rows, gaps, rng)]
+    if duplicates > 0:
+        repeated = frame.sample(frac=duplicates, random_state=seed)
+        repeated["pm25"] = (repeated["pm25"] * rng.uniform(0.95, 1.05, len(repeated))).round(1)
+        # Re-reported rows sit next to the originals, as in a concatenated export
+        frame = pd.concat([frame, repeated]).sort_index(kind="stable")
+
+    frame = frame.reset_index(drop=True)
+    frame["date"] = _format_dates(frame["date"], date_format, messy_fraction, rng)
+    return frame.rename(columns=COLUMN_NAMES)
+
+def synthetic_csv(rows: int, **options) -> bytes:
+    """The synthetic frame as uploaded CSV bytes"""
+    return synthetic_frame(rows, **options).to_csv(index=False).encode()
+
+def rows_for(days: Optional[int], rows: Optional[int], freq: str) -> int:
+    return days * FREQUENCIES[freq] if days is not None else rows
+
+def add_dataset_arguments(parser: argparse.ArgumentParser):
+    """Generator options shared with the pipeline benchmark"""
+    parser.add_argument("--freq", default="h", choices=list(FREQUENCIES))
+    parser.add_argument("--seasonality", type=float, default=1.0)
+    parser.add_argument("--gaps", type=float, default=0.02)
+    parser.add_argument("--duplicates", type=float, default=0.01)
+    parser.add_argument("--missing", type=float, default=0.01)
+    parser.add_argument("--pollutants", nargs="*", default=list(POLLUTANTS), choices=list(POLLUTANTS))
+    parser.add_argument("--date-format", default="messy", choices=list(DATE_FORMATS))
+    parser.add_argument("--messy-fraction", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+
+def dataset_options(args: argparse.Namespace) -> dict:
+    return {
+        "freq": args.freq, "seasonality": args.seasonality, "gaps": args.gaps,
+        "duplicates": args.duplicates, "missing": args.missing, "pollutants": args.pollutants,
+        "date_format": args.date_format, "messy_fraction": args.messy_fraction, "seed": args.seed
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--rows", type=int, default=10_000)
+    size.add_argument("--days", type=int)
+    add_dataset_arguments(parser)
+    parser.add_argument("--output", default="synthetic.csv")
+    args = parser.parse_args()
+
+    frame = synthetic_frame(rows_for(args.days, args.rows, args.freq), **dataset_options(args))
+    frame.to_csv(args.output, index=False)
+    print(json.dumps({"output": args.output, "rows": len(frame), "columns": frame.columns.tolist()}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""AQI at exact EPA breakpoints, read through the float32 ingest path."""
+
+import io
+
+import pandas as pd
+import pytest
+
+from app.ingest import read_projected_csv, sniff_header
+from app.main import calculate_detailed_aqi, latest_pollutant_values, series_frame
+
+def ingest(csv: str) -> pd.DataFrame:
+    csv_file = io.BytesIO(csv.encode())
+    header = sniff_header(csv_file)
+    df, info = read_projected_csv(csv_file, header, "date", ["pm25", "co"])
+    assert info["float_dtype"] == "float32"
+    return df
+
+@pytest.mark.parametrize("pm25, expected", [
+    (12.0, 50), (12.1, 51), (35.4, 100), (35.5, 101), (55.4, 150), (150.4, 200)
+])
+def test_pm25_breakpoints(pm25, expected):
+    df = ingest(f"date,pm25,co\n2024-01-01,20.0,1.0\n2024-01-02,{pm25},1.0\n")
+    aqi_df = series_frame(pd.to_datetime(df["date"]), df["pm25"])
+
+    latest = aqi_df["y"].iloc[-1]
+    assert latest == pm25
+    assert calculate_detailed_aqi({"pm25": latest})["pm25"] == expected
+
+@pytest.mark.parametrize("co, expected", [(4.4, 50), (9.4, 100), (12.4, 150)])
+def test_co_breakpoints(co, expected):
+    df = ingest(f"date,pm25,co\n2024-01-01,20.0,1.0\n2024-01-02,20.0,{co}\n")
+    concentrations, analysis = latest_pollutant_values(df, "date", {"co": "co"})
+
+    assert concentrations["co"] == co
+    assert analysis["co"]["latest_value"] == co
+    assert calculate_detailed_aqi(concentrations)["co"] == expected
+
+def test_values_between_breakpoints_are_truncated():
+    assert calculate_detailed_aqi({"pm25": 35.45, "co": 4.45}) == {"pm25": 100, "co": 50}
@@ -0,0 +1,29 @@
+"""Station naming in POST /forecast/batch."""
+
+import os
+
+os.environ.setdefault("AQI_WARMUP", "0")
+os.environ.setdefault("AQI_POOL_WORKERS", "0")
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+def station_csv(start: float) -> bytes:
+    rows = "".join(f"2024-01-{day:02d},{start + day}\n" for day in range(1, 29))
+    return f"date,pm25\n{rows}".encode()
+
+def test_files_with_the_same_name_are_forecast_separately():
+    datasets = [
+        ("datasets", ("exports/data.csv", station_csv(20.0), "text/csv")),
+        ("datasets", ("other/data.csv", station_csv(80.0), "text/csv"))
+    ]
+    with TestClient(app) as client:
+        response = client.post("/forecast/batch", files=datasets, data={"engine": "numpy", "periods": "3"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "success"
+    stations = {entry["station"]: entry for entry in body["stations"]}
+    assert set(stations) == {"data", "data_2"}
+    assert stations["data"]["summary"]["next_day_aqi"] != stations["data_2"]["summary"]["next_day_aqi"]